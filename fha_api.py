@@ -5,12 +5,24 @@
 本模块负责处理所有与FHA相关的数据操作和业务逻辑。
 它提供了一个完整的CRUD（创建、读取、更新、删除）功能的API，用于管理FHA表格数据。
 """
-from fastapi import APIRouter, HTTPException, UploadFile, File, Query
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, UploadFile, File, Query, Header, Request, Response
+from fastapi.responses import StreamingResponse, JSONResponse
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Union, Callable, Tuple
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+import json
+import numpy as np
 import pandas as pd
-import io
+
+from fha_shared import (FHA_DashboardStats, NO_SAFETY_EFFECT, XLSX_MEDIA_TYPE, ChunkAccumulator, ChunkSink,
+                        ReadWriteLock, id_labels, iter_excel_chunks, iter_xlsx_bytes)
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时退回标准库 json
+    orjson = None
 
 # ==============================================================================
 # 模块路由设置
@@ -21,6 +33,17 @@ router = APIRouter()
 # ==============================================================================
 # 核心数据模型与业务逻辑 (Core Data Model & Business Logic)
 # ==============================================================================
+# --- 模块内的常量定义 ---
+FAILURE_MODE_LIBRARY = {"通用": ["功能完全丧失", "功能间歇性工作", "功能性能下降", "功能非预期启动"],
+                        "传感器": ["持续输出错误信息", "输出数据冻结/卡死", "数据跳变/噪声过大", "输出数据延迟"],
+                        "数据传输": ["数据包丢失", "数据完整性破坏 (误码)", "通信中断"],
+                        "执行机构": ["无响应/卡死", "响应延迟/迟钝", "动作超调/不到位", "反向运动"],
+                        "电源": ["电压/电流异常", "供电中断"], "导航": ["定位精度下降", "航向错误", "速度信息错误"],
+                        "飞控算法": ["算法发散", "模式切换错误"]}
+MISSION_PHASES = ["地面检查", "启动", "垂直起飞", "过渡飞行", "巡航", "悬停作业", "返航", "垂直降落", "关机"]
+FUNCTION_TYPES = ["电源", "传感器", "执行机构", "数据传输", "飞控算法", "导航", "通信", "其他"]
+
+
 class FHA_Model:
     """
     FHA功能的数据核心，封装了所有基于Pandas DataFrame的数据操作。
@@ -34,67 +57,482 @@ class FHA_Model:
         "", "灾难的 (Catastrophic)", "危险的 (Hazardous)", "严重的 (Major)",
         "轻微的 (Minor)", "无安全影响 (No Safety Effect)"
     ]
+    # 枚举型列以 pandas Categorical 存储（整数编码）；None 表示类别完全由数据决定
+    CATEGORICAL_COLUMNS = {
+        '一级功能': None,
+        '功能类型': FUNCTION_TYPES,
+        '飞行阶段': MISSION_PHASES,
+        '危害性分类': ARP4761_CATEGORIES,
+    }
 
     def __init__(self):
-        self.dataframe = pd.DataFrame(columns=self.TABLE_COLUMNS)
-
-    def load_dataframe(self, df: pd.DataFrame):
-        df_reset = df.reset_index(drop=True)
-        self.dataframe = df_reset.reindex(columns=self.TABLE_COLUMNS).fillna('')
+        self._dataframe = self.new_blank_dataframe()
+        self._renumber_depth = 0
+        self._renumber_pending = False
+        # 修订号：每次修改加一。行版本与行位置一一对应，行每被修改一次就分配一个全局唯一的新版本号，
+        # 因此增删行导致位置移动后，版本号仍能区分“同一位置上的不同行”
+        self.revision = 0
+        self.modified_at = datetime.now(timezone.utc)
+        self._version_seq = 0
+        self.row_versions = np.zeros(0, dtype=np.int64)
+        self._sort_revision: Optional[int] = None
+        self._sort_cache: Dict[Tuple, np.ndarray] = {}
+        self.dashboard = FHA_DashboardStats(self)
+        self.search_index = FunctionSearchIndex(self)
+
+    @property
+    def dataframe(self) -> pd.DataFrame:
+        return self._dataframe
+
+    @dataframe.setter
+    def dataframe(self, df: pd.DataFrame):
+        # 直接赋值视为整表替换：行版本、看板计数与搜索索引随之重建，不会与表格错位
+        self.install_dataframe(df)
+
+    def _touch(self):
+        self.revision += 1
+        self.modified_at = datetime.now(timezone.utc)
+
+    def _new_versions(self, count: int) -> np.ndarray:
+        start = self._version_seq + 1
+        self._version_seq += count
+        self._touch()
+        return np.arange(start, start + count, dtype=np.int64)
+
+    def new_project(self):
+        self._dataframe = self.new_blank_dataframe()
+        self.row_versions = self._new_versions(0)
+        self.dashboard.rebuild()
+        self.search_index.rebuild()
+
+    @classmethod
+    def base_categories(cls, column: str) -> List[str]:
+        """枚举型列的预定义类别，空字符串始终是合法取值。"""
+        base = cls.CATEGORICAL_COLUMNS[column] or []
+        return base if "" in base else [""] + base
+
+    def new_blank_dataframe(self) -> pd.DataFrame:
+        df = pd.DataFrame(columns=self.TABLE_COLUMNS)
+        return df.astype({column: pd.CategoricalDtype(self.base_categories(column))
+                          for column in self.CATEGORICAL_COLUMNS})
+
+    @staticmethod
+    def ensure_categories(df: pd.DataFrame, column: str, values) -> None:
+        """若 df[column] 是 Categorical 且 values 中有尚未登记的取值，则就地扩充类别。"""
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            missing = pd.Index(pd.unique(pd.Series(values, dtype=object))).difference(df[column].cat.categories)
+            if len(missing):
+                df[column] = df[column].cat.add_categories(missing)
+
+    def _conform_categories(self, new_df: pd.DataFrame, table: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """使 new_df 的枚举型列与 table（缺省为当前表）共用同一组类别，拼接后仍保持 Categorical。"""
+        table = self.dataframe if table is None else table
+        for column in self.CATEGORICAL_COLUMNS:
+            if not isinstance(table[column].dtype, pd.CategoricalDtype):
+                table[column] = table[column].astype(object).fillna('').astype('category')
+            values = new_df[column].astype(object).fillna('')
+            self.ensure_categories(table, column, values)
+            new_df[column] = pd.Categorical(values, dtype=table[column].dtype)
+        return new_df
+
+    def load_dataframe(self, df: Union[pd.DataFrame, Iterable[pd.DataFrame]]):
+        """加载整张表：install_dataframe(read_dataframe(df))，加载失败时保留原数据。"""
+        self.install_dataframe(self.read_dataframe(df))
+
+    def read_dataframe(self, df: Union[pd.DataFrame, Iterable[pd.DataFrame]]) -> pd.DataFrame:
+        """把 df 读成本模型的表格结构并返回，不修改模型，解析上传文件时不必持有 fha_model_lock。
+        df 也可以是依次产出 DataFrame 分块的可迭代对象（见 iter_excel_chunks），
+        分块逐个裁剪到表格列并转换为 Categorical，交给 ChunkAccumulator 后即释放，最后每列只拼接一次。"""
+        chunks = [df] if isinstance(df, pd.DataFrame) else df
+        table = self.new_blank_dataframe()
+        accumulator = ChunkAccumulator(self.TABLE_COLUMNS)
+        for chunk in chunks:
+            frame = chunk.reindex(columns=self.TABLE_COLUMNS)
+            del chunk  # 不让原始分块留到下一个分块读入之后
+            frame = frame.astype({column: object for column in self.CATEGORICAL_COLUMNS}).fillna('')
+            accumulator.add(self._conform_categories(frame, table))
+        return accumulator.finish(table, ignore_index=True)
+
+    def install_dataframe(self, df: pd.DataFrame):
+        """用 read_dataframe() 读出的表替换当前数据。"""
+        self._dataframe = df
+        self.row_versions = self._new_versions(len(self.dataframe))
+        self.dashboard.rebuild()
+        self.search_index.rebuild()
         self.re_number_ids()
 
     def update_cell(self, row_index: int, column_name: str, new_value: Any):
-        if row_index >= len(self.dataframe) or column_name not in self.dataframe.columns:
+        if not 0 <= row_index < len(self.dataframe) or column_name not in self.dataframe.columns:
             raise IndexError("行或列的索引/名称超出了范围。")
+        # 各列均为文本（导入时同样逐格转换为字符串），数字、布尔等取值按其文本形式保存，None 视为空
+        new_value = '' if new_value is None else str(new_value)
+        counted = column_name in FHA_DashboardStats.COLUMNS
+        if counted:
+            before = self.dashboard.row_values(row_index)
+        self.ensure_categories(self.dataframe, column_name, [new_value])
         self.dataframe.loc[row_index, column_name] = new_value
+        if counted:
+            self.dashboard.add_values(before, -1)
+            self.dashboard.add_values(tuple(new_value if column == column_name else value
+                                            for column, value in zip(FHA_DashboardStats.COLUMNS, before)))
+        self.search_index.set_value(row_index, column_name, self.dataframe.at[row_index, column_name])
+        self.row_versions[row_index] = self._new_versions(1)[0]
 
     def delete_rows(self, row_indices: List[int]):
+        """按行位置删除：一次构造布尔掩码完成删除，各列 dtype（包括 Categorical）保持不变。"""
         if not row_indices or self.dataframe.empty: return
-        positions_to_delete = set(row_indices)
-        rows_to_keep = [row for index, row in self.dataframe.iterrows() if index not in positions_to_delete]
-        if not rows_to_keep:
-            self.dataframe = pd.DataFrame(columns=self.TABLE_COLUMNS)
-        else:
-            self.dataframe = pd.DataFrame(rows_to_keep).reset_index(drop=True)
+        positions = np.unique(np.asarray(row_indices, dtype=np.int64))
+        if positions[0] < 0 or positions[-1] >= len(self.dataframe):
+            raise IndexError("行索引超出了范围。")
+        keep = np.ones(len(self.dataframe), dtype=bool)
+        keep[positions] = False
+        self.dashboard.add(self.dataframe.iloc[positions], -1)
+        self._dataframe = self.dataframe[keep].reset_index(drop=True)
+        self.row_versions = self.row_versions[keep]
+        self.search_index.keep(keep)
+        self._touch()
         self.re_number_ids()
 
     def add_fha_entries(self, entries_list: List[Dict]):
         if not entries_list: return
-        new_df = pd.DataFrame(entries_list, columns=self.TABLE_COLUMNS).fillna('')
-        self.dataframe = pd.concat([self.dataframe, new_df], ignore_index=True)
+        new_df = self._conform_categories(pd.DataFrame(entries_list, columns=self.TABLE_COLUMNS).fillna(''))
+        self.search_index.splice(len(self.dataframe), len(self.dataframe), new_df)
+        self._dataframe = pd.concat([self.dataframe, new_df], ignore_index=True)
+        self.dashboard.add(new_df)
+        self.row_versions = np.concatenate([self.row_versions, self._new_versions(len(new_df))])
         self.re_number_ids()
 
     def update_fha_entries_from_wizard(self, source_index: int, wizard_results: List[Dict]):
         if not wizard_results: return
-        df_before = self.dataframe.iloc[:source_index]
-        df_after = self.dataframe.iloc[source_index + 1:]
         new_entries = []
         source_row_data = self.dataframe.loc[source_index].copy()
         for result in wizard_results:
             new_entry = source_row_data.copy()
             new_entry.update(result)
             new_entries.append(new_entry)
-        df_new = pd.DataFrame(new_entries, columns=self.TABLE_COLUMNS)
-        self.dataframe = pd.concat([df_before, df_new, df_after], ignore_index=True)
+        df_new = self._conform_categories(pd.DataFrame(new_entries, columns=self.TABLE_COLUMNS))
+        df_before = self.dataframe.iloc[:source_index]
+        df_after = self.dataframe.iloc[source_index + 1:]
+        self.dashboard.add_values(self.dashboard.row_values(source_index), -1)
+        self._dataframe = pd.concat([df_before, df_new, df_after], ignore_index=True)
+        self.dashboard.add(df_new)
+        self.search_index.splice(source_index, source_index + 1, df_new)
+        self.row_versions = np.concatenate([self.row_versions[:source_index], self._new_versions(len(df_new)),
+                                            self.row_versions[source_index + 1:]])
         self.re_number_ids()
 
+    def sort_key(self, column: str) -> np.ndarray:
+        """column 的排序键数组：危害性分类按严重程度（ARP4761 顺序），编号按行位置，row_version 按行版本，其余列按文本。"""
+        if column == '编号':
+            return np.arange(len(self.dataframe))
+        if column == 'row_version':
+            return self.row_versions
+        series = self.dataframe[column]
+        if not isinstance(series.dtype, pd.CategoricalDtype):
+            return series.to_numpy(dtype=object)
+        codes = series.cat.codes.to_numpy()
+        if column == '危害性分类':
+            return codes
+        categories = series.cat.categories
+        ranks = np.empty(len(categories), dtype=np.int64)
+        ranks[categories.astype(str).argsort()] = np.arange(len(categories))
+        return ranks[codes]
+
+    def sorted_positions(self, keys: Iterable[Tuple[str, bool]] = ()) -> np.ndarray:
+        """按 keys = [(列名, 是否升序), ...] 稳定排序后的行位置；结果按修订号缓存，翻页时不会重复排序。"""
+        keys = tuple(keys)
+        if self._sort_revision != self.revision:
+            self._sort_cache, self._sort_revision = {}, self.revision
+        order = self._sort_cache.get(keys)
+        if order is None:
+            if keys:
+                frame = pd.DataFrame({i: self.sort_key(column) for i, (column, _) in enumerate(keys)})
+                order = frame.sort_values(list(range(len(keys))), ascending=[asc for _, asc in keys],
+                                          kind='stable').index.to_numpy()
+            else:
+                order = np.arange(len(self.dataframe))
+            self._sort_cache[keys] = order
+        return order
+
     def re_number_ids(self):
+        """整列一次性赋值连续编号；在 deferred_renumber() 内只做标记，退出时统一执行。"""
+        if self._renumber_depth:
+            self._renumber_pending = True
+            return
+        self._renumber_pending = False
         if self.dataframe.empty: return
-        for i in range(len(self.dataframe)):
-            self.dataframe.loc[i, '编号'] = f"FHA-{i + 1:03d}"
+        self.dataframe['编号'] = id_labels(len(self.dataframe))
+
+    @contextmanager
+    def deferred_renumber(self):
+        """推迟重新编号：块内的多次增删只在退出最外层时统一编号一次。"""
+        self._renumber_depth += 1
+        try:
+            yield self
+        finally:
+            self._renumber_depth -= 1
+            if not self._renumber_depth and self._renumber_pending:
+                self.re_number_ids()
+
+
+class FunctionSearchIndex:
+    """功能名称的 n-gram 倒排索引，供 /fha/data 的 function_name 模糊搜索使用。
+
+    三个功能列中出现过的每个不同取值分配一个编号，各列另存一份与行位置对齐的编号数组（与 row_versions 一样随增删改维护）；
+    每个取值按单字与相邻双字切分（中文无需分词），倒排表记录 gram -> 取值编号。查询时对各 gram 的倒排表求交集得到候选取值，
+    逐个核对子串后把命中的取值编号映射回行，不再对整列做字符串匹配。匹配按字面子串进行（与 str.contains(regex=False) 一致），
+    不解析正则表达式。删除或改写行后不再出现的取值会留在表中，累计改动的单元格数超过行数时由 compact() 清除；整表替换时重建。
+    """
+    COLUMNS = ('一级功能', '二级功能', '三级功能')
+    COMPACT_MIN_CHANGES = 1024  # 行数较少时的压缩阈值下限，避免小表频繁压缩
+
+    def __init__(self, model: FHA_Model):
+        self.model = model
+        self.rebuild()
+
+    def rebuild(self):
+        self.values: List[str] = []  # 编号 -> 大写后的取值（匹配不区分大小写）
+        self.value_ids: Dict[str, int] = {}
+        self.grams: Dict[str, set] = {}
+        self.codes = {column: self.encode(self.model.dataframe[column]) for column in self.COLUMNS}
+        self._changes = 0  # 上次重建或压缩以来被删除或改写的单元格数
+
+    def compact(self):
+        """丢弃已不在任何行中出现的取值，重建倒排表并重新映射各列的编号数组。"""
+        live = np.unique(np.concatenate(list(self.codes.values())))
+        remap = np.zeros(len(self.values), dtype=np.int32)
+        remap[live] = np.arange(len(live), dtype=np.int32)
+        values = [self.values[value_id] for value_id in live]
+        self.values, self.value_ids, self.grams = [], {}, {}
+        for key in values:
+            self._key_id(key)
+        self.codes = {column: remap[codes] for column, codes in self.codes.items()}
+        self._changes = 0
+
+    def _note_changes(self, count: int):
+        # 压缩的开销与行数成正比，累计改动超过行数才压缩一次，均摊到每次改动为 O(1)
+        self._changes += count
+        if self._changes > max(len(self.model.dataframe), self.COMPACT_MIN_CHANGES):
+            self.compact()
+
+    @staticmethod
+    def ngrams(text: str) -> set:
+        return set(text) | {text[i:i + 2] for i in range(len(text) - 1)}
+
+    def _value_id(self, value: Any) -> int:
+        # 与 str.contains(na=False) 一致：非字符串（含 NaN）视为不可匹配的空串
+        return self._key_id(value.upper() if isinstance(value, str) else '')
+
+    def _key_id(self, key: str) -> int:
+        value_id = self.value_ids.get(key)
+        if value_id is None:
+            value_id = self.value_ids[key] = len(self.values)
+            self.values.append(key)
+            for gram in self.ngrams(key):
+                self.grams.setdefault(gram, set()).add(value_id)
+        return value_id
+
+    def encode(self, series: pd.Series) -> np.ndarray:
+        """把一列取值转换为取值编号数组；每个不同取值只切分一次。"""
+        codes, uniques = pd.factorize(series.to_numpy(dtype=object), use_na_sentinel=False)
+        lookup = np.fromiter((self._value_id(value) for value in uniques), dtype=np.int32, count=len(uniques))
+        return lookup[codes]
+
+    def splice(self, start: int, stop: int, rows: pd.DataFrame):
+        """行位置 [start, stop) 被 rows 替换（追加时 start == stop == 行数）。"""
+        for column in self.COLUMNS:
+            codes = self.codes[column]
+            self.codes[column] = np.concatenate([codes[:start], self.encode(rows[column]), codes[stop:]])
+        self._note_changes((stop - start) * len(self.COLUMNS))
+
+    def keep(self, mask: np.ndarray):
+        for column in self.COLUMNS:
+            self.codes[column] = self.codes[column][mask]
+        self._note_changes(int((~mask).sum()) * len(self.COLUMNS))
+
+    def set_value(self, position: int, column: str, value: Any):
+        if column in self.codes:
+            self.codes[column][position] = self._value_id(value)
+            self._note_changes(1)
+
+    def search(self, text: str) -> np.ndarray:
+        """任一功能列包含 text（不区分大小写）的行的布尔掩码。"""
+        pattern = text.upper()
+        grams = {pattern[i:i + 2] for i in range(len(pattern) - 1)} or {pattern}
+        postings = sorted((self.grams.get(gram, set()) for gram in grams), key=len)
+        hit = np.zeros(len(self.values), dtype=bool)
+        for value_id in set.intersection(*postings):
+            hit[value_id] = pattern in self.values[value_id]
+        mask = np.zeros(len(self.model.dataframe), dtype=bool)
+        if hit.any():
+            for codes in self.codes.values():
+                mask |= hit[codes]
+        return mask
 
 
-# --- 模块内的常量定义 ---
-FAILURE_MODE_LIBRARY = {"通用": ["功能完全丧失", "功能间歇性工作", "功能性能下降", "功能非预期启动"],
-                        "传感器": ["持续输出错误信息", "输出数据冻结/卡死", "数据跳变/噪声过大", "输出数据延迟"],
-                        "数据传输": ["数据包丢失", "数据完整性破坏 (误码)", "通信中断"],
-                        "执行机构": ["无响应/卡死", "响应延迟/迟钝", "动作超调/不到位", "反向运动"],
-                        "电源": ["电压/电流异常", "供电中断"], "导航": ["定位精度下降", "航向错误", "速度信息错误"],
-                        "飞控算法": ["算法发散", "模式切换错误"]}
-MISSION_PHASES = ["地面检查", "启动", "垂直起飞", "过渡飞行", "巡航", "悬停作业", "返航", "垂直降落", "关机"]
-FUNCTION_TYPES = ["电源", "传感器", "执行机构", "数据传输", "飞控算法", "导航", "通信", "其他"]
-
 fha_model_instance = FHA_Model()
+# 同步接口在线程池中并发执行：只读接口持有读锁可并行，修改接口持有写锁串行执行
+fha_model_lock = ReadWriteLock()
+
+
+def project_etag(model: FHA_Model, variant: str = "") -> str:
+    """整表的 ETag；同一数据的不同表示（如 NDJSON、Arrow 流）用 variant 区分。"""
+    return f'"r{model.revision}-{variant}"' if variant else f'"r{model.revision}"'
+
+
+def row_etag(model: FHA_Model, row_index: int) -> str:
+    return f'"{model.row_versions[row_index]}"'
+
+
+def not_modified(request: Request, response: Response, model: FHA_Model,
+                 etag: Optional[str] = None) -> Optional[Response]:
+    """条件 GET：为响应设置 ETag（默认为整表的 ETag）/ Last-Modified；客户端持有的版本仍是最新时返回 304 响应，否则返回 None。
+
+    If-None-Match 优先于 If-Modified-Since（后者只精确到秒）。
+    """
+    etag = etag or project_etag(model)
+    validators = {"ETag": etag, "Last-Modified": format_datetime(model.modified_at, usegmt=True),
+                  "Cache-Control": "no-cache"}
+    response.headers.update(validators)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        fresh = "*" in tags or etag in tags
+    else:
+        try:
+            since = parsedate_to_datetime(request.headers["if-modified-since"])
+            fresh = model.modified_at.replace(microsecond=0) <= since
+        except (KeyError, TypeError, ValueError):
+            fresh = False
+    return Response(status_code=304, headers=validators) if fresh else None
+
+
+# 分页、列投影与排序
+MAX_PAGE_SIZE = 5000
+DATA_FIELDS = FHA_Model.TABLE_COLUMNS + ['row_version']
+
+
+def parse_fields(fields: Optional[str], allowed: List[str]) -> List[str]:
+    """解析 fields= 列投影参数（逗号分隔的列名），未给出时返回全部列；未知列返回 400。"""
+    if not fields:
+        return list(allowed)
+    columns = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in columns if name not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"未知的列: {', '.join(unknown)}")
+    return columns
+
+
+def parse_sort(sort: Optional[str], allowed: List[str]) -> List[Tuple[str, bool]]:
+    """解析 sort= 排序参数：逗号分隔的列名，前缀 - 表示降序；返回 [(列名, 是否升序), ...]。"""
+    keys: Dict[str, bool] = {}
+    for item in (sort or "").split(","):
+        item = item.strip()
+        name = item.lstrip("-")
+        if not name:
+            continue
+        if name not in allowed:
+            raise HTTPException(status_code=400, detail=f"未知的排序列: {name}")
+        keys.setdefault(name, not item.startswith("-"))
+    return list(keys.items())
+
+
+def page_headers(request: Request, total: int, offset: int, count: int) -> Dict[str, str]:
+    """分页响应头：X-Total-Count 为筛选后的总行数；还有下一页时附带 Link: <...>; rel="next"。"""
+    headers = {"X-Total-Count": str(total)}
+    if offset + count < total:
+        headers["Link"] = f'<{request.url.include_query_params(offset=offset + count)}>; rel="next"'
+    return headers
+
+
+def data_records(df: pd.DataFrame, row_versions: np.ndarray, positions: np.ndarray,
+                 columns: List[str]) -> List[Dict[str, Any]]:
+    """按列批量取出指定位置的行并拼成字典列表；数据来自模型本身，不逐行经过 Pydantic 校验。"""
+    values = []
+    for name in columns:
+        if name == 'row_version':
+            values.append(row_versions[positions].tolist())
+        else:
+            values.append(df[name].take(positions).tolist())
+    return [dict(zip(columns, row)) for row in zip(*values)]
+
+
+def dump_json(content: Any) -> bytes:
+    """编码为紧凑的 UTF-8 JSON；优先使用 orjson。"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """用 orjson 直接把内容编码为 UTF-8 JSON 字节；未安装 orjson 时退回标准库 json。"""
+
+    def render(self, content: Any) -> bytes:
+        return dump_json(content)
+
+
+# 流式输出：按 Accept 头协商，逐块编码，内存占用只与块大小有关
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+STREAM_CHUNK_ROWS = 2000
+
+
+def stream_media_type(accept: Optional[str]) -> Optional[str]:
+    """从 Accept 头中选出流式格式（Arrow 优先于 NDJSON）；普通 JSON 请求返回 None。"""
+    accept = (accept or "").lower()
+    for media_type in (ARROW_STREAM_MEDIA_TYPE, NDJSON_MEDIA_TYPE):
+        if media_type in accept:
+            return media_type
+    return None
+
+
+def iter_ndjson(df: pd.DataFrame, row_versions: np.ndarray, positions: np.ndarray, columns: List[str],
+                chunk_rows: int = STREAM_CHUNK_ROWS) -> Iterator[bytes]:
+    """逐块把行编码为 NDJSON（每行一个 JSON 对象）。"""
+    for start in range(0, len(positions), chunk_rows):
+        records = data_records(df, row_versions, positions[start:start + chunk_rows], columns)
+        yield b"".join(dump_json(record) + b"\n" for record in records)
+
+
+def iter_arrow_stream(df: pd.DataFrame, row_versions: np.ndarray, positions: np.ndarray, columns: List[str],
+                      chunk_rows: int = STREAM_CHUNK_ROWS) -> Iterator[bytes]:
+    """逐块把行编码为 Arrow IPC 流，每块一个 RecordBatch；row_version 为 int64，其余列为字符串。
+
+    pyarrow 在此处（而不是生成器内部）导入，未安装时在发送响应头之前就会失败。
+    """
+    import pyarrow as pa
+    schema = pa.schema([(name, pa.int64() if name == 'row_version' else pa.string()) for name in columns])
+
+    def batches() -> Iterator[bytes]:
+        sink = ChunkSink()
+        with pa.ipc.new_stream(sink, schema) as writer:
+            for start in range(0, len(positions), chunk_rows):
+                chunk = positions[start:start + chunk_rows]
+                arrays = [pa.array(row_versions[chunk], type=pa.int64()) if name == 'row_version'
+                          else pa.array(df[name].take(chunk).tolist(), type=pa.string()) for name in columns]
+                writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+                yield sink.drain()
+        yield sink.drain()
+
+    return batches()
+
+
+STREAM_WRITERS: Dict[str, Callable[..., Iterator[bytes]]] = {
+    NDJSON_MEDIA_TYPE: iter_ndjson,
+    ARROW_STREAM_MEDIA_TYPE: iter_arrow_stream,
+}
+STREAM_ETAG_VARIANTS = {NDJSON_MEDIA_TYPE: "ndjson", ARROW_STREAM_MEDIA_TYPE: "arrow"}
+
+
+def check_if_match(if_match: Optional[str], model: FHA_Model, row_index: int) -> None:
+    """乐观并发控制：If-Match 必须是该行当前的 ETag、整表当前的 ETag 或 *，否则返回 412。"""
+    if if_match is None or not 0 <= row_index < len(model.row_versions):
+        return
+    current = row_etag(model, row_index)
+    tags = {tag.strip().removeprefix("W/") for tag in if_match.split(",")}
+    if not tags & {"*", current, project_etag(model)}:
+        raise HTTPException(status_code=412, detail="该行已被其他用户修改，请重新获取后再提交。",
+                            headers={"ETag": current})
 
 
 # ==============================================================================
@@ -113,7 +551,8 @@ class CellUpdateRequest(BaseModel):
     """定义“更新单元格”接口的请求体结构。"""
     row_index: int = Field(..., description="要更新的行的位置索引（从0开始）。", example=0)
     column_name: str = Field(..., description="要更新的列的名称。", example="理由/备注")
-    new_value: Any = Field(..., description="单元格的新值。", example="根据最新测试数据更新。")
+    new_value: Any = Field(..., description="单元格的新值；按文本保存，非字符串取值转换为其字符串形式，null 视为空。",
+                           example="根据最新测试数据更新。")
 
 
 class WizardResult(BaseModel):
@@ -141,9 +580,10 @@ class WizardAnalysisRequest(BaseModel):
     description="清空当前所有数据，并根据提供的功能骨架列表创建一个全新的FHA项目。"
 )
 def new_project(entries: List[FHAEntry]):
-    fha_model_instance.dataframe = pd.DataFrame(columns=FHA_Model.TABLE_COLUMNS)
-    fha_model_instance.add_fha_entries([e.dict() for e in entries])
-    return {"message": "项目框架已成功生成", "total": len(fha_model_instance.dataframe)}
+    with fha_model_lock.write():
+        fha_model_instance.new_project()
+        fha_model_instance.add_fha_entries([e.dict() for e in entries])
+        return {"message": "项目框架已成功生成", "total": len(fha_model_instance.dataframe)}
 
 
 @router.post(
@@ -157,14 +597,16 @@ def new_project(entries: List[FHAEntry]):
     - 表头应尽可能与FHA表格的列名匹配，系统会自动匹配存在的列。
     """
 )
-async def import_fha_table(file: UploadFile = File(...)):
+def import_fha_table(file: UploadFile = File(...)):
     if not file.filename.endswith(('.xlsx', '.xls')):
         raise HTTPException(status_code=400, detail="文件格式错误，请上传一个标准的 .xlsx Excel 文件。")
     try:
-        contents = await file.read()
-        df = pd.read_excel(io.BytesIO(contents), engine='openpyxl').fillna('').astype(str)
-        fha_model_instance.load_dataframe(df)
-        return {"message": "FHA表格导入成功", "total": len(fha_model_instance.dataframe)}
+        # 上传内容已由框架暂存在临时文件中，直接从该文件流式解析，不再整体读入内存；
+        # 解析不持锁，只在换入新表时持有写锁，导入大文件期间其他请求照常读写
+        frame = fha_model_instance.read_dataframe(iter_excel_chunks(file.file))
+        with fha_model_lock.write():
+            fha_model_instance.install_dataframe(frame)
+            return {"message": "FHA表格导入成功", "total": len(fha_model_instance.dataframe)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"文件处理失败: {e}")
 
@@ -175,14 +617,14 @@ async def import_fha_table(file: UploadFile = File(...)):
     description="将当前项目中的所有FHA数据导出为一个标准的Excel(.xlsx)文件。"
 )
 def export_excel():
-    if fha_model_instance.dataframe.empty:
-        raise HTTPException(status_code=404, detail="没有可导出的数据。")
-    output = io.BytesIO()
-    fha_model_instance.dataframe.to_excel(output, index=False, engine='openpyxl')
-    output.seek(0)
+    with fha_model_lock.read():
+        if fha_model_instance.dataframe.empty:
+            raise HTTPException(status_code=404, detail="没有可导出的数据。")
+        # 以请求时刻的表格快照边编码边发送，服务端只缓冲当前分块
+        snapshot = fha_model_instance.dataframe.copy(deep=False)
     return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        iter_xlsx_bytes(snapshot),
+        media_type=XLSX_MEDIA_TYPE,
         headers={"Content-Disposition": "attachment; filename=fha_report.xlsx"}
     )
 
@@ -191,41 +633,100 @@ def export_excel():
     "/fha/data",
     summary="获取FHA表格数据 (支持筛选)",
     description="""
-    获取当前项目中的所有FHA数据行。
+    获取当前项目中的所有FHA数据行。每行附带 `row_version`，响应头 `ETag` / `Last-Modified` 对应整表的当前修订。
+    条件请求：带 `If-None-Match`（或 `If-Modified-Since`）且数据未变化时返回 304，不重新计算与序列化。
     高级功能：服务器端筛选
     - `hazard_category`: 按“危害性分类”进行精确匹配筛选。
-    - `function_name`: 在“一级功能”、“二级功能”和“三级功能”三列中进行不区分大小写的模糊搜索。
+    - `function_name`: 在“一级功能”、“二级功能”和“三级功能”三列中进行不区分大小写的模糊搜索
+      （经由模型维护的 n-gram 倒排索引，不逐行匹配字符串）。按字面子串匹配，不支持正则表达式：
+      `.`、`*`、`|` 等字符按原样匹配。
+    分页、投影与排序
+    - `offset` / `limit`: 返回筛选、排序后的第 offset 行起的至多 limit 行；响应头 `X-Total-Count` 为总行数，
+      还有下一页时 `Link` 头给出下一页地址。
+    - `fields`: 逗号分隔的返回列，如 `编号,一级功能,危害性分类`。
+    - `sort`: 逗号分隔的排序列，前缀 `-` 表示降序，如 `-危害性分类,编号`；危害性分类按严重程度排序。
+    流式输出（按 `Accept` 头协商，筛选、分页、投影与排序同样适用）
+    - `application/x-ndjson`: 每行一个 JSON 对象，逐块发送。
+    - `application/vnd.apache.arrow.stream`: Arrow IPC 流，每块一个 RecordBatch。
     """
 )
 def get_fha_data(
+        request: Request,
+        response: Response,
         hazard_category: Optional[str] = Query(None, description="按危害性分类进行精确筛选。",
                                                example="危险的 (Hazardous)"),
-        function_name: Optional[str] = Query(None, description="按功能名称进行模糊搜索。", example="导航")
+        function_name: Optional[str] = Query(None, description="按功能名称进行模糊搜索（字面子串，不区分大小写，不支持正则表达式）。",
+                                             example="导航"),
+        offset: int = Query(0, ge=0, description="跳过的行数。"),
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="本页最多返回的行数，缺省返回全部。"),
+        fields: Optional[str] = Query(None, description="逗号分隔的返回列。", example="编号,一级功能,危害性分类"),
+        sort: Optional[str] = Query(None, description="逗号分隔的排序列，前缀 - 表示降序。", example="-危害性分类,编号")
 ) -> List[Dict[str, Any]]:
-    df = fha_model_instance.dataframe.copy()
-    if hazard_category:
-        df = df[df['危害性分类'] == hazard_category]
-    if function_name:
-        df = df[df['一级功能'].str.contains(function_name, case=False, na=False) |
-                df['二级功能'].str.contains(function_name, case=False, na=False) |
-                df['三级功能'].str.contains(function_name, case=False, na=False)]
-    return df.to_dict(orient='records')
+    columns = parse_fields(fields, DATA_FIELDS)
+    sort_keys = parse_sort(sort, DATA_FIELDS)
+    stream_type = stream_media_type(request.headers.get("accept"))
+    with fha_model_lock.read():
+        etag = project_etag(fha_model_instance, STREAM_ETAG_VARIANTS.get(stream_type, ""))
+        cached = not_modified(request, response, fha_model_instance, etag)
+        response.headers["Vary"] = "Accept"
+        if cached is not None:
+            cached.headers["Vary"] = "Accept"
+            return cached
+        df = fha_model_instance.dataframe
+        row_versions = fha_model_instance.row_versions
+        order = fha_model_instance.sorted_positions(sort_keys)
+        if hazard_category or function_name:
+            mask = np.ones(len(df), dtype=bool)
+            if hazard_category:
+                mask &= (df['危害性分类'] == hazard_category).to_numpy()
+            if function_name:
+                mask &= fha_model_instance.search_index.search(function_name)
+            order = order[mask[order]]
+        # 只取本页的行再转换，单页的开销与表的总行数无关
+        page = order[offset:offset + limit if limit else None]
+        if stream_type is None:
+            records = data_records(df, row_versions, page, columns)
+        else:
+            # 流式响应在锁外逐块编码，因此先取快照（数据帧浅拷贝即可，写时复制；行版本会被原地修改，需复制）
+            df, row_versions = df.copy(deep=False), row_versions.copy()
+    response.headers.update(page_headers(request, len(order), offset, len(page)))
+    if stream_type is None:
+        return FastJSONResponse(records, headers=dict(response.headers))
+    try:
+        chunks = STREAM_WRITERS[stream_type](df, row_versions, page, columns)
+    except ImportError:
+        raise HTTPException(status_code=406, detail="服务器未安装 pyarrow，无法输出 Arrow 流。")
+    return StreamingResponse(chunks, media_type=stream_type, headers=dict(response.headers))
 
 
 @router.patch(
     "/fha/cell/update",
     summary="更新单个单元格数据",
-    description="用于实现在表格内直接编辑的功能。此接口根据行、列位置精确更新一个单元格的值。"
+    description="""
+    用于实现在表格内直接编辑的功能。此接口根据行、列位置精确更新一个单元格的值。
+    乐观并发控制：请求头 `If-Match` 可携带该行的 ETag（即 `row_version`）或整表的 ETag，
+    若该行在此期间已被修改则返回 412，响应头 `ETag` 给出该行当前的版本。
+    """
 )
-def update_cell(request: CellUpdateRequest):
+def update_cell(request: CellUpdateRequest, response: Response, if_match: Optional[str] = Header(None)):
     try:
-        fha_model_instance.update_cell(
-            row_index=request.row_index,
-            column_name=request.column_name,
-            new_value=request.new_value
-        )
-        updated_row = fha_model_instance.dataframe.iloc[request.row_index].to_dict()
-        return {"message": "更新成功", "updated_row": updated_row}
+        with fha_model_lock.write():
+            # 先确认行存在再比较 If-Match：负数或越界的位置一律 404，不会在 .loc 上追加出新行
+            if not 0 <= request.row_index < len(fha_model_instance.dataframe):
+                raise HTTPException(status_code=404, detail="行或列不存在。")
+            check_if_match(if_match, fha_model_instance, request.row_index)
+            fha_model_instance.update_cell(
+                row_index=request.row_index,
+                column_name=request.column_name,
+                new_value=request.new_value
+            )
+            updated_row = fha_model_instance.dataframe.iloc[request.row_index].to_dict()
+            row_version = int(fha_model_instance.row_versions[request.row_index])
+            revision = fha_model_instance.revision
+        response.headers["ETag"] = f'"{row_version}"'
+        return {"message": "更新成功", "updated_row": updated_row, "row_version": row_version, "revision": revision}
+    except HTTPException:
+        raise
     except IndexError:
         raise HTTPException(status_code=404, detail="行或列不存在。")
     except Exception as e:
@@ -239,8 +740,11 @@ def update_cell(request: CellUpdateRequest):
 )
 def delete_rows(indices: List[int] = Query(..., description="要删除的行的位置索引列表（从0开始）。")):
     try:
-        fha_model_instance.delete_rows(indices)
-        return {"message": f"已成功删除 {len(indices)} 行。", "new_total": len(fha_model_instance.dataframe)}
+        with fha_model_lock.write():
+            fha_model_instance.delete_rows(indices)
+            return {"message": f"已成功删除 {len(set(indices))} 行。", "new_total": len(fha_model_instance.dataframe)}
+    except IndexError:
+        raise HTTPException(status_code=404, detail="要删除的行不存在。")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"删除行时发生错误: {str(e)}")
 
@@ -253,7 +757,8 @@ def delete_rows(indices: List[int] = Query(..., description="要删除的行的
 def wizard_analyze(request: WizardAnalysisRequest):
     try:
         results_dict = [r.dict(by_alias=True) for r in request.results]
-        fha_model_instance.update_fha_entries_from_wizard(request.source_index, results_dict)
+        with fha_model_lock.write():
+            fha_model_instance.update_fha_entries_from_wizard(request.source_index, results_dict)
         return {"message": "分析完成，表格已更新。"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"处理分析结果时出错: {e}")
@@ -263,54 +768,40 @@ def wizard_analyze(request: WizardAnalysisRequest):
     "/fha/dashboard",
     summary="获取仪表盘数据",
     description="计算并返回用于渲染前端“风险摘要”仪表盘的所有数据，包括KPIs、交叉分析矩阵和旭日图数据。"
+                "支持 If-None-Match / If-Modified-Since 条件请求，数据未变化时返回 304。"
 )
-def get_dashboard_data():
-    df = fha_model_instance.dataframe
-    if df.empty:
-        return {"message": "无数据可供分析"}
-
-    total_items = len(df[df['失效状态'] != ''])
-    hazard_counts = df['危害性分类'].value_counts()
-    cat_count = int(hazard_counts.get("灾难的 (Catastrophic)", 0))
-    haz_count = int(hazard_counts.get("危险的 (Hazardous)", 0))
-    kpis = {"total_items": total_items, "catastrophic_count": cat_count, "hazardous_count": haz_count}
-    df_analyzed = df[(df['一级功能'] != '') & (df['危害性分类'] != '')].copy()
+def get_dashboard_data(request: Request, response: Response):
+    with fha_model_lock.read():
+        cached = not_modified(request, response, fha_model_instance)
+        if cached is not None:
+            return cached
+        if fha_model_instance.dataframe.empty:
+            return {"message": "无数据可供分析"}
+        # 全部由模型增量维护的聚合导出，开销与功能数成正比，不扫描表格
+        stats = fha_model_instance.dashboard
+        kpis = stats.kpis()
+        functions, columns, counts = stats.cross_tab()
+        high_risk_count, top_func, top_func_cat_count, top_func_haz_count = stats.risk_summary()
+        sunburst_matrix = stats.matrix(exclude=("", NO_SAFETY_EFFECT))
     cross_tab_data, summary_text = {}, "暂无已完成分析的条目。"
-    if not df_analyzed.empty:
-        cross_tab = pd.crosstab(df_analyzed['一级功能'], df_analyzed['危害性分类'])
-        ordered_cols = [col for col in FHA_Model.ARP4761_CATEGORIES if col in cross_tab.columns and col != ""]
-        cross_tab = cross_tab.reindex(columns=ordered_cols).fillna(0)
-        cross_tab_data = {"index": cross_tab.index.tolist(), "columns": [c.split(' ')[0] for c in cross_tab.columns],
-                          "data": cross_tab.values.tolist()}
-        high_risk_items = df_analyzed[df_analyzed['危害性分类'].isin(["灾难的 (Catastrophic)", "危险的 (Hazardous)"])]
-        summary_text = f"当前共识别出 {len(high_risk_items)} 项高风险条目（灾难级或危险级）。\n\n"
-        if not cross_tab.empty:
-            high_risk_cols = [col for col in ["灾难的 (Catastrophic)", "危险的 (Hazardous)"] if
-                              col in cross_tab.columns]
-            if high_risk_cols:
-                top_func = cross_tab[high_risk_cols].sum(axis=1).idxmax()
-                top_func_cat_count = int(cross_tab.loc[
-                                             top_func, "灾难的 (Catastrophic)"]) if "灾难的 (Catastrophic)" in cross_tab.columns else 0
-                top_func_haz_count = int(
-                    cross_tab.loc[top_func, "危险的 (Hazardous)"]) if "危险的 (Hazardous)" in cross_tab.columns else 0
-                summary_text += f"核心关注点：\n风险主要集中在 “{top_func}” 系统中，其中包含 {top_func_cat_count} 个“灾难级”和 {top_func_haz_count} 个“危险级”风险。\n\n"
+    if functions:
+        cross_tab_data = {"index": functions, "columns": [c.split(' ')[0] for c in columns], "data": counts}
+        summary_text = f"当前共识别出 {high_risk_count} 项高风险条目（灾难级或危险级）。\n\n"
+        if top_func is not None:
+            summary_text += f"核心关注点：\n风险主要集中在 “{top_func}” 系统中，其中包含 {top_func_cat_count} 个“灾难级”和 {top_func_haz_count} 个“危险级”风险。\n\n"
         summary_text += "行动建议：\n请结合下方交叉分析矩阵，优先审查高风险区域对应的功能模块，并为这些风险制定缓解措施和验证计划。"
     sunburst_data = {}
-    df_filtered = df[
-        (df['一级功能'] != '') & (df['危害性分类'] != '') & (df['危害性分类'] != '无安全影响 (No Safety Effect)')]
-    if not df_filtered.empty:
-        data = df_filtered.groupby(['一级功能', '危害性分类']).size().reset_index(name='size')
+    if sunburst_matrix:
         sunburst_data = {"name": "风险分布", "children": []}
-        for func_name, func_group in data.groupby('一级功能'):
+        for func_name, func_counts in sunburst_matrix.items():
             func_node = {"name": func_name, "children": []}
-            for _, row in func_group.iterrows():
-                func_node["children"].append({"name": row['危害性分类'], "value": row['size']})
+            for category, size in func_counts.items():
+                func_node["children"].append({"name": category, "value": size})
             sunburst_data["children"].append(func_node)
 
     return {"kpis": kpis, "cross_analysis": {"matrix": cross_tab_data, "summary_text": summary_text},
             "sunburst_data": sunburst_data}
 
-
 @router.get(
     "/fha/definitions",
     summary="获取FHA相关定义",
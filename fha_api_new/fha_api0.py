@@ -1,22 +1,40 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Depends
-from fastapi.responses import Response
+from fastapi import FastAPI, HTTPException, UploadFile, File, Depends, Header, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict
-import pandas as pd
-import io
-import uuid
+from typing import List, Optional, Dict, Iterator, Tuple, Any
+from contextlib import asynccontextmanager
+import json
 from datetime import datetime
+from email.utils import format_datetime, parsedate_to_datetime
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时退回标准库 json
+    orjson = None
 
 # 导入核心业务逻辑
 from fha_core_logic import FHA_Model, FAILURE_MODE_LIBRARY
+from fha_shared import NO_SAFETY_EFFECT, XLSX_MEDIA_TYPE, iter_excel_chunks, iter_xlsx_bytes
+from fha_project_store import ProjectHandle, ProjectRegistry, SQLiteProjectStore
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 项目持久化在 SQLite 中（路径由 FHA_PROJECT_DB 指定），首次访问时加载，修改后由后台线程延后写回；
+    # 常驻内存的模型数量与大小受 FHA_CACHE_MAX_PROJECTS / FHA_CACHE_MAX_MB 限制，最久未用的模型会被淘汰。
+    # 注册表随应用启动创建，仅导入本模块不会创建数据库文件
+    app.state.projects = ProjectRegistry(SQLiteProjectStore())
+    try:
+        yield
+    finally:
+        # 服务停止前写回全部未保存的修改
+        app.state.projects.close()
+
 
 app = FastAPI(title="FHA 结构化分析系统 API",
               description="提供FHA分析系统的后端API接口",
-              version="1.0.0")
-
-# 存储项目会话的内存数据库
-projects_db = {}
+              version="1.0.0",
+              lifespan=lifespan)
 
 
 # Pydantic 模型定义
@@ -31,6 +49,8 @@ class ProjectResponse(BaseModel):
 
 
 class FHAEntry(BaseModel):
+    row_id: Optional[int] = Field(None, description="行键：条目不可变的内部标识，增删其他行时保持不变")
+    row_version: Optional[int] = Field(None, description="行版本：该行最近一次修改时的项目修订号")
     编号: Optional[str] = ""
     一级功能: Optional[str] = ""
     二级功能: Optional[str] = ""
@@ -73,19 +93,152 @@ class WizardResult(BaseModel):
 
 class WizardAnalysisRequest(BaseModel):
     """定义"引导式分析"接口的请求体结构。"""
-    source_index: int = Field(..., description="要被替换的原始行的位置索引。", example=5)
+    source_index: Optional[int] = Field(None, description="要被替换的原始行的位置索引。", example=5)
+    source_row_id: Optional[int] = Field(None, description="要被替换的原始行的行键，优先于 source_index。")
     results: List[WizardResult] = Field(..., description="分析结果列表")
 
 class FunctionalArchitectData(BaseModel):
     skeleton: List[Dict[str, str]] = Field(..., description="功能架构骨架数据")
 
+class SearchHit(BaseModel):
+    """全文检索的一条命中结果。"""
+    row_id: int = Field(..., description="命中条目的行键")
+    编号: str = ""
+    score: float = Field(..., description="相关度（bm25，越大越相关）")
+    highlights: Dict[str, str] = Field(..., description="命中列 -> 高亮片段，检索词以 <mark></mark> 标出")
 
-# 依赖项 - 获取项目模型
-def get_project_model(project_id: str) -> FHA_Model:
-    """获取指定项目的FHA模型实例"""
-    if project_id not in projects_db:
-        raise HTTPException(status_code=404, detail="Project not found")
-    return projects_db[project_id]["model"]
+
+# 依赖项 - 获取项目注册表与项目模型
+def get_projects(request: Request) -> ProjectRegistry:
+    """应用启动时创建的项目注册表"""
+    return request.app.state.projects
+
+
+def get_project(project_id: str, projects: ProjectRegistry = Depends(get_projects)) -> Iterator[ProjectHandle]:
+    """钉住指定项目（必要时从存储中加载），请求处理期间该模型不会被淘汰。
+    依赖项只钉住、不加锁：处理函数在函数体内用 project.read()（只读请求可并行）或 project.write()
+    （修改请求串行执行，且不与读请求交错）取得项目读写锁。依赖项与处理函数各自占用一次线程池线程，
+    若在依赖项中持锁，等锁的请求可能占满线程池，持锁的请求反而等不到线程运行处理函数"""
+    with projects.pin(project_id) as project:
+        if project is None:
+            raise HTTPException(status_code=404, detail="Project not found")
+        yield project
+
+
+def resolve_row_position(model: FHA_Model, row_id: int) -> int:
+    """行键 -> 当前行位置，行键不存在时返回404"""
+    try:
+        return model.position_of(row_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Row {row_id} not found")
+
+
+def project_etag(model: FHA_Model) -> str:
+    return f'"r{model.revision}"'
+
+
+def row_etag(model: FHA_Model, row_id: int) -> str:
+    return f'"{row_id}.{model.row_version(row_id)}"'
+
+
+def not_modified(request: Request, response: Response, model: FHA_Model,
+                 etag: Optional[str] = None) -> Optional[Response]:
+    """条件 GET：设置 ETag（默认为项目修订号）和 Last-Modified；
+    客户端持有的版本仍是最新时返回 304 响应，否则返回 None。If-None-Match 优先于 If-Modified-Since"""
+    etag = etag or project_etag(model)
+    validators = {"ETag": etag, "Last-Modified": format_datetime(model.modified_at, usegmt=True),
+                  "Cache-Control": "no-cache"}
+    response.headers.update(validators)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        fresh = "*" in tags or etag in tags
+    else:
+        try:
+            since = parsedate_to_datetime(request.headers["if-modified-since"])
+            fresh = model.modified_at.replace(microsecond=0) <= since
+        except (KeyError, TypeError, ValueError):
+            fresh = False
+    return Response(status_code=304, headers=validators) if fresh else None
+
+
+# 分页、列投影与排序
+MAX_PAGE_SIZE = 5000
+ENTRY_FIELDS = ['row_id', 'row_version'] + FHA_Model.TABLE_COLUMNS
+
+
+def parse_fields(fields: Optional[str], allowed: List[str]) -> List[str]:
+    """解析 fields= 列投影参数（逗号分隔的列名），未给出时返回全部列；未知列返回 400"""
+    if not fields:
+        return list(allowed)
+    columns = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in columns if name not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return columns
+
+
+def parse_sort(sort: Optional[str], allowed: List[str]) -> List[Tuple[str, bool]]:
+    """解析 sort= 排序参数：逗号分隔的列名，前缀 - 表示降序；返回 [(列名, 是否升序), ...]"""
+    keys: Dict[str, bool] = {}
+    for item in (sort or "").split(","):
+        item = item.strip()
+        name = item.lstrip("-")
+        if not name:
+            continue
+        if name not in allowed:
+            raise HTTPException(status_code=400, detail=f"Unknown sort field: {name}")
+        keys.setdefault(name, not item.startswith("-"))
+    return list(keys.items())
+
+
+def page_headers(request: Request, total: int, offset: int, count: int) -> Dict[str, str]:
+    """分页响应头：X-Total-Count 为总行数；还有下一页时附带 rel="next" 的 Link 头"""
+    headers = {"X-Total-Count": str(total)}
+    if offset + count < total:
+        headers["Link"] = f'<{request.url.include_query_params(offset=offset + count)}>; rel="next"'
+    return headers
+
+
+def entry_records(model: FHA_Model, positions, columns: List[str]) -> List[Dict[str, Any]]:
+    """按列批量取出指定位置的行，拼成条目字典（键为表格列名，即 FHAEntry 的别名）。
+    数据来自模型本身，已是合法条目，因此不逐行经过 Pydantic 校验"""
+    df = model.get_dataframe()
+    keys = df.index[positions]
+    values = []
+    for name in columns:
+        if name == 'row_id':
+            values.append(keys.tolist())
+        elif name == 'row_version':
+            values.append([model.row_version(key) for key in keys])
+        else:
+            values.append(df[name].take(positions).tolist())
+    return [dict(zip(columns, row)) for row in zip(*values)]
+
+
+class FastJSONResponse(JSONResponse):
+    """用 orjson 直接把内容编码为 UTF-8 JSON 字节；未安装 orjson 时退回标准库 json"""
+
+    def render(self, content) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content)
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def check_if_match(if_match: Optional[str], model: FHA_Model, row_id: int) -> None:
+    """乐观并发控制：If-Match 必须是该行当前的 ETag、项目当前的 ETag 或 *，否则返回 412"""
+    if if_match is None:
+        return
+    current = row_etag(model, row_id)
+    tags = {tag.strip().removeprefix("W/") for tag in if_match.split(",")}
+    if not tags & {"*", current, project_etag(model)}:
+        raise HTTPException(status_code=412, detail="Entry was modified by another request",
+                            headers={"ETag": current})
+
+
+def entry_update_values(entry: FHAEntryUpdate) -> Dict:
+    """只取请求中显式给出的字段，并按表格列名（别名）返回"""
+    return {k: v for k, v in entry.dict(by_alias=True, exclude_unset=True).items() if v is not None}
 
 
 # API 路由
@@ -97,129 +250,222 @@ async def root():
     return {"message": "FHA 结构化分析系统 API"}
 
 
+@app.get("/system/project-cache", tags=["系统信息"],
+         summary="项目缓存统计",
+         description="返回常驻内存的项目模型缓存的命中、未命中、淘汰次数以及当前占用和预算")
+async def project_cache_stats(projects: ProjectRegistry = Depends(get_projects)):
+    """项目缓存统计"""
+    return projects.stats()
+
+
 # 项目管理 API
 @app.post("/projects", response_model=ProjectResponse, tags=["项目管理"],
           summary="创建新项目",
           description="创建一个新的FHA分析项目，返回项目ID和其他基本信息")
-async def create_project(project: ProjectCreate):
+def create_project(project: ProjectCreate, projects: ProjectRegistry = Depends(get_projects)):
     """创建新项目"""
-    project_id = str(uuid.uuid4())
-    model = FHA_Model()
-    projects_db[project_id] = {
-        "name": project.name,
-        "model": model,
-        "created_at": datetime.now()
-    }
+    info = projects.create(project.name)
 
     return ProjectResponse(
-        project_id=project_id,
-        name=project.name,
-        created_at=projects_db[project_id]["created_at"]
+        project_id=info["project_id"],
+        name=info["name"],
+        created_at=info["created_at"]
     )
 
 
 @app.get("/projects", tags=["项目管理"],
          summary="列出所有项目",
          description="获取系统中所有FHA项目的列表，包括项目ID、名称、创建时间和条目数量")
-async def list_projects():
-    """列出所有项目"""
-    return [
-        {
-            "project_id": pid,
-            "name": proj["name"],
-            "created_at": proj["created_at"],
-            "entry_count": len(proj["model"].get_dataframe())
-        }
-        for pid, proj in projects_db.items()
-    ]
+def list_projects(projects: ProjectRegistry = Depends(get_projects)):
+    """列出所有项目（条目数来自存储的元数据，不会加载项目数据）"""
+    return projects.list_projects()
 
 
 @app.delete("/projects/{project_id}", tags=["项目管理"],
             summary="删除项目",
             description="根据项目ID删除指定的FHA项目及其所有相关数据")
-async def delete_project(project_id: str):
+def delete_project(project_id: str, projects: ProjectRegistry = Depends(get_projects)):
     """删除项目"""
-    if project_id not in projects_db:
+    if not projects.delete(project_id):
         raise HTTPException(status_code=404, detail="Project not found")
 
-    del projects_db[project_id]
     return {"message": "Project deleted successfully"}
 
 
 @app.post("/projects/{project_id}/new", tags=["项目管理"],
           summary="创建空白项目",
           description="清空指定项目的数据，创建一个新的空白项目")
-async def new_project(project_id: str, model: FHA_Model = Depends(get_project_model)):
+def new_project(project_id: str, project: ProjectHandle = Depends(get_project)):
     """清空项目数据，创建新的空白项目"""
-    model.new_project()
-    return {"message": "New project created"}
+    with project.write() as model:
+        model.new_project()
+        return {"message": "New project created"}
 
 
 # 数据管理 API
 @app.get("/projects/{project_id}/entries", response_model=List[FHAEntry], tags=["数据管理"],
          summary="获取项目所有条目",
-         description="获取指定项目中的所有FHA分析条目数据")
-async def get_entries(project_id: str, model: FHA_Model = Depends(get_project_model)):
-    """获取所有FHA条目"""
-    df = model.get_dataframe()
-    entries = []
-    for _, row in df.iterrows():
-        entries.append(FHAEntry.parse_obj(row.to_dict()))
-    return entries
+         description="获取指定项目中的FHA分析条目数据。支持 offset/limit 分页（响应头 X-Total-Count 为总行数，"
+                     "Link 给出下一页）、fields 列投影（逗号分隔的列名）和 sort 排序（逗号分隔，前缀 - 表示降序，"
+                     "危害性分类按严重程度排序）。支持 If-None-Match / If-Modified-Since，项目未变化时返回 304")
+def get_entries(project_id: str, request: Request, response: Response,
+                offset: int = Query(0, ge=0, description="跳过的条目数"),
+                limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="本页最多返回的条目数，缺省返回全部"),
+                fields: Optional[str] = Query(None, description="逗号分隔的返回列", example="row_id,编号,危害性分类"),
+                sort: Optional[str] = Query(None, description="逗号分隔的排序列，前缀 - 表示降序", example="-危害性分类,编号"),
+                project: ProjectHandle = Depends(get_project)):
+    """分页获取FHA条目（只转换本页的行，单页开销与项目总条目数无关）"""
+    columns = parse_fields(fields, ENTRY_FIELDS)
+    sort_keys = parse_sort(sort, ENTRY_FIELDS)
+    with project.read() as model:
+        cached = not_modified(request, response, model)
+        if cached is not None:
+            return cached
+        order = model.sorted_positions(sort_keys)
+        page = order[offset:offset + limit if limit else None]
+        response.headers.update(page_headers(request, len(order), offset, len(page)))
+        return FastJSONResponse(entry_records(model, page, columns), headers=dict(response.headers))
+
+
+@app.get("/projects/{project_id}/search", response_model=List[SearchHit], tags=["数据管理"],
+         summary="全文检索影响与理由",
+         description="在“对于飞行器的影响”、“对于地面/空域的影响”和“理由/备注”三列中检索，例如 GPS、失去定位。"
+                     "q 按空白切分为多个检索词，条目须包含全部检索词（可分布在不同列），不区分大小写。"
+                     "结果按相关度排序并附带高亮片段，支持 offset/limit 分页（X-Total-Count 为命中总数）。"
+                     "索引在项目首次检索时于项目锁之外建立，之后随修改增量维护")
+def search_entries(project_id: str, request: Request, response: Response,
+                   q: str = Query(..., min_length=1, description="检索词，空白分隔", example="GPS 失去定位"),
+                   offset: int = Query(0, ge=0, description="跳过的命中数"),
+                   limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE, description="本页最多返回的命中数"),
+                   project: ProjectHandle = Depends(get_project)):
+    """全文检索（SQLite FTS5 二元组索引，见 FHA_FullTextIndex）"""
+    with project.read() as model:
+        index = model.full_text_index()
+    # 建索引（首次检索时较慢）在读锁之外进行，不阻塞写请求
+    index.sync()
+    with project.read() as model:
+        cached = not_modified(request, response, model)
+        if cached is not None:
+            return cached
+        total, hits = index.search(q, offset, limit)
+        numbers = model.get_dataframe()['编号'].reindex([row_id for row_id, _, _ in hits]).fillna('').tolist()
+        results = [{"row_id": row_id, "编号": number, "score": score, "highlights": highlights}
+                   for (row_id, score, highlights), number in zip(hits, numbers)]
+        response.headers.update(page_headers(request, total, offset, len(results)))
+        return FastJSONResponse(results, headers=dict(response.headers))
 
 
 @app.post("/projects/{project_id}/entries", tags=["数据管理"],
           summary="添加新条目",
           description="向指定项目中添加一个新的FHA分析条目")
-async def add_entry(project_id: str, entry: FHAEntry, model: FHA_Model = Depends(get_project_model)):
+def add_entry(project_id: str, entry: FHAEntry, project: ProjectHandle = Depends(get_project)):
     """添加新的FHA条目"""
-    entry_dict = entry.dict()
-    model.add_fha_entries([entry_dict])
-    return {"message": "Entry added successfully"}
+    entry_dict = entry.dict(by_alias=True, exclude={"row_id"})
+    with project.write() as model:
+        row_ids = model.add_fha_entries([entry_dict])
+        return {"message": "Entry added successfully", "row_id": row_ids[0]}
 
 
 @app.put("/projects/{project_id}/entries/{entry_index}", tags=["数据管理"],
          summary="更新指定条目",
-         description="更新指定项目中指定索引位置的FHA分析条目")
-async def update_entry(project_id: str, entry_index: int, entry: FHAEntryUpdate,
-                       model: FHA_Model = Depends(get_project_model)):
-    """更新指定的FHA条目"""
-    df = model.get_dataframe()
-    if entry_index >= len(df):
-        raise HTTPException(status_code=404, detail="Entry not found")
-
-    # 更新指定行的数据
-    update_data = {k: v for k, v in entry.dict().items() if v is not None}
-    for key, value in update_data.items():
-        df.loc[entry_index, key] = value
-
-    return {"message": "Entry updated successfully"}
+         description="更新指定项目中指定索引位置的FHA分析条目。请求可带 If-Match（GET 返回的行 ETag），"
+                     "该行已被他人修改时返回 412 及其当前 ETag")
+def update_entry(project_id: str, entry_index: int, entry: FHAEntryUpdate, response: Response,
+                 if_match: Optional[str] = Header(None),
+                 project: ProjectHandle = Depends(get_project)):
+    """更新指定的FHA条目（可用 If-Match 携带该行的 ETag，行已被他人修改时返回 412）"""
+    with project.write() as model:
+        df = model.get_dataframe()
+        if not 0 <= entry_index < len(df):
+            raise HTTPException(status_code=404, detail="Entry not found")
+
+        # 更新指定行的数据
+        row_id = model.key_at(entry_index)
+        check_if_match(if_match, model, row_id)
+        model.update_row(row_id, entry_update_values(entry))
+
+        response.headers["ETag"] = row_etag(model, row_id)
+        return {"message": "Entry updated successfully", "row_id": row_id,
+                "row_version": model.row_version(row_id), "revision": model.revision}
 
 
 @app.delete("/projects/{project_id}/entries/{entry_indices}", tags=["数据管理"],
             summary="删除指定条目",
             description="删除指定项目中指定索引位置的一个或多个FHA分析条目")
-async def delete_entries(project_id: str, entry_indices: str,
-                         model: FHA_Model = Depends(get_project_model)):
+def delete_entries(project_id: str, entry_indices: str,
+                   project: ProjectHandle = Depends(get_project)):
     """删除指定的FHA条目"""
     try:
         indices = [int(i) for i in entry_indices.split(",")]
-        model.delete_rows(indices)
-        return {"message": f"Entries {indices} deleted successfully"}
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid entry indices format")
+    with project.write() as model:
+        try:
+            model.delete_rows(indices)
+        except IndexError:
+            raise HTTPException(status_code=404, detail="Entry not found")
+    return {"message": f"Entries {indices} deleted successfully"}
+
+
+# 按行键访问的数据管理 API
+@app.get("/projects/{project_id}/rows/{row_id}", response_model=FHAEntry, tags=["数据管理"],
+         summary="按行键获取条目",
+         description="按不可变的行键 row_id 获取一个FHA分析条目，行键不受其他行增删的影响")
+def get_row(project_id: str, row_id: int, request: Request, response: Response,
+            project: ProjectHandle = Depends(get_project)):
+    """按行键获取FHA条目（If-None-Match 携带该行的 ETag 且未变化时返回 304）"""
+    with project.read() as model:
+        resolve_row_position(model, row_id)
+        cached = not_modified(request, response, model, row_etag(model, row_id))
+        if cached is not None:
+            return cached
+        return FHAEntry.parse_obj(dict(model.get_row(row_id), row_version=model.row_version(row_id)))
+
+
+@app.put("/projects/{project_id}/rows/{row_id}", tags=["数据管理"],
+         summary="按行键更新条目",
+         description="按不可变的行键 row_id 更新一个FHA分析条目。请求可带 If-Match（GET 返回的行 ETag），"
+                     "该行已被他人修改时返回 412 及其当前 ETag")
+def update_row(project_id: str, row_id: int, entry: FHAEntryUpdate, response: Response,
+               if_match: Optional[str] = Header(None),
+               project: ProjectHandle = Depends(get_project)):
+    """按行键更新FHA条目（可用 If-Match 携带该行的 ETag，行已被他人修改时返回 412）"""
+    with project.write() as model:
+        resolve_row_position(model, row_id)
+        check_if_match(if_match, model, row_id)
+        model.update_row(row_id, entry_update_values(entry))
+        response.headers["ETag"] = row_etag(model, row_id)
+        return {"message": "Entry updated successfully", "row_id": row_id,
+                "row_version": model.row_version(row_id), "revision": model.revision}
+
+
+@app.delete("/projects/{project_id}/rows/{row_ids}", tags=["数据管理"],
+            summary="按行键删除条目",
+            description="按行键删除一个或多个FHA分析条目，多个行键以逗号分隔")
+def delete_rows_by_key(project_id: str, row_ids: str, project: ProjectHandle = Depends(get_project)):
+    """按行键删除FHA条目"""
+    try:
+        keys = [int(k) for k in row_ids.split(",")]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid row ids format")
+    with project.write() as model:
+        for key in keys:
+            resolve_row_position(model, key)
+        model.delete_rows_by_key(keys)
+        return {"message": f"Rows {keys} deleted successfully", "row_ids": keys}
 
 
 # 功能架构 API
 @app.post("/projects/{project_id}/functional-architect", tags=["功能架构"],
           summary="创建功能架构",
           description="根据功能架构向导数据创建FHA条目框架")
-async def create_from_functional_architect(project_id: str, data: FunctionalArchitectData,
-                                           model: FHA_Model = Depends(get_project_model)):
+def create_from_functional_architect(project_id: str, data: FunctionalArchitectData,
+                                     project: ProjectHandle = Depends(get_project)):
     """根据功能架构向导数据创建FHA条目"""
-    model.new_project()
     skeleton = data.skeleton
-    model.add_fha_entries(skeleton)
+    with project.write() as model:
+        model.new_project()
+        model.add_fha_entries(skeleton)
     return {"message": f"Project framework generated with {len(skeleton)} entries"}
 
 
@@ -237,127 +483,86 @@ async def get_failure_modes(function_type: str):
 @app.post("/projects/{project_id}/analysis-wizard", tags=["分析向导"],
           summary="运行引导式分析向导",
           description="基于选择的失效模式进行详细分析，生成完整的FHA条目信息")
-async def run_analysis_wizard(
+def run_analysis_wizard(
         project_id: str,
         data: WizardAnalysisRequest,
-        model: FHA_Model = Depends(get_project_model)
+        project: ProjectHandle = Depends(get_project)
 ):
     """运行引导式分析向导"""
-    # 验证项目是否存在
-    if project_id not in projects_db:
-        raise HTTPException(status_code=404, detail="Project not found")
-
-    df = model.get_dataframe()
-    if data.source_index >= len(df):
-        raise HTTPException(status_code=404, detail="Entry not found")
-
     # 组装最终结果
     final_results = []
     for result in data.results:
         final_results.append({
             '失效状态': result.失效状态,
             '对于飞行器的影响': result.对于飞行器的影响,
-            '对于地面/空域的影响': result.对于地面空域的影响,
+            '对于地面/空域的影响': result.对于地面或空域的影响,
             '对于地面控制组的影响': result.对于地面控制组的影响,
             '危害性分类': result.危害性分类,
-            '理由/备注': result.理由备注
+            '理由/备注': result.理由或备注
         })
 
-    # 更新模型数据
-    model.update_fha_entries_from_wizard(data.source_index, final_results)
+    with project.write() as model:
+        df = model.get_dataframe()
+        if data.source_row_id is not None:
+            source_index = resolve_row_position(model, data.source_row_id)
+        elif data.source_index is not None and 0 <= data.source_index < len(df):
+            source_index = data.source_index
+        else:
+            raise HTTPException(status_code=404, detail="Entry not found")
 
-    return {"message": "Analysis completed", "results": final_results}
+        # 更新模型数据
+        row_ids = model.update_fha_entries_from_wizard(source_index, final_results)
 
+    return {"message": "Analysis completed", "results": final_results, "row_ids": row_ids}
 
-# 仪表盘数据 API
-@app.get("/projects/{project_id}/dashboard/kpis", tags=["仪表盘"],
-         summary="获取仪表盘KPI数据",
-         description="获取项目的关键绩效指标数据，包括总条目数、灾难级和危险级条目数")
-async def get_dashboard_kpis(project_id: str, model: FHA_Model = Depends(get_project_model)):
-    """获取仪表盘KPI数据"""
-    df = model.get_dataframe()
-    total_items = len(df[df['失效状态'] != ''])
-    hazard_counts = df['危害性分类'].value_counts()
-    cat_count = int(hazard_counts.get("灾难的 (Catastrophic)", 0))
-    haz_count = int(hazard_counts.get("危险的 (Hazardous)", 0))
-
-    return {
-        "total_items": total_items,
-        "catastrophic_count": cat_count,
-        "hazardous_count": haz_count
-    }
 
+# 仪表盘数据 API
+SUNBURST_CATEGORIES = ["灾难的 (Catastrophic)", "危险的 (Hazardous)", "严重的 (Major)", "轻微的 (Minor)"]
 
-@app.get("/projects/{project_id}/dashboard/sunburst-data", tags=["仪表盘"],
-         summary="获取旭日图数据",
-         description="获取用于生成风险分布旭日图的数据")
-async def get_sunburst_data(project_id: str, model: FHA_Model = Depends(get_project_model)):
-    """获取旭日图数据"""
-    df = model.get_dataframe()
-    df_filtered = df[
-        (df['一级功能'] != '') & (df['危害性分类'] != '') & (df['危害性分类'] != '无安全影响 (No Safety Effect)')
-        ]
 
-    if df_filtered.empty:
-        return {"data": []}
+def kpis_panel(stats, matrix: Dict[str, Dict[str, int]]) -> Dict[str, int]:
+    return stats.kpis()
 
-    # 数据准备
-    data = df_filtered.groupby(['一级功能', '危害性分类']).size().reset_index(name='size')
-    func_sizes = data.groupby('一级功能')['size'].sum()
 
+def sunburst_panel(stats, matrix: Dict[str, Dict[str, int]]) -> Dict[str, Any]:
+    """旭日图数据：各一级功能及其下各分类的条目数，不含“无安全影响”"""
     result = []
-    for func_name in func_sizes.index:
-        func_data = {"function": func_name, "total": int(func_sizes[func_name]), "categories": []}
-        func_group = data[data['一级功能'] == func_name].set_index('危害性分类')
-        for cat in ["灾难的 (Catastrophic)", "危险的 (Hazardous)", "严重的 (Major)", "轻微的 (Minor)"]:
-            if cat in func_group.index:
+    for func_name, counts in matrix.items():
+        total = sum(count for cat, count in counts.items() if cat != NO_SAFETY_EFFECT)
+        if not total:
+            continue
+        func_data = {"function": func_name, "total": total, "categories": []}
+        for cat in SUNBURST_CATEGORIES:
+            if cat in counts:
                 func_data["categories"].append({
                     "category": cat,
-                    "count": int(func_group.loc[cat, 'size'])
+                    "count": counts[cat]
                 })
         result.append(func_data)
-
     return {"data": result}
 
 
-@app.get("/projects/{project_id}/dashboard/cross-analysis", tags=["仪表盘"],
-         summary="获取交叉分析矩阵数据",
-         description="获取风险/功能交叉分析矩阵数据，用于识别高风险功能模块")
-async def get_cross_analysis_data(project_id: str, model: FHA_Model = Depends(get_project_model)):
-    """获取交叉分析矩阵数据"""
-    df = model.get_dataframe()
-    df_analyzed = df[(df['一级功能'] != '') & (df['危害性分类'] != '')].copy()
+def cross_analysis_panel(stats, matrix: Dict[str, Dict[str, int]]) -> Dict[str, Any]:
+    """交叉分析矩阵与摘要文本"""
+    functions, columns, counts = stats.cross_tab(matrix)
 
-    if df_analyzed.empty:
+    if not functions:
         return {"matrix": [], "summary": "暂无已完成分析的条目。"}
 
-    # 生成交叉分析矩阵
-    cross_tab = pd.crosstab(df_analyzed['一级功能'], df_analyzed['危害性分类'])
-    ordered_cols = [col for col in FHA_Model.ARP4761_CATEGORIES if col in cross_tab.columns and col != ""]
-    cross_tab = cross_tab.reindex(columns=ordered_cols)
-
     # 转换为JSON格式
     matrix_data = []
-    for func in cross_tab.index:
+    for func, row in zip(functions, counts):
         row_data = {"function": func}
-        for col in cross_tab.columns:
-            row_data[col.split(' ')[0] if col else ""] = int(cross_tab.loc[func, col])
+        for col, value in zip(columns, row):
+            row_data[col.split(' ')[0] if col else ""] = value
         matrix_data.append(row_data)
 
     # 生成摘要文本
-    high_risk_items = df_analyzed[df_analyzed['危害性分类'].isin(["灾难的 (Catastrophic)", "危险的 (Hazardous)"])]
-    summary = f"当前共识别出 {len(high_risk_items)} 项高风险条目（灾难级或危险级）。"
-
-    if not cross_tab.empty:
-        high_risk_cols = [col for col in ["灾难的 (Catastrophic)", "危险的 (Hazardous)"] if col in cross_tab.columns]
-        if high_risk_cols:
-            top_func = cross_tab[high_risk_cols].sum(axis=1).idxmax()
-            top_func_cat_count = cross_tab.loc[
-                top_func, "灾难的 (Catastrophic)"] if "灾难的 (Catastrophic)" in cross_tab.columns else 0
-            top_func_haz_count = cross_tab.loc[
-                top_func, "危险的 (Hazardous)"] if "危险的 (Hazardous)" in cross_tab.columns else 0
+    high_risk_count, top_func, top_func_cat_count, top_func_haz_count = stats.risk_summary(matrix)
+    summary = f"当前共识别出 {high_risk_count} 项高风险条目（灾难级或危险级）。"
 
-            summary += f"\n风险主要集中在 \"{top_func}\" 系统中，其中包含 {int(top_func_cat_count)} 个\"灾难级\"和 {int(top_func_haz_count)} 个\"危险级\"风险。"
+    if top_func is not None:
+        summary += f"\n风险主要集中在 \"{top_func}\" 系统中，其中包含 {top_func_cat_count} 个\"灾难级\"和 {top_func_haz_count} 个\"危险级\"风险。"
 
     return {
         "matrix": matrix_data,
@@ -365,42 +570,106 @@ async def get_cross_analysis_data(project_id: str, model: FHA_Model = Depends(ge
     }
 
 
+# 面板名 -> 导出函数；各面板都由同一份聚合矩阵导出
+DASHBOARD_PANELS = {"kpis": kpis_panel, "sunburst": sunburst_panel, "cross_analysis": cross_analysis_panel}
+
+
+def dashboard_panels(model: FHA_Model, panels: List[str]) -> Dict[str, Any]:
+    """从模型增量维护的聚合导出指定面板：只计算一次 matrix()，供旭日图与交叉分析共用"""
+    stats = model.dashboard
+    matrix = stats.matrix() if any(name != "kpis" for name in panels) else {}
+    return {name: DASHBOARD_PANELS[name](stats, matrix) for name in panels}
+
+
+@app.get("/projects/{project_id}/dashboard", tags=["仪表盘"],
+         summary="获取仪表盘全部面板数据",
+         description="一次请求返回 KPI、旭日图和交叉分析矩阵，三者由同一次聚合导出。"
+                     "fields 为逗号分隔的面板名（kpis、sunburst、cross_analysis），缺省返回全部。"
+                     "仪表盘接口均支持条件请求，项目未变化时返回 304")
+def get_dashboard(project_id: str, request: Request, response: Response,
+                  fields: Optional[str] = Query(None, description="逗号分隔的面板名"),
+                  project: ProjectHandle = Depends(get_project)):
+    """获取仪表盘全部（或 fields 指定的）面板数据"""
+    panels = parse_fields(fields, list(DASHBOARD_PANELS))
+    with project.read() as model:
+        cached = not_modified(request, response, model)
+        if cached is not None:
+            return cached
+        return dashboard_panels(model, panels)
+
+
+@app.get("/projects/{project_id}/dashboard/kpis", tags=["仪表盘"],
+         summary="获取仪表盘KPI数据",
+         description="获取项目的关键绩效指标数据，包括总条目数、灾难级和危险级条目数。"
+                     "仪表盘接口均支持条件请求，项目未变化时返回 304")
+def get_dashboard_kpis(project_id: str, request: Request, response: Response,
+                       project: ProjectHandle = Depends(get_project)):
+    """获取仪表盘KPI数据（来自模型增量维护的聚合，不扫描表格）"""
+    with project.read() as model:
+        cached = not_modified(request, response, model)
+        if cached is not None:
+            return cached
+        return dashboard_panels(model, ["kpis"])["kpis"]
+
+
+@app.get("/projects/{project_id}/dashboard/sunburst-data", tags=["仪表盘"],
+         summary="获取旭日图数据",
+         description="获取用于生成风险分布旭日图的数据")
+def get_sunburst_data(project_id: str, request: Request, response: Response,
+                      project: ProjectHandle = Depends(get_project)):
+    """获取旭日图数据（来自模型增量维护的聚合，不扫描表格）"""
+    with project.read() as model:
+        cached = not_modified(request, response, model)
+        if cached is not None:
+            return cached
+        return dashboard_panels(model, ["sunburst"])["sunburst"]
+
+
+@app.get("/projects/{project_id}/dashboard/cross-analysis", tags=["仪表盘"],
+         summary="获取交叉分析矩阵数据",
+         description="获取风险/功能交叉分析矩阵数据，用于识别高风险功能模块")
+def get_cross_analysis_data(project_id: str, request: Request, response: Response,
+                            project: ProjectHandle = Depends(get_project)):
+    """获取交叉分析矩阵数据（来自模型增量维护的聚合，不扫描表格）"""
+    with project.read() as model:
+        cached = not_modified(request, response, model)
+        if cached is not None:
+            return cached
+        return dashboard_panels(model, ["cross_analysis"])["cross_analysis"]
+
+
 # 文件导入/导出 API
 @app.post("/projects/{project_id}/import", tags=["文件操作"],
           summary="导入Excel文件",
           description="从Excel文件导入FHA数据到指定项目中")
-async def import_excel(project_id: str, file: UploadFile = File(...),
-                       model: FHA_Model = Depends(get_project_model)):
+def import_excel(project_id: str, file: UploadFile = File(...),
+                 project: ProjectHandle = Depends(get_project)):
     """从Excel文件导入数据"""
     try:
-        contents = await file.read()
-        df = pd.read_excel(io.BytesIO(contents), engine='openpyxl')
-        model.load_dataframe(df)
-        return {"message": f"Successfully imported data from {file.filename}"}
+        # 直接从框架暂存上传内容的临时文件中流式解析，不再整体读入内存；解析不持锁，只在换入新表时持有写锁
+        frame = project.model.read_dataframe(iter_excel_chunks(file.file))
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to import file: {str(e)}")
+    with project.write() as model:
+        model.install_dataframe(frame)
+        return {"message": f"Successfully imported data from {file.filename}"}
 
 
 @app.get("/projects/{project_id}/export", tags=["文件操作"],
          summary="导出为Excel文件",
          description="将指定项目中的FHA数据导出为Excel文件")
-async def export_excel(project_id: str, model: FHA_Model = Depends(get_project_model)):
+def export_excel(project_id: str, project: ProjectHandle = Depends(get_project)):
     """导出数据为Excel格式"""
-    df = model.get_dataframe()
+    with project.read() as model:
+        df = model.get_dataframe().copy(deep=False)
     if df.empty:
         raise HTTPException(status_code=400, detail="No data to export")
 
-    # 将DataFrame转换为字节流
-    output = io.BytesIO()
-    df.to_excel(output, index=False, engine='openpyxl')
-    output.seek(0)
-
-    # 返回字节流作为响应
+    # 对请求时刻的数据快照边编码边发送，不在内存中拼出整个工作簿
     headers = {
         'Content-Disposition': 'attachment; filename="fha_export.xlsx"'
     }
-    return Response(content=output.read(), headers=headers,
-                    media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    return StreamingResponse(iter_xlsx_bytes(df), headers=headers, media_type=XLSX_MEDIA_TYPE)
 
 
 # 错误处理
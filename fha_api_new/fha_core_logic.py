@@ -2,10 +2,21 @@
 # -*- coding: utf-8 -*-
 # 职责：整合所有后端数据模型、业务逻辑和数据处理功能。
 
+import json
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
 import pandas as pd
 from PySide6.QtCore import QAbstractTableModel, Qt, QModelIndex
 from PySide6.QtGui import QColor, QBrush
 
+from fha_shared import ChunkAccumulator, FHA_DashboardStats, id_labels, iter_excel_chunks, iter_xlsx_bytes
+
 # ------------------- 失效模式知识库 -------------------
 FAILURE_MODE_LIBRARY = {
     "通用": ["功能完全丧失", "功能间歇性工作", "功能性能下降", "功能非预期启动"],
@@ -16,11 +27,17 @@ FAILURE_MODE_LIBRARY = {
     "导航": ["定位精度下降", "航向错误", "速度信息错误"],
     "飞控算法": ["算法发散", "模式切换错误"]
 }
+MISSION_PHASES = ["地面检查", "启动", "垂直起飞", "过渡飞行", "巡航", "悬停作业", "返航", "垂直降落", "关机"]
+FUNCTION_TYPES = ["电源", "传感器", "执行机构", "数据传输", "飞控算法", "导航", "通信", "其他"]
 
 
 # ------------------- FHA核心数据模型 -------------------
 class FHA_Model:
-    """FHA功能的数据模型，负责所有数据操作。"""
+    """FHA功能的数据模型，负责所有数据操作。
+
+    每行以 DataFrame 索引中的整数行键 (row_id) 作为不可变的内部标识，
+    与显示用的“编号”相互独立：增删行只会改变编号，不会改变其他行的行键。
+    """
     TABLE_COLUMNS = [
         '编号', '一级功能', '二级功能', '三级功能', '功能类型', '飞行阶段',
         '失效状态',
@@ -32,50 +49,324 @@ class FHA_Model:
         "灾难的 (Catastrophic)", "危险的 (Hazardous)", "严重的 (Major)",
         "轻微的 (Minor)", "无安全影响 (No Safety Effect)"
     ]
+    # 枚举型列以 pandas Categorical 存储（整数编码）；None 表示类别完全由数据决定
+    CATEGORICAL_COLUMNS = {
+        '一级功能': None,
+        '功能类型': FUNCTION_TYPES,
+        '飞行阶段': MISSION_PHASES,
+        '危害性分类': ARP4761_CATEGORIES,
+    }
+    ROW_KEY = 'row_id'
 
     def __init__(self):
+        self.next_key = 0
         self.dataframe = self.new_blank_dataframe()
         self.next_id = 1
+        self._renumber_depth = 0
+        self._renumber_from = None
+        self._ids_sequential = True  # 编号列是否恰为 FHA-001…N；导入或手工修改编号后为 False
+        self._listeners = []
+        self._batch = None
+        # 修订号：每次变更通知加一；行版本 = 该行最近一次变更时的修订号（整表替换后统一为替换时的修订号）
+        self.revision = 0
+        self._base_revision = 0
+        self._row_versions = {}
+        self.modified_at = datetime.now(timezone.utc)
+        self._sort_revision = None
+        self._sort_cache = {}
+        self.dashboard = FHA_DashboardStats(self)
+        self._full_text = None
+        self._full_text_lock = threading.Lock()  # 每个模型各自一把，建立索引时不阻塞其他项目
 
     def get_dataframe(self):
         return self.dataframe
 
+    # --- 变更通知 ---
+    def add_listener(self, callback):
+        """注册变更监听器：每次修改生效后以一个描述变更的字典调用 callback(event)。
+
+        event['type'] 取值：reset（整表替换）、insert、remove、update、replace（向导拆分一行）、batch（事务提交）；
+        event['revision'] 为本次变更后的修订号。
+        """
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self, kind, **details):
+        self.revision += 1
+        self.modified_at = datetime.now(timezone.utc)
+        self._track_row_versions(kind, details)
+        self._emit(kind, details)
+
+    def _emit(self, kind, details):
+        if kind == 'reset':
+            self.dashboard.rebuild()
+        event = dict(details, type=kind, revision=self.revision)
+        for listener in list(self._listeners):
+            listener(event)
+
+    def _track_row_versions(self, kind, details):
+        if kind == 'reset':
+            self._row_versions = {}
+            self._base_revision = self.revision
+            return
+        if kind == 'remove':
+            removed, changed = details['row_ids'], []
+        elif kind == 'batch':
+            removed, changed = details['removed'], details['inserted'] + details['updated']
+        else:
+            removed, changed = details.get('removed', []), details['row_ids']
+        for key in removed:
+            self._row_versions.pop(key, None)
+        for key in changed:
+            self._row_versions[key] = self.revision
+
+    def row_version(self, row_key):
+        """行的版本号（该行最近一次变更时的修订号），用于乐观并发控制。"""
+        return self._row_versions.get(row_key, self._base_revision)
+
+    # --- 全文检索 ---
+    def full_text_index(self):
+        """影响与理由列的全文索引（FHA_FullTextIndex）：创建时只记下数据快照，在 sync()/search() 时建立，此后随变更事件增量维护。"""
+        with self._full_text_lock:
+            if self._full_text is None:
+                self._full_text = FHA_FullTextIndex(self)
+            return self._full_text
+
+    def full_text_bytes(self):
+        """全文索引占用的内存字节数，尚未建立时为 0（供项目缓存计入内存预算）。"""
+        index = self._full_text
+        return index.memory_bytes() if index is not None else 0
+
+    # --- 排序 ---
+    def sort_key(self, column):
+        """column 的排序键数组：危害性分类按严重程度（ARP4761 顺序），编号按行位置，
+        row_id / row_version 按行键和行版本，其余列按文本。"""
+        df = self.dataframe
+        if column == '编号':
+            return np.arange(len(df))
+        if column == self.ROW_KEY:
+            return df.index.to_numpy()
+        if column == 'row_version':
+            return np.fromiter((self.row_version(key) for key in df.index), dtype=np.int64, count=len(df))
+        series = df[column]
+        if not isinstance(series.dtype, pd.CategoricalDtype):
+            return series.to_numpy(dtype=object)
+        codes = series.cat.codes.to_numpy()
+        if column == '危害性分类':
+            return codes
+        categories = series.cat.categories
+        ranks = np.empty(len(categories), dtype=np.int64)
+        ranks[categories.astype(str).argsort()] = np.arange(len(categories))
+        return ranks[codes]
+
+    def sorted_positions(self, keys=()):
+        """按 keys = [(列名, 是否升序), ...] 稳定排序后的行位置；结果按修订号缓存，翻页时不会重复排序。"""
+        keys = tuple(keys)
+        if self._sort_revision != self.revision:
+            self._sort_cache, self._sort_revision = {}, self.revision
+        order = self._sort_cache.get(keys)
+        if order is None:
+            if keys:
+                frame = pd.DataFrame({i: self.sort_key(column) for i, (column, _) in enumerate(keys)})
+                order = frame.sort_values(list(range(len(keys))), ascending=[asc for _, asc in keys],
+                                          kind='stable').index.to_numpy()
+            else:
+                order = np.arange(len(self.dataframe))
+            self._sort_cache[keys] = order
+        return order
+
     def new_blank_dataframe(self):
-        return pd.DataFrame(columns=self.TABLE_COLUMNS)
+        df = pd.DataFrame(columns=self.TABLE_COLUMNS, index=pd.RangeIndex(0, name=self.ROW_KEY))
+        return df.astype({column: pd.CategoricalDtype(self.base_categories(column))
+                          for column in self.CATEGORICAL_COLUMNS})
 
     def new_project(self):
         self.dataframe = self.new_blank_dataframe()
         self.next_id = 1
+        self._ids_sequential = True
+        self._notify('reset')
+
+    def _allocate_keys(self, count):
+        """分配 count 个新的行键，行键只增不减、永不复用。"""
+        keys = pd.RangeIndex(self.next_key, self.next_key + count, name=self.ROW_KEY)
+        self.next_key += count
+        return keys
+
+    @classmethod
+    def base_categories(cls, column):
+        """枚举型列的预定义类别，空字符串始终是合法取值。"""
+        base = cls.CATEGORICAL_COLUMNS[column] or []
+        return base if "" in base else [""] + base
+
+    @staticmethod
+    def ensure_categories(df, column, values):
+        """若 df[column] 是 Categorical 且 values 中有尚未登记的取值，则就地扩充类别。"""
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            missing = pd.Index(pd.unique(pd.Series(values, dtype=object))).difference(df[column].cat.categories)
+            if len(missing):
+                df[column] = df[column].cat.add_categories(missing)
+
+    def _conform_categories(self, new_df, table=None):
+        """使 new_df 的枚举型列与 table（缺省为当前表）共用同一组类别，拼接后仍保持 Categorical。"""
+        table = self.dataframe if table is None else table
+        for column in self.CATEGORICAL_COLUMNS:
+            if not isinstance(table[column].dtype, pd.CategoricalDtype):
+                table[column] = table[column].astype(object).fillna('').astype('category')
+            values = new_df[column].astype(object).fillna('')
+            self.ensure_categories(table, column, values)
+            new_df[column] = pd.Categorical(values, dtype=table[column].dtype)
+        return new_df
 
     def load_dataframe(self, df):
-        self.dataframe = df.reindex(columns=self.TABLE_COLUMNS).fillna('')
+        """加载整张表，替换当前数据：install_dataframe(read_dataframe(df))。加载失败时保留原数据。"""
+        self.install_dataframe(self.read_dataframe(df))
+
+    def read_dataframe(self, df):
+        """把 df 读成本模型的表格结构并返回，不修改模型，可以在不持有项目锁时调用（如解析上传的文件）。
+
+        df 可以是一个 DataFrame，也可以是依次产出 DataFrame 分块的可迭代对象（如 iter_excel_chunks()）：
+        每个分块读入后立即裁剪到表格列并转换为 Categorical，交给 ChunkAccumulator 后即释放，最后每列只拼接一次。
+        """
+        chunks = [df] if isinstance(df, pd.DataFrame) else df
+        table = self.new_blank_dataframe()
+        accumulator = ChunkAccumulator(self.TABLE_COLUMNS)
+        for chunk in chunks:
+            frame = chunk.reindex(columns=self.TABLE_COLUMNS)
+            del chunk  # 不让原始分块留到下一个分块读入之后
+            frame = frame.astype({column: object for column in self.CATEGORICAL_COLUMNS}).fillna('')
+            accumulator.add(self._conform_categories(frame, table))
+        return accumulator.finish(table)
+
+    def install_dataframe(self, df):
+        """用 read_dataframe() 读出的表替换当前数据。df 带有效的 row_id 行键时沿用，否则分配新行键。"""
+        self.dataframe = df
+        if (df.index.name == self.ROW_KEY and df.index.is_unique
+                and pd.api.types.is_integer_dtype(df.index)):
+            self.next_key = max(self.next_key, int(df.index.max()) + 1 if len(df.index) else 0)
+        else:
+            self.dataframe.index = self._allocate_keys(len(self.dataframe))
         if not self.dataframe.empty and '编号' in self.dataframe.columns:
             numeric_ids = self.dataframe['编号'].str.replace(r'\D', '', regex=True)
             numeric_ids = pd.to_numeric(numeric_ids, errors='coerce').dropna()
             self.next_id = int(numeric_ids.max()) + 1 if not numeric_ids.empty else 1
         else:
             self.next_id = 1
+        self._ids_sequential = self._check_ids_sequential()
+        self._notify('reset')
+
+    def restore_dataframe(self, df, next_key=None, next_id=None, revision=None, versions=None):
+        """原样装入一张由本模型保存的表（如 load_project() 读出的表）：列、Categorical 类别和 row_id 行键
+        都直接沿用，不做逐列转换。df 的列或行键不符合模型结构时抛出 ValueError。
+
+        versions 为保存时的 version_state()：模型的修订号尚未超过 revision 时（如新建的模型），修订号、
+        行版本与修改时间原样恢复，淘汰后重新加载的项目仍认得此前发出的 ETag；否则（或缺少 versions 时）
+        按一次整表替换处理，修订号从 revision 继续递增，不会回退。"""
+        if list(df.columns) != self.TABLE_COLUMNS:
+            raise ValueError("项目文件的列与FHA表格不一致")
+        if (df.index.name != self.ROW_KEY or not df.index.is_unique
+                or not pd.api.types.is_integer_dtype(df.index)):
+            raise ValueError("项目文件缺少有效的行键")
+        for column in self.CATEGORICAL_COLUMNS:
+            if not isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype(object).fillna('').astype('category')
+            missing = pd.Index(self.base_categories(column)).difference(df[column].cat.categories)
+            if len(missing):
+                df[column] = df[column].cat.add_categories(missing)
+        self.dataframe = df
+        self.next_key = max(int(next_key or 0), int(df.index.max()) + 1 if len(df.index) else 0)
+        self.next_id = int(next_id) if next_id else len(df) + 1
+        self._ids_sequential = self._check_ids_sequential()
+        revision = int(revision or 0)
+        if versions is None or self.revision >= revision:
+            self.revision = max(self.revision, revision)
+            self._notify('reset')
+            return
+        self.revision = revision
+        self._base_revision = int(versions['base_revision'])
+        self._row_versions = dict(zip(versions['row_keys'], versions['row_versions']))
+        self.modified_at = datetime.fromisoformat(versions['modified_at'])
+        self._emit('reset', {})
+
+    def version_state(self):
+        """行版本与修改时间（可 JSON 序列化），随项目文件保存，供 restore_dataframe() 原样恢复。"""
+        return {'base_revision': self._base_revision,
+                'row_keys': [int(key) for key in self._row_versions],
+                'row_versions': [int(version) for version in self._row_versions.values()],
+                'modified_at': self.modified_at.isoformat()}
+
+    # --- 行键查询 ---
+    def has_key(self, row_key):
+        return row_key in self.dataframe.index
+
+    def position_of(self, row_key):
+        """行键 -> 当前行位置（基于索引哈希表，O(1)）。行键不存在时抛出 KeyError。"""
+        return self.dataframe.index.get_loc(row_key)
 
+    def key_at(self, position):
+        return int(self.dataframe.index[position])
+
+    def get_row(self, row_key):
+        """按行键返回一行数据（包含 row_id）。"""
+        row = self.dataframe.loc[row_key].to_dict()
+        row[self.ROW_KEY] = int(row_key)
+        return row
+
+    # --- 数据修改 ---
     def add_fha_entries(self, entries_list):
+        """在表尾追加条目，返回新行的行键列表。"""
         if not entries_list:
-            return
+            return []
+        if self._batch is not None:
+            return self._batch.insert(entries_list)
         new_rows = []
         for entry in entries_list:
             entry_copy = {k: entry.get(k, '') for k in self.TABLE_COLUMNS}
             new_rows.append(entry_copy)
 
-        new_df = pd.DataFrame(new_rows, columns=self.TABLE_COLUMNS)
-        self.dataframe = pd.concat([self.dataframe, new_df], ignore_index=True)
-        self.re_number_ids()
+        start = len(self.dataframe)
+        new_df = pd.DataFrame(new_rows, columns=self.TABLE_COLUMNS, index=self._allocate_keys(len(new_rows)))
+        new_df = self._conform_categories(new_df)
+        self.dataframe = pd.concat([self.dataframe, new_df])
+        self.dashboard.add(new_df)
+        self.re_number_ids(start)
+        keys = new_df.index.tolist()
+        self._notify('insert', row_ids=keys, first=start)
+        return keys
+
+    def update_row(self, row_key, values):
+        """按行键更新一行中的若干列，未知列名抛出 KeyError。"""
+        unknown = [column for column in values if column not in self.TABLE_COLUMNS]
+        if unknown:
+            raise KeyError(f"未知的列: {unknown}")
+        if self._batch is not None:
+            return self._batch.update(row_key, values)
+        position = self.position_of(row_key)
+        counted = any(column in values for column in self.dashboard.COLUMNS)
+        if counted:
+            before = self.dashboard.row_values(position)
+        for column, value in values.items():
+            self.ensure_categories(self.dataframe, column, [value])
+            self.dataframe.iat[position, self.dataframe.columns.get_loc(column)] = value
+        if '编号' in values:
+            self._ids_sequential = False
+        if counted:
+            self.dashboard.add_values(before, -1)
+            self.dashboard.add_values(tuple(values.get(column, value)
+                                            for column, value in zip(self.dashboard.COLUMNS, before)))
+        self._notify('update', row_ids=[row_key], columns=list(values))
 
     def update_fha_entries_from_wizard(self, source_index, wizard_results):
+        """用向导结果替换第 source_index 行。第一条结果沿用原行的行键，其余分配新行键。"""
         if not wizard_results:
-            return
+            return []
+        if self._batch is not None:
+            return self._batch.replace(self.key_at(source_index), wizard_results)
 
-        source_row_data = self.dataframe.loc[source_index].copy()
-
-        df_before = self.dataframe.iloc[:source_index]
-        df_after = self.dataframe.iloc[source_index + 1:]
+        source_row_data = self.dataframe.iloc[source_index].copy()
+        source_key = self.key_at(source_index)
 
         updated_entries = []
         for result in wizard_results:
@@ -83,62 +374,515 @@ class FHA_Model:
             new_entry.update(result)
             updated_entries.append(new_entry)
 
-        df_updated = pd.DataFrame(updated_entries, columns=self.TABLE_COLUMNS)
+        keys = [source_key] + self._allocate_keys(len(wizard_results) - 1).tolist()
+        df_updated = pd.DataFrame(updated_entries, columns=self.TABLE_COLUMNS,
+                                  index=pd.Index(keys, name=self.ROW_KEY))
+        df_updated = self._conform_categories(df_updated)
+
+        df_before = self.dataframe.iloc[:source_index]
+        df_after = self.dataframe.iloc[source_index + 1:]
+
+        self.dashboard.add_values(self.dashboard.row_values(source_index), -1)
+        self.dataframe = pd.concat([df_before, df_updated, df_after])
+        self.dashboard.add(df_updated)
+        self.re_number_ids(source_index)
+        self._notify('replace', position=source_index, removed=[source_key], row_ids=keys)
+        return keys
 
-        self.dataframe = pd.concat([df_before, df_updated, df_after], ignore_index=True)
-        self.re_number_ids()
+    def update_fha_entries_from_wizard_by_key(self, row_key, wizard_results):
+        if self._batch is not None:
+            return self._batch.replace(row_key, wizard_results) if wizard_results else []
+        return self.update_fha_entries_from_wizard(self.position_of(row_key), wizard_results)
 
     def delete_rows(self, row_indices):
+        """按行位置删除：一次构造布尔掩码完成删除，各列 dtype（包括 Categorical）保持不变。
+
+        位置越界时抛出 IndexError，且不做任何修改。
+        """
         if not row_indices: return
-        self.dataframe.drop(row_indices, inplace=True)
-        self.dataframe.reset_index(drop=True, inplace=True)
-        self.re_number_ids()
-
-    def re_number_ids(self):
-        """重新为所有行生成连续的编号"""
-        for i in range(len(self.dataframe)):
-            self.dataframe.loc[i, '编号'] = f"FHA-{i + 1:03d}"
+        positions = np.unique(np.asarray(row_indices, dtype=np.int64))
+        if positions[0] < 0 or positions[-1] >= len(self.dataframe):
+            raise IndexError("行索引超出了范围。")
+        if self._batch is not None:
+            return self._batch.delete(self.dataframe.index[positions].tolist())
+        keys = self.dataframe.index[positions]
+        keep = np.ones(len(self.dataframe), dtype=bool)
+        keep[positions] = False
+        self.dashboard.add(self.dataframe.iloc[positions], -1)
+        self.dataframe = self.dataframe[keep]
+        self.re_number_ids(int(positions[0]))
+        self._notify('remove', row_ids=keys.tolist(), positions=positions.tolist())
+
+    def delete_rows_by_key(self, row_keys):
+        """按行键删除，行键不存在时抛出 KeyError。"""
+        if not row_keys: return
+        if self._batch is not None:
+            return self._batch.delete(row_keys)
+        self.delete_rows([self.position_of(key) for key in row_keys])
+
+    def _check_ids_sequential(self):
+        return bool((self.dataframe['编号'].to_numpy(dtype=object) == id_labels(len(self.dataframe))).all())
+
+    def re_number_ids(self, start=0):
+        """为第 start 行及之后的行重新生成连续编号（整段一次性赋值）。在 deferred_renumber() 内只做标记。
+
+        只有前面各行已是 FHA-001…N 时才从 start 开始；导入的编号或手工改过的编号会整列重编。
+        """
+        if self._renumber_depth:
+            self._renumber_from = start if self._renumber_from is None else min(self._renumber_from, start)
+            return
+        self._renumber_from = None
+        if not self._ids_sequential:
+            start = 0
+            self._ids_sequential = True
+        labels = id_labels(len(self.dataframe))
+        if start <= 0:
+            self.dataframe['编号'] = labels
+        elif start < len(self.dataframe):
+            self.dataframe.iloc[start:, self.dataframe.columns.get_loc('编号')] = labels[start:]
         self.next_id = len(self.dataframe) + 1
 
+    @contextmanager
+    def deferred_renumber(self):
+        """推迟重新编号：块内的多次增删只在退出最外层时统一编号一次。"""
+        self._renumber_depth += 1
+        try:
+            yield self
+        finally:
+            self._renumber_depth -= 1
+            if not self._renumber_depth and self._renumber_from is not None:
+                self.re_number_ids(self._renumber_from)
+
+    @contextmanager
+    def batch(self):
+        """批量修改：块内的增、删、改和向导替换只排队，正常退出时一次性重建表格、
+        重新编号并只发出一次 batch 通知；块内抛出异常则丢弃全部排队的修改。
+
+        块内的行位置均指进入块时的表格，get_dataframe() 在提交前也仍返回该表格。
+        """
+        if self._batch is not None:
+            yield self._batch
+            return
+        transaction = self._batch = FHA_Transaction(self)
+        try:
+            yield transaction
+        finally:
+            self._batch = None
+        transaction.commit()
+
+
+# ------------------- 批量修改事务 -------------------
+class FHA_Transaction:
+    """FHA_Model.batch() 使用的事务：按行键记录排队的修改，commit() 时一次拼接完成重建。
+
+    新插入的行与向导替换生成的行按“锚点”归组：替换行的锚点是原行在表中的位置，
+    追加行的锚点是表尾。提交时未删除的原有行与各组新行按 (锚点, 组内序号) 排序即得到最终顺序。
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.base = model.dataframe
+        self._groups = {}  # 锚点 -> [(行键, 整行数据)]
+        self._pending = {}  # 新行的行键 -> 锚点
+        self._removed = set()  # 被删除或被替换的原有行键
+        self._updates = {}  # 原有行键 -> {列名: 新值}
+        self._append_anchor = len(self.base)
+
+    def _locate(self, row_key):
+        group = self._groups[self._pending[row_key]]
+        for i, (key, _) in enumerate(group):
+            if key == row_key:
+                return group, i
+
+    def _check_existing(self, row_key):
+        if row_key in self._removed or row_key not in self.base.index:
+            raise KeyError(row_key)
+
+    def row(self, row_key):
+        """返回行键对应的整行数据，已包含本事务中排队的修改。"""
+        if row_key in self._pending:
+            group, i = self._locate(row_key)
+            return dict(group[i][1])
+        self._check_existing(row_key)
+        row = self.base.loc[row_key].to_dict()
+        row.update(self._updates.get(row_key, {}))
+        return row
+
+    def insert(self, entries_list):
+        keys = self.model._allocate_keys(len(entries_list)).tolist()
+        group = self._groups.setdefault(self._append_anchor, [])
+        for key, entry in zip(keys, entries_list):
+            group.append((key, {k: entry.get(k, '') for k in FHA_Model.TABLE_COLUMNS}))
+            self._pending[key] = self._append_anchor
+        return keys
+
+    def update(self, row_key, values):
+        if row_key in self._pending:
+            group, i = self._locate(row_key)
+            group[i][1].update(values)
+        else:
+            self._check_existing(row_key)
+            self._updates.setdefault(row_key, {}).update(values)
+
+    def delete(self, row_keys):
+        for key in row_keys:
+            if key in self._pending:
+                group, i = self._locate(key)
+                del group[i]
+                del self._pending[key]
+            else:
+                self._check_existing(key)
+                self._removed.add(key)
+                self._updates.pop(key, None)
+
+    def replace(self, row_key, wizard_results):
+        source = self.row(row_key)
+        rows = []
+        for result in wizard_results:
+            entry = dict(source)
+            entry.update({k: v for k, v in result.items() if k in source})
+            rows.append(entry)
+        keys = [row_key] + self.model._allocate_keys(len(rows) - 1).tolist()
+        if row_key in self._pending:
+            anchor = self._pending[row_key]
+            group, i = self._locate(row_key)
+            group[i:i + 1] = list(zip(keys, rows))
+        else:
+            anchor = self.base.index.get_loc(row_key)
+            self._removed.add(row_key)
+            self._updates.pop(row_key, None)
+            self._groups[anchor] = list(zip(keys, rows))
+        for key in keys:
+            self._pending[key] = anchor
+        return keys
+
+    def commit(self):
+        """一次性应用全部排队的修改。"""
+        if not (self._pending or self._removed or self._updates):
+            return
+        model, base = self.model, self.base
+        keys, rows, anchors, subs = [], [], [], []
+        for anchor, group in self._groups.items():
+            for sub, (key, row) in enumerate(group):
+                keys.append(key)
+                rows.append(row)
+                anchors.append(anchor)
+                subs.append(sub)
+        new_df = pd.DataFrame(rows, columns=FHA_Model.TABLE_COLUMNS,
+                              index=pd.Index(keys, dtype='int64', name=FHA_Model.ROW_KEY))
+        new_df = model._conform_categories(new_df)
+
+        removed_mask = base.index.isin(list(self._removed))
+        kept_positions = np.flatnonzero(~removed_mask)
+        frame = pd.concat([base.iloc[kept_positions], new_df])
+        order = np.lexsort((np.concatenate([np.zeros(len(kept_positions), dtype=int), subs]),
+                            np.concatenate([kept_positions, anchors])))
+        frame = frame.iloc[order]
+
+        by_column = {}
+        for key, values in self._updates.items():
+            for column, value in values.items():
+                by_column.setdefault(column, ([], []))
+                by_column[column][0].append(key)
+                by_column[column][1].append(value)
+        for column, (update_keys, values) in by_column.items():
+            model.ensure_categories(frame, column, values)
+            frame.iloc[frame.index.get_indexer(update_keys), frame.columns.get_loc(column)] = values
+
+        changed = [anchor for anchor, group in self._groups.items() if group] + np.flatnonzero(removed_mask).tolist()
+        # 仪表盘聚合：减去受影响的原有行，再加上它们（及新增行）提交后的内容
+        affected = list(set(self._removed) | set(self._updates) | set(new_df.index))
+        model.dashboard.add(base[base.index.isin(affected)], -1)
+        model.dashboard.add(frame[frame.index.isin(affected)])
+        model.dataframe = frame
+        if '编号' in by_column:
+            model._ids_sequential = False
+        if changed:
+            model.re_number_ids(min(changed))
+
+        model._notify('batch',
+                      inserted=new_df.index[~new_df.index.isin(base.index)].tolist(),
+                      removed=[key for key in self._removed if key not in self._pending],
+                      updated=list(self._updates) + [key for key in self._removed if key in self._pending])
+
+
+# ------------------- 全文检索（影响与理由列） -------------------
+FULL_TEXT_COLUMNS = ['对于飞行器的影响', '对于地面/空域的影响', '理由/备注']
+
+
+# 双字词元的写法：小写，ASCII 空白与控制字符统一折叠为 \x7f；\x7f 与全部 ASCII 标点都登记为词元字符，
+# 空格只用来分隔词元。文本末尾补一个 \x7f，最后一个字符也会作为某个词元的首字出现
+_FOLD_SPACE = str.maketrans({chr(code): '\x7f' for code in [*range(0x21), 0x7f]})
+_TOKEN_CHARS = ''.join(chr(code) for code in range(0x21, 0x80) if not chr(code).isalnum())
+
+
+def _fold(text):
+    return text.lower().translate(_FOLD_SPACE)
+
+
+def _text_bigrams(text):
+    folded = _fold(text) + '\x7f'
+    return ' '.join(map(''.join, zip(folded, folded[1:])))
+
+
+class FHA_FullTextIndex:
+    """影响与理由列的全文检索：进程内 SQLite FTS5，rowid 即 row_id，中文按子串匹配、无需分词。
+
+    grams 表不保存内容，各列存文本的相邻双字词元；原文另存于普通表 texts，只为本页生成高亮片段。
+    检索词按空白切分、须全部出现（可在不同列），不区分大小写：2 个字符的词是一个词元，更长的词是其各双字组成的短语
+    （依次相邻出现即为子串），单个字符是以它开头的词元前缀。全部检索词合成一个 MATCH，由 FTS5 按 bm25 排序并只取出本页，
+    命中总数另用 count(*) 统计，每个命中都有得分。
+
+    作为 FHA_Model 的变更监听器只记下受影响行的文本，不接触 SQLite，持有模型写锁的修改不必等待建立索引；
+    积累的修改（首次为整表快照，整表替换后重新排入快照）由 sync() 或下一次检索写入索引。
+    """
+    HIGHLIGHT = ('<mark>', '</mark>')
+    ELLIPSIS = '…'
+    SNIPPET_CHARS = 24  # 片段长度（字符数）
+
+    def __init__(self, model):
+        self.model = model
+        self._lock = threading.Lock()  # 保护 SQLite 连接
+        self._pending_lock = threading.Lock()  # 只保护待写入的修改队列，监听器不会等待建立索引
+        self._conn = sqlite3.connect(':memory:', check_same_thread=False)
+        self._columns = [f'c{i}' for i in range(len(FULL_TEXT_COLUMNS))]
+        # 分词器参数本身是 SQL 字符串，其中的引号需要逐层转义
+        tokenize = ("ascii tokenchars '" + _TOKEN_CHARS.replace("'", "''") + "'").replace('"', '""')
+        self._conn.execute(f"CREATE VIRTUAL TABLE grams USING fts5({', '.join(self._columns)}, content='', "
+                           f'tokenize="{tokenize}")')
+        self._conn.execute(f"CREATE TABLE texts(rowid INTEGER PRIMARY KEY, {', '.join(self._columns)})")
+        self._bytes = 0
+        self._pending = [(None, self._snapshot(model.dataframe))]
+        model.add_listener(self._on_model_changed)
+
+    @staticmethod
+    def _snapshot(rows):
+        """记下 rows 的全文列（副本），之后在模型锁之外写入索引也不会读到改了一半的数据。"""
+        return rows[FULL_TEXT_COLUMNS].copy()
+
+    def _on_model_changed(self, event):
+        kind = event['type']
+        if kind == 'reset':
+            with self._pending_lock:
+                self._pending = [(None, self._snapshot(self.model.dataframe))]  # 之前排队的修改都已被整表替换
+            return
+        if kind == 'update' and set(FULL_TEXT_COLUMNS).isdisjoint(event['columns']):
+            return
+        if kind == 'remove':
+            removed, changed = event['row_ids'], []
+        elif kind == 'batch':
+            removed, changed = event['removed'], event['inserted'] + event['updated']
+        else:
+            removed, changed = event.get('removed', []), event['row_ids']
+        df = self.model.dataframe
+        positions = df.index.get_indexer(changed)
+        rows = self._snapshot(df.iloc[positions[positions >= 0]])
+        with self._pending_lock:
+            self._pending.append(([int(key) for key in {*removed, *changed}], rows))
+
+    def sync(self):
+        """把积累的修改写入索引（首次调用时建立整个索引）。不需要持有模型的锁。"""
+        with self._lock:
+            self._apply_pending()
+
+    def _apply_pending(self):
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        with self._conn:
+            for removed, rows in pending:
+                if removed is None:
+                    self._conn.execute("INSERT INTO grams(grams) VALUES ('delete-all')")
+                    self._conn.execute("DELETE FROM texts")
+                else:
+                    self._delete(removed)
+                self._insert(rows)
+        page_count = self._conn.execute("PRAGMA page_count").fetchone()[0]
+        self._bytes = page_count * self._conn.execute("PRAGMA page_size").fetchone()[0]
+
+    @staticmethod
+    def _bigrams(values):
+        """一列文本对应的双字词元串；影响与理由的措辞重复度高，相同文本只切分一次。"""
+        codes, uniques = pd.factorize(np.array(values, dtype=object))
+        grams = np.empty(len(uniques), dtype=object)
+        grams[:] = [_text_bigrams(text) for text in uniques]
+        return grams[codes].tolist()
+
+    def _insert(self, rows):
+        keys = rows.index.tolist()
+        if not keys:
+            return
+        texts = [[value if isinstance(value, str) else '' for value in rows[column].tolist()]
+                 for column in FULL_TEXT_COLUMNS]
+        placeholders = ', '.join('?' * len(self._columns))
+        self._conn.executemany(f"INSERT INTO texts(rowid, {', '.join(self._columns)}) VALUES (?, {placeholders})",
+                               zip(keys, *texts))
+        self._conn.executemany(f"INSERT INTO grams(rowid, {', '.join(self._columns)}) VALUES (?, {placeholders})",
+                               zip(keys, *map(self._bigrams, texts)))
+
+    def _delete(self, keys):
+        # 无内容表删除时须提供原内容，从 texts 表取回旧文本重新切分
+        old = self._conn.execute(
+            f"SELECT rowid, {', '.join(self._columns)} FROM texts WHERE rowid IN ({', '.join('?' * len(keys))})",
+            keys).fetchall() if keys else []
+        if not old:
+            return
+        keys, *texts = zip(*old)
+        self._conn.executemany(
+            f"INSERT INTO grams(grams, rowid, {', '.join(self._columns)}) VALUES ('delete', ?{', ?' * len(self._columns)})",
+            zip(keys, *map(self._bigrams, texts)))
+        self._conn.executemany("DELETE FROM texts WHERE rowid = ?", ((key,) for key in keys))
+
+    @staticmethod
+    def _match(terms):
+        """检索词 -> FTS5 查询：每个词一个带引号的短语（单字为前缀查询），以 AND 连接。"""
+        phrases = []
+        for term in terms:
+            folded = _fold(term)
+            grams = ' '.join(map(''.join, zip(folded, folded[1:]))) or folded
+            phrase = '"' + grams.replace('"', '""') + '"'
+            phrases.append(phrase + '*' if len(folded) == 1 else phrase)
+        return ' AND '.join(phrases)
+
+    def search(self, query, offset=0, limit=20):
+        """检索 query，返回 (命中总数, [(row_id, 得分, {列名: 高亮片段}), ...])，按得分从高到低（同分按行顺序）排列。
+
+        排序与分页都在 SQLite 中完成，只有本页的行回到 Python 生成高亮片段。
+        """
+        terms = query.split()
+        if not terms:
+            return 0, []
+        match = self._match(terms)
+        with self._lock:
+            self._apply_pending()
+            total = self._conn.execute("SELECT count(*) FROM grams WHERE grams MATCH ?", [match]).fetchone()[0]
+            page = self._conn.execute("SELECT rowid, -rank FROM grams WHERE grams MATCH ? ORDER BY rank, rowid "
+                                      "LIMIT ? OFFSET ?", [match, limit, offset]).fetchall() if total > offset else []
+            row_ids = [row_id for row_id, _ in page]
+            texts = {row_id: texts for row_id, *texts in self._conn.execute(
+                f"SELECT rowid, {', '.join(self._columns)} FROM texts WHERE rowid IN ({', '.join('?' * len(row_ids))})",
+                row_ids)} if row_ids else {}
+        hits = []
+        for row_id, score in page:
+            marked = [self._snippet(text, terms) for text in texts[row_id]]
+            highlights = {column: text for column, text in zip(FULL_TEXT_COLUMNS, marked) if self.HIGHLIGHT[0] in text}
+            hits.append((row_id, score, highlights))
+        return total, hits
+
+    def memory_bytes(self):
+        """索引占用的内存字节数（最近一次写入索引后的值，不等待正在进行的建立）。"""
+        return self._bytes
+
+    def _mark(self, text, terms):
+        """标出 text 中 terms 的出现（跳过已标出的部分），忽略大小写。"""
+        if not terms:
+            return text
+        pattern = re.compile('|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+        opening, closing = self.HIGHLIGHT
+        parts = re.split(f"({re.escape(opening)}.*?{re.escape(closing)})", text)
+        return ''.join(part if part.startswith(opening) else pattern.sub(lambda m: opening + m.group(0) + closing, part)
+                       for part in parts)
+
+    def _snippet(self, text, terms):
+        """命中的片段：截取首个检索词附近的一段并标出其中的检索词。"""
+        folded = text.lower()
+        starts = [folded.find(term.lower()) for term in terms]
+        starts = [start for start in starts if start >= 0]
+        if not starts:
+            return text
+        begin = max(0, min(starts) - self.SNIPPET_CHARS // 2)
+        end = min(len(text), begin + self.SNIPPET_CHARS)
+        return ((self.ELLIPSIS if begin else '') + self._mark(text[begin:end], terms)
+                + (self.ELLIPSIS if end < len(text) else ''))
+
 
 # ------------------- Pandas-Qt表格适配器 -------------------
 class PandasModel(QAbstractTableModel):
+    """DataFrame 的表格适配器。
+
+    绘制路径只读预先生成的缓存：每列一个显示字符串列表，外加“失效状态为空”的逐行位图，
+    data() 中不再访问 DataFrame、也不会构造 Series。DataFrame 被外部修改后调用 refresh() 重建缓存。
+    """
+    MISSING_COLOR = QColor("#FFF9C4")
+    EVEN_COLOR = QColor("#FFFFFF")
+    ODD_COLOR = QColor("#F8F8F8")
+
     def __init__(self, data):
         super().__init__()
         self._data = data
+        self._build_cache()
+
+    def _build_cache(self):
+        self._headers = list(self._data.columns)
+        self._columns = [self._display_strings(self._data[column]) for column in self._headers]
+        self._missing = self._missing_bitmap(self._data)
+
+    @staticmethod
+    def _display_strings(series):
+        return series.astype(str).tolist()
+
+    @staticmethod
+    def _missing_bitmap(df):
+        """逐行标记“失效状态”是否为空（NaN 或空字符串），1 字节/行。"""
+        if '失效状态' not in df.columns:
+            return bytearray(len(df))
+        return bytearray((df['失效状态'].fillna('') == '').to_numpy(dtype=bool).tobytes())
+
+    def refresh(self):
+        """DataFrame 被整体替换或外部修改后重建缓存。"""
+        self.beginResetModel()
+        self._build_cache()
+        self.endResetModel()
+
+    def set_dataframe(self, data):
+        self._data = data
+        self.refresh()
 
     def rowCount(self, parent=QModelIndex()):
-        return len(self._data.index)
+        return len(self._missing)
 
     def columnCount(self, parent=QModelIndex()):
-        return len(self._data.columns)
+        return len(self._headers)
 
     def data(self, index, role=Qt.ItemDataRole.DisplayRole):
         if not index.isValid(): return None
-        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
-            return str(self._data.iloc[index.row(), index.column()])
-        if role == Qt.ItemDataRole.ToolTipRole:
-            return str(self._data.iloc[index.row(), index.column()])
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole, Qt.ItemDataRole.ToolTipRole):
+            return self._columns[index.column()][index.row()]
         if role == Qt.ItemDataRole.BackgroundRole:
-            if '失效状态' in self._data.columns and (
-                    pd.isna(self._data.iloc[index.row()]['失效状态']) or self._data.iloc[index.row()][
-                '失效状态'] == ''):
-                return QColor("#FFF9C4")
-            return QColor("#FFFFFF") if index.row() % 2 == 0 else QColor("#F8F8F8")
+            row = index.row()
+            if self._missing[row]:
+                return self.MISSING_COLOR
+            return self.EVEN_COLOR if row % 2 == 0 else self.ODD_COLOR
         return None
 
     def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
         if role == Qt.ItemDataRole.DisplayRole:
             if orientation == Qt.Orientation.Horizontal:
-                return self._data.columns[section]
+                return self._headers[section]
             if orientation == Qt.Orientation.Vertical:
-                return str(self._data.index[section] + 1)
+                return str(section + 1)
         return None
 
+    def row_key(self, row):
+        """视图行号 -> FHA_Model 行键。"""
+        return int(self._data.index[row])
+
+    def row_of_key(self, row_key):
+        """FHA_Model 行键 -> 视图行号（O(1)），用于在增删行后恢复选中与滚动位置。"""
+        return self._data.index.get_loc(row_key)
+
     def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
         if role == Qt.ItemDataRole.EditRole:
-            self._data.iloc[index.row(), index.column()] = value
-            self.dataChanged.emit(index, index)
+            row, column = index.row(), index.column()
+            FHA_Model.ensure_categories(self._data, self._headers[column], [value])
+            self._data.iloc[row, column] = value
+            self._columns[column][row] = str(value)
+            if self._headers[column] == '失效状态':
+                self._missing[row] = int(value == '')
+                self.dataChanged.emit(self.index(row, 0), self.index(row, len(self._headers) - 1))
+            else:
+                self.dataChanged.emit(index, index)
             return True
         return False
 
@@ -146,20 +890,218 @@ class PandasModel(QAbstractTableModel):
         return super().flags(index) | Qt.ItemFlag.ItemIsEditable
 
 
+class FHA_TableModel(PandasModel):
+    """跟随 FHA_Model 的表格适配器：订阅模型的变更事件，只对受影响的行发出
+    beginInsertRows / beginRemoveRows / dataChanged，视图不再需要整体重建。
+
+    单元格编辑经由 FHA_Model.update_row 写回，从而让其他监听者也能收到通知。
+    """
+
+    def __init__(self, fha_model):
+        self.fha_model = fha_model
+        super().__init__(fha_model.get_dataframe())
+        fha_model.add_listener(self._on_model_changed)
+
+    def detach(self):
+        self.fha_model.remove_listener(self._on_model_changed)
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if role == Qt.ItemDataRole.EditRole:
+            self.fha_model.update_row(self.row_key(index.row()), {self._headers[index.column()]: value})
+            return True
+        return False
+
+    # --- 缓存的局部更新 ---
+    def _slice_cache(self, start, stop):
+        rows = self._data.iloc[start:stop]
+        return [self._display_strings(rows[column]) for column in self._headers], self._missing_bitmap(rows)
+
+    def _emit_rows_changed(self, first, last):
+        self.dataChanged.emit(self.index(first, 0), self.index(last, len(self._headers) - 1))
+
+    def _refresh_ids(self, start):
+        """重新编号后刷新“编号”列中第 start 行及之后的缓存。"""
+        if '编号' not in self._headers or start >= len(self._missing):
+            return
+        column = self._headers.index('编号')
+        self._columns[column][start:] = self._display_strings(self._data['编号'].iloc[start:])
+        self.dataChanged.emit(self.index(start, column), self.index(len(self._missing) - 1, column))
+
+    def _insert_cache(self, first, count):
+        self.beginInsertRows(QModelIndex(), first, first + count - 1)
+        columns, missing = self._slice_cache(first, first + count)
+        for cached, values in zip(self._columns, columns):
+            cached[first:first] = values
+        self._missing[first:first] = missing
+        self.endInsertRows()
+
+    def _remove_cache(self, positions):
+        """按升序位置删除缓存行，连续的位置合并为一次 beginRemoveRows，并从后往前删除。"""
+        ranges = []
+        for position in positions:
+            if ranges and ranges[-1][1] == position - 1:
+                ranges[-1][1] = position
+            else:
+                ranges.append([position, position])
+        for first, last in reversed(ranges):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            for cached in self._columns:
+                del cached[first:last + 1]
+            del self._missing[first:last + 1]
+            self.endRemoveRows()
+
+    def _update_cache(self, position):
+        columns, missing = self._slice_cache(position, position + 1)
+        for cached, values in zip(self._columns, columns):
+            cached[position] = values[0]
+        self._missing[position] = missing[0]
+        self._emit_rows_changed(position, position)
+
+    def _on_model_changed(self, event):
+        self._data = self.fha_model.get_dataframe()
+        kind = event['type']
+        if kind == 'insert':
+            self._insert_cache(event['first'], len(event['row_ids']))
+            self._refresh_ids(event['first'] + len(event['row_ids']))
+        elif kind == 'remove':
+            self._remove_cache(event['positions'])
+            self._refresh_ids(event['positions'][0])
+        elif kind == 'update':
+            for row_key in event['row_ids']:
+                self._update_cache(self.row_of_key(row_key))
+        elif kind == 'replace':
+            position, count = event['position'], len(event['row_ids'])
+            self._update_cache(position)
+            if count > 1:
+                self._insert_cache(position + 1, count - 1)
+            self._refresh_ids(position + count)
+        else:
+            self.refresh()
+
+
+# ------------------- 项目文件（Arrow IPC） -------------------
+PROJECT_FILE_SUFFIX = '.fha'
+PROJECT_FORMAT = 'fha-project'
+PROJECT_FORMAT_VERSION = 1
+
+
+def _project_table(model):
+    import pyarrow as pa
+    table = pa.Table.from_pandas(model.get_dataframe(), preserve_index=True)
+    project_meta = {'format': PROJECT_FORMAT, 'version': PROJECT_FORMAT_VERSION,
+                    'next_key': model.next_key, 'next_id': model.next_id, 'revision': model.revision,
+                    'versions': model.version_state()}
+    return table.replace_schema_metadata(dict(table.schema.metadata or {}, fha=json.dumps(project_meta)))
+
+
+def _write_project(model, sink):
+    import pyarrow as pa
+    table = _project_table(model)
+    with pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def _read_project(source):
+    """从 Arrow IPC 源读取项目，返回 (DataFrame, 项目元数据)。源不是FHA项目时抛出 ValueError。"""
+    import pyarrow as pa
+    table = pa.ipc.open_file(source).read_all()
+    raw_meta = (table.schema.metadata or {}).get(b'fha')
+    project_meta = json.loads(raw_meta) if raw_meta else {}
+    if project_meta.get('format') != PROJECT_FORMAT:
+        raise ValueError("不是有效的FHA项目文件")
+    if project_meta.get('version', 0) > PROJECT_FORMAT_VERSION:
+        raise ValueError(f"项目文件版本 {project_meta['version']} 高于当前程序支持的版本")
+    return table.to_pandas(), project_meta
+
+
+def save_project(model, filepath):
+    """把模型保存为未压缩的 Arrow IPC 文件：Categorical 列存为字典编码，row_id 行键与编号计数器写入元数据。
+
+    先写入临时文件再替换目标文件，保存中断不会损坏原有项目。返回 (是否成功, 提示信息)。
+    """
+    temp_path = f"{filepath}.tmp"
+    try:
+        import pyarrow as pa
+        with pa.OSFile(temp_path, 'wb') as sink:
+            _write_project(model, sink)
+        os.replace(temp_path, filepath)
+        return True, f"项目已保存至\n{filepath}"
+    except Exception as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False, f"保存失败: {e}"
+
+
+def read_project_dataframe(filepath):
+    """以内存映射方式读取项目文件，返回 (DataFrame, 项目元数据)。文件不是FHA项目时抛出 ValueError。"""
+    import pyarrow as pa
+    with pa.memory_map(filepath, 'r') as source:
+        return _read_project(source)
+
+
+def load_project(model, filepath):
+    """打开 save_project() 保存的项目文件，替换模型当前数据。返回 (是否成功, 提示信息)。"""
+    try:
+        df, project_meta = read_project_dataframe(filepath)
+        model.restore_dataframe(df, project_meta.get('next_key'), project_meta.get('next_id'),
+                                project_meta.get('revision'), project_meta.get('versions'))
+        return True, f"项目已打开，共 {len(df)} 行。"
+    except Exception as e:
+        return False, f"打开失败: {e}"
+
+
+def project_to_bytes(model):
+    """把模型编码为与项目文件相同格式的字节串（供数据库等存储后端使用）。"""
+    import pyarrow as pa
+    sink = pa.BufferOutputStream()
+    _write_project(model, sink)
+    return sink.getvalue().to_pybytes()
+
+
+def project_from_bytes(data, model=None):
+    """由 project_to_bytes() 的结果还原模型；给定 model 时就地替换其数据，否则新建一个。"""
+    import pyarrow as pa
+    df, project_meta = _read_project(pa.BufferReader(data))
+    model = model if model is not None else FHA_Model()
+    model.restore_dataframe(df, project_meta.get('next_key'), project_meta.get('next_id'),
+                            project_meta.get('revision'), project_meta.get('versions'))
+    return model
+
+
 # ------------------- Excel导入导出功能 -------------------
 def import_from_excel(filepath):
+    """把第一个工作表读成全部为字符串的 DataFrame；分块读入，每块交给 ChunkAccumulator 后即释放。"""
     try:
-        df = pd.read_excel(filepath, engine='openpyxl').fillna('').astype(str)
+        accumulator, columns = None, []
+        for chunk in iter_excel_chunks(filepath):
+            if accumulator is None:
+                columns = list(chunk.columns)
+                accumulator = ChunkAccumulator(range(len(columns)))  # 按位置收集，表头有重名时也不会混淆
+            accumulator.add(chunk.set_axis(range(len(columns)), axis=1))
+        df = pd.DataFrame()
+        if accumulator is not None:
+            df = accumulator.finish(df, ignore_index=True).set_axis(columns, axis=1)
         return df, "加载成功！"
     except Exception as e:
         return None, f"加载失败: {e}"
 
 
+def import_excel_into_model(model, source, progress=None):
+    """把 Excel 分块流式导入 model，不在内存中保留整张原始表。返回 (是否成功, 提示信息)。"""
+    try:
+        model.load_dataframe(iter_excel_chunks(source, progress=progress))
+        return True, f"加载成功！共 {len(model.get_dataframe())} 行。"
+    except Exception as e:
+        return False, f"加载失败: {e}"
+
+
 def export_to_excel(dataframe, filepath):
     if dataframe.empty:
         return False, "没有可导出的数据。"
     try:
-        dataframe.to_excel(filepath, index=False, engine='openpyxl')
+        with open(filepath, 'wb') as f:
+            for block in iter_xlsx_bytes(dataframe):
+                f.write(block)
         return True, f"报告已成功导出至\n{filepath}"
     except Exception as e:
-        return False, f"导出失败: {e}"
\ No newline at end of file
+        return False, f"导出失败: {e}"
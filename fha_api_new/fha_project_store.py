@@ -0,0 +1,504 @@
+# fha_project_store.py
+# -*- coding: utf-8 -*-
+# 职责：FHA 项目的持久化存储（可替换的存储后端 + 延迟加载、延后写回的项目注册表）。
+
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from fha_core_logic import FHA_Model, project_to_bytes, project_from_bytes
+from fha_shared import ReadWriteLock
+
+logger = logging.getLogger(__name__)
+
+# 存储位置与写回延迟均可通过环境变量配置；FHA_PROJECT_DB=":memory:" 时仅在进程内保存
+PROJECT_DB_PATH = os.environ.get("FHA_PROJECT_DB", "fha_projects.db")
+WRITE_BEHIND_SECONDS = float(os.environ.get("FHA_WRITE_BEHIND_SECONDS", "2.0"))
+# 常驻内存的项目模型预算：项目个数与估算字节数（按项目编码后的大小估算），取 0 表示不限制
+CACHE_MAX_PROJECTS = int(os.environ.get("FHA_CACHE_MAX_PROJECTS", "64"))
+CACHE_MAX_BYTES = int(float(os.environ.get("FHA_CACHE_MAX_MB", "512")) * 1024 * 1024)
+
+
+# ------------------- 存储后端 -------------------
+class ProjectStore:
+    """项目存储后端接口。项目数据以 project_to_bytes() 编码的字节串存取，后端无需了解表格结构。
+
+    实现必须是线程安全的：请求线程与后台写回线程会同时调用。
+    """
+
+    def create(self, project_id: str, name: str, created_at: datetime) -> None:
+        raise NotImplementedError
+
+    def get_info(self, project_id: str) -> Optional[Dict]:
+        """返回 {project_id, name, created_at, entry_count}，项目不存在时返回 None。"""
+        raise NotImplementedError
+
+    def list_projects(self) -> List[Dict]:
+        raise NotImplementedError
+
+    def load(self, project_id: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def save(self, project_id: str, data: bytes, entry_count: int) -> None:
+        raise NotImplementedError
+
+    def delete(self, project_id: str) -> bool:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteProjectStore(ProjectStore):
+    """基于 SQLite 的本地存储：每个项目一行，项目数据存为一个 BLOB，元数据单独成列以便不加载数据即可列出项目。"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS projects (
+            project_id  TEXT PRIMARY KEY,
+            name        TEXT NOT NULL,
+            created_at  TEXT NOT NULL,
+            updated_at  TEXT,
+            entry_count INTEGER NOT NULL DEFAULT 0,
+            data        BLOB
+        )
+    """
+
+    def __init__(self, path: str = PROJECT_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(self.SCHEMA)
+        self._conn.commit()
+
+    @staticmethod
+    def _info(row) -> Dict:
+        return {"project_id": row[0], "name": row[1],
+                "created_at": datetime.fromisoformat(row[2]), "entry_count": row[3]}
+
+    def create(self, project_id: str, name: str, created_at: datetime) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("INSERT INTO projects (project_id, name, created_at) VALUES (?, ?, ?)",
+                               (project_id, name, created_at.isoformat()))
+
+    def get_info(self, project_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT project_id, name, created_at, entry_count FROM projects "
+                                     "WHERE project_id = ?", (project_id,)).fetchone()
+        return self._info(row) if row else None
+
+    def list_projects(self) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT project_id, name, created_at, entry_count FROM projects "
+                                      "ORDER BY created_at").fetchall()
+        return [self._info(row) for row in rows]
+
+    def load(self, project_id: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM projects WHERE project_id = ?", (project_id,)).fetchone()
+        return row[0] if row else None
+
+    def save(self, project_id: str, data: bytes, entry_count: int) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE projects SET data = ?, entry_count = ?, updated_at = ? WHERE project_id = ?",
+                               (data, entry_count, datetime.now().isoformat(), project_id))
+
+    def delete(self, project_id: str) -> bool:
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM projects WHERE project_id = ?", (project_id,)).rowcount > 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# ------------------- 项目注册表 -------------------
+class ProjectHandle:
+    """ProjectRegistry.pin() 产出的项目：钉住期间模型不会被淘汰，读写模型前用 read() / write() 取得项目的读写锁。"""
+
+    def __init__(self, project_id: str, model: FHA_Model, lock: ReadWriteLock):
+        self.project_id = project_id
+        self.model = model
+        self._lock = lock
+
+    @contextmanager
+    def read(self) -> Iterator[FHA_Model]:
+        with self._lock.read():
+            yield self.model
+
+    @contextmanager
+    def write(self) -> Iterator[FHA_Model]:
+        with self._lock.write():
+            yield self.model
+
+
+class _PendingLoad:
+    """一个进行中的项目加载：同一项目的其他请求等待它完成，其他项目的请求不受影响。"""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self.model: Optional[FHA_Model] = None
+        self.error: Optional[BaseException] = None
+
+    def finish(self, model: Optional[FHA_Model] = None, error: Optional[BaseException] = None) -> None:
+        self.model, self.error = model, error
+        self._done.set()
+
+    def wait(self) -> Optional[FHA_Model]:
+        self._done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.model
+
+
+class ProjectRegistry:
+    """请求处理使用的项目入口。
+
+    - 项目首次被访问时才从存储后端还原为 FHA_Model，常驻模型按最近使用顺序组成有界缓存，
+      超出 max_projects / max_bytes 预算时淘汰最久未用的模型（先写回未保存的修改），再次访问时重新加载；
+    - pin() / checkout() 期间模型被“钉住”，不会被淘汰，请求处理中的修改不会落在已淘汰的模型上；
+      读写模型时持有该项目的读写锁：读请求可并行，修改请求彼此串行且与读请求互斥；
+    - 通过模型的变更通知把项目标记为“脏”，由后台线程在 flush_delay 秒后统一写回，
+      短时间内的连续修改只写一次；close() 会同步写回全部未保存的修改；
+    - 注册表锁 self._lock 只保护缓存簿记：加载时的读取与解码、淘汰时的编码与写入都在锁外进行，
+      一个大项目的冷加载或写回不会阻塞其他项目的请求。
+    """
+
+    def __init__(self, store: ProjectStore, flush_delay: float = WRITE_BEHIND_SECONDS,
+                 max_projects: int = CACHE_MAX_PROJECTS, max_bytes: int = CACHE_MAX_BYTES):
+        self.store = store
+        self.flush_delay = flush_delay
+        self.max_projects = max_projects
+        self.max_bytes = max_bytes
+        self._models: "OrderedDict[str, FHA_Model]" = OrderedDict()
+        self._loading: Dict[str, _PendingLoad] = {}
+        # 已移出缓存、正在写回的脏模型：project_id -> (模型, 估算字节数)；写回完成前再次访问直接取回
+        self._evicting: Dict[str, tuple] = {}
+        self._listeners: Dict[str, object] = {}
+        self._locks: Dict[str, ReadWriteLock] = {}
+        self._sizes: Dict[str, int] = {}
+        # 模型各自建立的内存全文索引的字节数，在每次请求结束（解除钉住）时重新测量，计入 max_bytes 预算
+        self._index_sizes: Dict[str, int] = {}
+        self._pins: Dict[str, int] = {}
+        self._dirty = set()
+        self._flushing = set()
+        self._lock = threading.RLock()
+        # 脏标记单独加锁：持有项目写锁的请求在修改模型时会调用 mark_dirty()，不能等待 self._lock，
+        # 否则会与“持有 self._lock 淘汰项目、等待写回完成”的线程互相等待
+        self._dirty_lock = threading.Lock()
+        # 编码并写入一个项目的过程互斥，保证较晚开始的写入总是写入较新的数据
+        self._write_lock = threading.Lock()
+        # 写回线程与显式调用的 flush() 依次执行：flush() 返回时，调用之前的修改都已落盘，
+        # 不会因为另一轮写回刚取走脏标记、尚未写完而提前返回
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+        self.hits = self.misses = self.evictions = 0
+
+    # --- 项目管理 ---
+    def create(self, name: str) -> Dict:
+        project_id = str(uuid.uuid4())
+        created_at = datetime.now()
+        model = FHA_Model()
+        data = project_to_bytes(model)
+        self.store.create(project_id, name, created_at)
+        self.store.save(project_id, data, 0)
+        with self._lock:
+            self._attach(project_id, model, len(data))
+            victims = self._evict()
+        self._write_evicted(victims)
+        return {"project_id": project_id, "name": name, "created_at": created_at, "entry_count": 0}
+
+    def _peek(self, project_id: str) -> Optional[FHA_Model]:
+        """内存中的模型（包括正在写回的），不改变最近使用顺序（调用方持有 self._lock）。"""
+        model = self._models.get(project_id)
+        if model is None and project_id in self._evicting:
+            model = self._evicting[project_id][0]
+        return model
+
+    def exists(self, project_id: str) -> bool:
+        with self._lock:
+            if self._peek(project_id) is not None:
+                return True
+        return self.store.get_info(project_id) is not None
+
+    def list_projects(self) -> List[Dict]:
+        projects = self.store.list_projects()
+        with self._lock:
+            for info in projects:
+                model = self._peek(info["project_id"])
+                if model is not None:
+                    info["entry_count"] = len(model.get_dataframe())
+        return projects
+
+    def get_model(self, project_id: str) -> Optional[FHA_Model]:
+        """返回项目的模型，必要时从存储后端加载；项目不存在时返回 None。返回的模型之后可能被淘汰，
+        需要修改模型时请使用 pin() / checkout()。
+
+        同一项目的并发请求只加载一次，其余请求等待该次加载；读取与解码在注册表锁之外进行。"""
+        with self._lock:
+            model = self._models.get(project_id)
+            if model is not None:
+                self.hits += 1
+                self._models.move_to_end(project_id)
+                return model
+            if project_id in self._evicting:
+                # 正在写回的模型重新变为常驻，写回完成后不再移出缓存；在那次写回落盘之前仍视为脏，
+                # 再次被淘汰时会重新写回，不会在旧数据落盘前被丢弃
+                model, size = self._evicting.pop(project_id)
+                self.hits += 1
+                self._models[project_id] = model
+                self._sizes[project_id] = size
+                self.mark_dirty(project_id)
+                victims = self._evict()
+            else:
+                pending = self._loading.get(project_id)
+                if pending is not None:
+                    loader = False
+                else:
+                    pending = self._loading[project_id] = _PendingLoad()
+                    loader = True
+        if model is not None:
+            self._write_evicted(victims)
+            return model
+        if not loader:
+            return pending.wait()
+        try:
+            data = self.store.load(project_id)
+            model = project_from_bytes(data) if data is not None else None
+        except BaseException as exc:
+            with self._lock:
+                self._loading.pop(project_id, None)
+            pending.finish(error=exc)
+            raise
+        victims = []
+        with self._lock:
+            # 加载期间项目被删除时不再放入缓存
+            if self._loading.pop(project_id, None) is not pending:
+                model = None
+            if model is not None:
+                self.misses += 1
+                self._attach(project_id, model, len(data))
+                victims = self._evict()
+        pending.finish(model)
+        self._write_evicted(victims)
+        return model
+
+    @contextmanager
+    def pin(self, project_id: str) -> Iterator[Optional[ProjectHandle]]:
+        """在 with 块内钉住项目模型（必要时先加载），产出 ProjectHandle，项目不存在时产出 None。
+        只钉住、不加锁：调用方在真正读写模型时再取得 read() / write()。退出后按预算淘汰。"""
+        with self._lock:
+            self._pins[project_id] = self._pins.get(project_id, 0) + 1
+        model = None
+        try:
+            model = self.get_model(project_id)
+            if model is None:
+                yield None
+            else:
+                with self._lock:
+                    lock = self._locks[project_id]
+                yield ProjectHandle(project_id, model, lock)
+        finally:
+            # 请求期间可能首次建立或扩充了全文索引，测量在注册表锁之外进行（需要等待索引自身的锁）
+            index_size = model.full_text_bytes() if model is not None else 0
+            with self._lock:
+                if model is not None and self._models.get(project_id) is model:
+                    self._index_sizes[project_id] = index_size
+                self._unpin(project_id)
+                victims = self._evict()
+            self._write_evicted(victims)
+
+    @contextmanager
+    def checkout(self, project_id: str, write: bool = False) -> Iterator[Optional[FHA_Model]]:
+        """在 with 块内钉住项目模型并持有其读锁（write=True 时为写锁），项目不存在时产出 None。"""
+        with self.pin(project_id) as project:
+            if project is None:
+                yield None
+            else:
+                with (project.write() if write else project.read()) as model:
+                    yield model
+
+    def _unpin(self, project_id: str) -> None:
+        self._pins[project_id] -= 1
+        if not self._pins[project_id]:
+            del self._pins[project_id]
+
+    def delete(self, project_id: str) -> bool:
+        with self._lock:
+            self._loading.pop(project_id, None)
+            self._detach(project_id)
+            with self._dirty_lock:
+                self._dirty.discard(project_id)
+        return self.store.delete(project_id)
+
+    def _attach(self, project_id: str, model: FHA_Model, size: int) -> None:
+        listener = lambda event, pid=project_id: self.mark_dirty(pid)
+        model.add_listener(listener)
+        self._models[project_id] = model
+        self._listeners[project_id] = listener
+        self._locks[project_id] = ReadWriteLock()
+        self._sizes[project_id] = size
+
+    def _detach(self, project_id: str) -> Optional[FHA_Model]:
+        model = self._models.pop(project_id, None)
+        if model is None and project_id in self._evicting:
+            model = self._evicting.pop(project_id)[0]
+        if model is not None:
+            model.remove_listener(self._listeners.pop(project_id))
+            self._locks.pop(project_id, None)
+            self._sizes.pop(project_id, None)
+            self._index_sizes.pop(project_id, None)
+        return model
+
+    # --- 缓存淘汰 ---
+    def _over_budget(self) -> bool:
+        return ((self.max_projects and len(self._models) > self.max_projects)
+                or (self.max_bytes and self._resident_bytes() > self.max_bytes))
+
+    def _resident_bytes(self) -> int:
+        return sum(self._sizes.values()) + sum(self._index_sizes.values())
+
+    def _evict(self) -> List[tuple]:
+        """按最近最少使用的顺序淘汰未被钉住的模型，直到回到预算之内（调用方持有 self._lock）。
+
+        没有未保存修改的模型直接移出缓存；其余的（包括写回线程尚未写完的）移入 self._evicting，
+        返回 [(project_id, (模型, 估算字节数)), ...]，由调用方释放 self._lock 后交给 _write_evicted() 写回。
+        """
+        victims = []
+        for project_id in list(self._models):
+            if not self._over_budget():
+                break
+            if project_id in self._pins:
+                continue
+            with self._dirty_lock:
+                unsaved = project_id in self._dirty or project_id in self._flushing
+                self._dirty.discard(project_id)
+            if unsaved:
+                # 每次淘汰一个新的条目对象：写回期间模型若被重新访问又再次淘汰，先完成的写回不会误删后一次淘汰
+                entry = (self._models.pop(project_id), self._sizes.pop(project_id))
+                self._index_sizes.pop(project_id, None)
+                self._evicting[project_id] = entry
+                victims.append((project_id, entry))
+            else:
+                self._detach(project_id)
+                self.evictions += 1
+        return victims
+
+    def _write_evicted(self, victims: List[tuple]) -> None:
+        """写回 _evict() 挑出的脏模型（不持有 self._lock）。写回前重新加载不会读到旧数据：
+        此期间的访问直接取回内存中的模型；写入失败的模型恢复常驻并保持为脏，避免丢失修改。"""
+        for project_id, entry in victims:
+            model, size = entry
+            try:
+                self._write(project_id, model)
+                failed = False
+            except Exception:
+                logger.exception("项目 %s 写回失败，暂不淘汰", project_id)
+                failed = True
+            with self._lock:
+                if failed and self._peek(project_id) is model:
+                    with self._dirty_lock:
+                        self._dirty.add(project_id)
+                if self._evicting.get(project_id) is not entry:
+                    continue  # 写回期间已被重新访问（恢复常驻，或又开始了新的一次淘汰）或已删除
+                if failed:
+                    del self._evicting[project_id]
+                    self._models[project_id] = model
+                    self._models.move_to_end(project_id, last=False)
+                    self._sizes[project_id] = size
+                else:
+                    self._detach(project_id)
+                    self.evictions += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "resident_projects": len(self._models),
+                "resident_bytes": self._resident_bytes(),
+                "pinned_projects": len(self._pins),
+                "dirty_projects": len(self._dirty),
+                "max_projects": self.max_projects,
+                "max_bytes": self.max_bytes,
+            }
+
+    # --- 延后写回 ---
+    def mark_dirty(self, project_id: str) -> None:
+        with self._dirty_lock:
+            self._dirty.add(project_id)
+            if self._writer is None and not self._stop.is_set():
+                self._writer = threading.Thread(target=self._write_behind_loop, name="fha-write-behind", daemon=True)
+                self._writer.start()
+        self._wake.set()
+
+    def _write(self, project_id: str, model: FHA_Model) -> None:
+        with self._write_lock:
+            # 模型已不是该项目在内存中的模型（淘汰时已写回其最新数据，或项目已删除）时跳过，
+            # 否则迟到的写回会覆盖重新加载之后的修改
+            with self._lock:
+                if self._peek(project_id) is not model:
+                    return
+                lock = self._locks[project_id]
+            # 编码时持有项目读锁，不会读到写了一半的表格
+            with lock.read():
+                data = project_to_bytes(model)
+                self.store.save(project_id, data, len(model.get_dataframe()))
+        with self._lock:
+            if self._models.get(project_id) is model:
+                self._sizes[project_id] = len(data)
+
+    def flush(self) -> int:
+        """立即写回所有脏项目，返回写回的项目数。写入失败的项目保持为脏，下次再试。"""
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self) -> int:
+        with self._lock, self._dirty_lock:
+            pending = [(pid, self._models[pid]) for pid in self._dirty if pid in self._models]
+            self._flushing.update(pid for pid, _ in pending)
+            self._dirty.clear()
+        written = 0
+        for project_id, model in pending:
+            try:
+                # 编码期间发生的新修改会重新标记为脏，由下一轮写回
+                self._write(project_id, model)
+                written += 1
+            except Exception:
+                logger.exception("项目 %s 写回失败", project_id)
+                with self._lock, self._dirty_lock:
+                    if project_id in self._models:
+                        self._dirty.add(project_id)
+            finally:
+                with self._dirty_lock:
+                    self._flushing.discard(project_id)
+        return written
+
+    def _write_behind_loop(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            # 等待一个写回周期，把这段时间内的连续修改合并为一次写入；close() 会提前结束等待
+            self._stop.wait(self.flush_delay)
+            self.flush()
+
+    def close(self) -> None:
+        """停止写回线程并同步写回全部未保存的修改。"""
+        self._stop.set()
+        self._wake.set()
+        if self._writer is not None:
+            self._writer.join()
+        self.flush()
+        self.store.close()
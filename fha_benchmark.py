@@ -0,0 +1,660 @@
+# fha_benchmark.py
+# -*- coding: utf-8 -*-
+# 职责：核心数据操作的性能基准。用法：python fha_benchmark.py [基准名 ...]（缺省运行全部）。
+
+import sys
+import time
+
+import pandas as pd
+
+from fha_core_logic import FHA_Model, PandasModel
+
+TABLE_SIZES = [1000, 5000, 20000, 100000]
+LEGACY_MAX_ROWS = 20000  # 旧实现逐行写入过慢，超过该规模不再对比
+
+
+def make_entries(count):
+    """生成 count 条带有典型重复取值的测试条目。"""
+    categories = FHA_Model.ARP4761_CATEGORIES
+    return [{
+        '一级功能': f"系统{i % 12}", '二级功能': f"子系统{i % 40}", '三级功能': '',
+        '功能类型': '导航', '飞行阶段': '巡航', '失效状态': '功能完全丧失' if i % 3 else '',
+        '对于飞行器的影响': f"失去定位能力，第{i}项影响描述", '对于地面/空域的影响': '无直接影响。',
+        '对于地面控制组的影响': '地面站告警。', '危害性分类': categories[i % len(categories)],
+        '理由/备注': 'GPS 信号丢失',
+    } for i in range(count)]
+
+
+def make_model(count):
+    model = FHA_Model()
+    model.add_fha_entries(make_entries(count))
+    return model
+
+
+def timed(func, repeat=3):
+    """返回 func 多次运行中的最短耗时（秒）。"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _legacy_re_number_ids(df):
+    for i in range(len(df)):
+        df.loc[i, '编号'] = f"FHA-{i + 1:03d}"
+
+
+def bench_renumber():
+    """重新编号耗时随表格规模的变化（逐行 .loc 写入 vs 整列赋值）。"""
+    print(f"{'行数':>8} {'逐行写入(ms)':>14} {'整列赋值(ms)':>14} {'推迟编号x100(ms)':>18}")
+    for size in TABLE_SIZES:
+        model = make_model(size)
+        legacy = '-'
+        if size <= LEGACY_MAX_ROWS:
+            df = model.get_dataframe().reset_index(drop=True)
+            legacy = f"{timed(lambda: _legacy_re_number_ids(df), repeat=1) * 1000:.1f}"
+        vectorized = timed(model.re_number_ids) * 1000
+
+        def burst():
+            with model.deferred_renumber():
+                for _ in range(100):
+                    model.re_number_ids()
+
+        deferred = timed(burst) * 1000
+        print(f"{size:>8} {legacy:>14} {vectorized:>14.2f} {deferred:>18.2f}")
+
+
+def bench_batch():
+    """逐条应用向导结果 vs 在 model.batch() 中一次性提交。"""
+    wizard_result = [{'失效状态': '功能完全丧失', '危害性分类': '危险的 (Hazardous)'},
+                     {'失效状态': '功能性能下降', '危害性分类': '轻微的 (Minor)'}]
+    print(f"{'行数':>8} {'向导次数':>8} {'逐条(ms)':>10} {'批量(ms)':>10}")
+    for size, calls in [(2000, 500), (10000, 500)]:
+        model = make_model(size)
+        keys = model.get_dataframe().index[:calls].tolist()
+
+        def direct():
+            for key in keys:
+                model.update_fha_entries_from_wizard_by_key(key, wizard_result)
+
+        batch_model = make_model(size)
+
+        def batched():
+            with batch_model.batch():
+                for key in keys:
+                    batch_model.update_fha_entries_from_wizard_by_key(key, wizard_result)
+
+        direct_ms = timed(direct, repeat=1) * 1000
+        batched_ms = timed(batched, repeat=1) * 1000
+        print(f"{size:>8} {calls:>8} {direct_ms:>10.1f} {batched_ms:>10.1f}")
+
+
+def _legacy_delete_rows(df, row_indices):
+    positions_to_delete = set(row_indices)
+    rows_to_keep = [row for index, row in df.iterrows() if index not in positions_to_delete]
+    return pd.DataFrame(rows_to_keep).reset_index(drop=True)
+
+
+def bench_delete():
+    """一次删除大量行：逐行 iterrows 重建 vs 布尔掩码删除（fha_api.FHA_Model）。"""
+    from fha_api import FHA_Model as ApiModel
+    print(f"{'行数':>8} {'删除行数':>8} {'iterrows(ms)':>14} {'掩码(ms)':>10} {'保留Categorical':>16}")
+    for size in TABLE_SIZES:
+        indices = list(range(0, size, 4))
+        model = ApiModel()
+        model.add_fha_entries(make_entries(size))
+        base = model.dataframe
+        legacy = '-'
+        if size <= LEGACY_MAX_ROWS:
+            legacy = f"{timed(lambda: _legacy_delete_rows(base, indices), repeat=1) * 1000:.1f}"
+        masked_ms = float('inf')
+        for _ in range(3):
+            model.dataframe = base  # 整表替换会同时重建行版本与索引，不计入删除耗时
+            masked_ms = min(masked_ms, timed(lambda: model.delete_rows(indices), repeat=1) * 1000)
+        kept = all(isinstance(model.dataframe[c].dtype, pd.CategoricalDtype) for c in ApiModel.CATEGORICAL_COLUMNS)
+        print(f"{size:>8} {len(indices):>8} {legacy:>14} {masked_ms:>10.2f} {str(kept):>16}")
+
+
+def _legacy_paint_data(df, row, col, role):
+    """旧版 PandasModel.data() 的取值方式：每次调用都经 iloc 访问 DataFrame。"""
+    from PySide6.QtCore import Qt
+    from PySide6.QtGui import QColor
+    if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole):
+        return str(df.iloc[row, col])
+    if role == Qt.ItemDataRole.BackgroundRole:
+        if pd.isna(df.iloc[row]['失效状态']) or df.iloc[row]['失效状态'] == '':
+            return QColor("#FFF9C4")
+        return QColor("#FFFFFF") if row % 2 == 0 else QColor("#F8F8F8")
+
+
+def bench_paint():
+    """表格绘制吞吐量：每个单元格依次请求 Display/ToolTip/Background 三种角色。"""
+    from PySide6.QtCore import Qt
+    roles = (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole, Qt.ItemDataRole.BackgroundRole)
+    print(f"{'行数':>8} {'旧模型(行/秒)':>14} {'缓存模型(行/秒)':>16} {'建缓存(ms)':>12}")
+    for size in [5000, 50000]:
+        df = make_model(size).get_dataframe()
+        columns = len(df.columns)
+        legacy_rows = min(size, 300)
+        start = time.perf_counter()
+        for row in range(legacy_rows):
+            for col in range(columns):
+                for role in roles:
+                    _legacy_paint_data(df, row, col, role)
+        legacy_rate = legacy_rows / (time.perf_counter() - start)
+
+        build_ms = timed(lambda: PandasModel(df), repeat=1) * 1000
+        model = PandasModel(df)
+        indexes = [[model.index(row, col) for col in range(columns)] for row in range(size)]
+        start = time.perf_counter()
+        for row_indexes in indexes:
+            for index in row_indexes:
+                for role in roles:
+                    model.data(index, role)
+        cached_rate = size / (time.perf_counter() - start)
+        print(f"{size:>8} {legacy_rate:>14.0f} {cached_rate:>16.0f} {build_ms:>12.1f}")
+
+
+def peak_memory(func):
+    """返回 (耗时秒, tracemalloc 峰值 MB)。"""
+    import tracemalloc
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024
+
+
+def bench_import():
+    """Excel 导入：pd.read_excel 整表读入 vs openpyxl 只读分块流式导入。"""
+    import os
+    import tempfile
+    from fha_core_logic import import_excel_into_model
+    print(f"{'行数':>8} {'read_excel(s)':>14} {'峰值(MB)':>10} {'流式(s)':>10} {'峰值(MB)':>10}")
+    for size in [5000, 20000]:
+        path = os.path.join(tempfile.gettempdir(), f"fha_bench_{size}.xlsx")
+        make_model(size).get_dataframe().to_excel(path, index=False)
+        legacy_s, legacy_mb = peak_memory(lambda: FHA_Model().load_dataframe(pd.read_excel(path).astype(str)))
+        stream_s, stream_mb = peak_memory(lambda: import_excel_into_model(FHA_Model(), path))
+        print(f"{size:>8} {legacy_s:>14.2f} {legacy_mb:>10.1f} {stream_s:>10.2f} {stream_mb:>10.1f}")
+        os.remove(path)
+
+
+def bench_export():
+    """Excel 导出：to_excel 写入 BytesIO vs iter_xlsx_bytes 流式编码（首字节延迟与峰值内存）。"""
+    import io
+    from fha_shared import iter_xlsx_bytes
+    print(f"{'行数':>8} {'BytesIO(s)':>11} {'峰值(MB)':>10} {'流式(s)':>9} {'首字节(ms)':>11} {'峰值(MB)':>10}")
+    for size in [5000, 20000, 100000]:
+        df = make_model(size).get_dataframe()
+        legacy_s, legacy_mb = peak_memory(lambda: df.to_excel(io.BytesIO(), index=False, engine='openpyxl')) \
+            if size <= LEGACY_MAX_ROWS else (float('nan'), float('nan'))
+        start = time.perf_counter()
+        blocks = iter_xlsx_bytes(df)
+        next(blocks)
+        first_ms = (time.perf_counter() - start) * 1000
+        stream_s, stream_mb = peak_memory(lambda: sum(len(block) for block in blocks))
+        stream_s += first_ms / 1000
+        print(f"{size:>8} {legacy_s:>11.2f} {legacy_mb:>10.1f} {stream_s:>9.2f} {first_ms:>11.1f} {stream_mb:>10.1f}")
+
+
+def bench_project():
+    """打开项目：Excel 流式导入 vs Arrow IPC 项目文件（内存映射）。"""
+    import os
+    import tempfile
+    from fha_core_logic import export_to_excel, import_excel_into_model, save_project, load_project
+    print(f"{'行数':>8} {'Excel打开(ms)':>14} {'项目保存(ms)':>14} {'项目打开(ms)':>14} {'文件(KB)':>10}")
+    for size in TABLE_SIZES:
+        model = make_model(size)
+        base = os.path.join(tempfile.gettempdir(), f"fha_bench_{size}")
+        legacy = '-'
+        if size <= LEGACY_MAX_ROWS:
+            export_to_excel(model.get_dataframe(), base + '.xlsx')
+            legacy = f"{timed(lambda: import_excel_into_model(FHA_Model(), base + '.xlsx'), repeat=1) * 1000:.0f}"
+            os.remove(base + '.xlsx')
+        save_ms = timed(lambda: save_project(model, base + '.fha')) * 1000
+        load_ms = timed(lambda: load_project(FHA_Model(), base + '.fha')) * 1000
+        file_kb = os.path.getsize(base + '.fha') / 1024
+        os.remove(base + '.fha')
+        print(f"{size:>8} {legacy:>14} {save_ms:>14.1f} {load_ms:>14.1f} {file_kb:>10.0f}")
+
+
+def _hammer(workers, requests_per_worker, action):
+    """workers 个线程各调用 action(worker, i) requests_per_worker 次，返回 (各次结果列表, 总耗时秒)。"""
+    from concurrent.futures import ThreadPoolExecutor
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        futures = [pool.submit(lambda w: [action(w, i) for i in range(requests_per_worker)], w)
+                   for w in range(workers)]
+        results = [result for future in futures for result in future.result()]
+    return results, time.perf_counter() - start
+
+
+def _check_table(rows, expected, label):
+    """校验并发修改后的表格：行数与成功的增删一致、编号连续、行键唯一。"""
+    ids = [row['编号'] for row in rows]
+    assert len(rows) == expected, f"{label}: 行数 {len(rows)} != 预期 {expected}"
+    assert ids == [f"FHA-{i:03d}" for i in range(1, len(rows) + 1)], f"{label}: 编号不连续"
+    keys = [row['row_id'] for row in rows if 'row_id' in row]
+    assert len(keys) == len(set(keys)), f"{label}: 行键重复"
+
+
+def bench_concurrency():
+    """并发负载：多线程混合读写两个 API，结束后校验行数、编号与行键的一致性。"""
+    import os
+    import random
+    import threading
+    os.environ.setdefault("FHA_PROJECT_DB", ":memory:")
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fha_api_new'))
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    import fha_api
+    import fha_api0
+
+    workers, per_worker, seed_rows = 16, 60, 200
+    print(f"{'接口':>10} {'请求数':>8} {'耗时(s)':>8} {'请求/秒':>8} {'最终行数':>8} {'一致':>6}")
+
+    # fha_api0：按行键增删改 + 向导替换，同时读取条目与仪表盘
+    with TestClient(fha_api0.app) as client:
+        pid = client.post('/projects', json={'name': 'load'}).json()['project_id']
+        client.post(f'/projects/{pid}/functional-architect', json={'skeleton': make_entries(seed_rows)})
+        delta, delta_lock = [0], threading.Lock()
+        wizard = [{'失效状态': s, '对于飞行器的影响': '', '对于地面/空域的影响': '', '对于地面控制组的影响': '',
+                   '危害性分类': '危险的 (Hazardous)', '理由/备注': ''} for s in ('A', 'B')]
+
+        def api0_action(worker, i):
+            rng = random.Random(worker * 1000 + i)
+            op = rng.random()
+            if op < 0.4:
+                path = rng.choice(['entries', 'dashboard/kpis', 'dashboard/cross-analysis'])
+                response = client.get(f'/projects/{pid}/{path}')
+                change = 0
+            else:
+                row_id = rng.randrange(0, seed_rows * 2)
+                if op < 0.55:
+                    response, change = client.post(f'/projects/{pid}/entries', json={'一级功能': f'W{worker}'}), 1
+                elif op < 0.7:
+                    response, change = client.delete(f'/projects/{pid}/rows/{row_id}'), -1
+                elif op < 0.85:
+                    response, change = client.put(f'/projects/{pid}/rows/{row_id}', json={'理由/备注': f'w{worker}'}), 0
+                else:
+                    response, change = client.post(f'/projects/{pid}/analysis-wizard',
+                                                   json={'source_row_id': row_id, 'results': wizard}), 1
+            assert response.status_code in (200, 404), response.text
+            if response.status_code == 200 and change:
+                with delta_lock:
+                    delta[0] += change
+            return response.status_code
+
+        _, elapsed = _hammer(workers, per_worker, api0_action)
+        rows = client.get(f'/projects/{pid}/entries').json()
+        _check_table(rows, seed_rows + delta[0], 'fha_api0')
+        fha_api0.app.state.projects.flush()
+        stored = fha_api0.app.state.projects.store.get_info(pid)['entry_count']
+        assert stored == len(rows), f"fha_api0: 写回的条目数 {stored} != {len(rows)}"
+        total = workers * per_worker
+        print(f"{'fha_api0':>10} {total:>8} {elapsed:>8.2f} {total / elapsed:>8.0f} {len(rows):>8} {'是':>6}")
+
+    # fha_api：按位置修改、删除与向导替换（位置取表头附近，保证在并发删除后仍然有效）
+    app = FastAPI()
+    app.include_router(fha_api.router)
+    with TestClient(app) as client:
+        client.post('/fha/project/new', json=make_entries(seed_rows))
+        delta = [0]
+        wizard_api = {'results': [dict(w) for w in wizard]}
+
+        def api_action(worker, i):
+            rng = random.Random(worker * 1000 + i)
+            op = rng.random()
+            position = rng.randrange(0, seed_rows // 4)
+            change = 0
+            if op < 0.4:
+                response = client.get(rng.choice(['/fha/data', '/fha/dashboard']))
+            elif op < 0.6:
+                response = client.patch('/fha/cell/update', json={'row_index': position, 'column_name': '理由/备注',
+                                                                   'new_value': f'w{worker}'})
+            elif op < 0.8:
+                response, change = client.delete('/fha/rows/delete', params={'indices': [position]}), -1
+            else:
+                response, change = client.post('/fha/wizard/analyze', json=dict(wizard_api, source_index=position)), 1
+            assert response.status_code in (200, 404), response.text
+            if response.status_code == 200 and change:
+                with delta_lock:
+                    delta[0] += change
+            return response.status_code
+
+        _, elapsed = _hammer(workers, per_worker, api_action)
+        rows = client.get('/fha/data').json()
+        _check_table(rows, seed_rows + delta[0], 'fha_api')
+        print(f"{'fha_api':>10} {total:>8} {elapsed:>8.2f} {total / elapsed:>8.0f} {len(rows):>8} {'是':>6}")
+
+
+def bench_polling():
+    """前端轮询：数据未变化时，带 If-None-Match 的条件请求（304）与每次完整重算的耗时对比。"""
+    import os
+    os.environ.setdefault("FHA_PROJECT_DB", ":memory:")
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fha_api_new'))
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    import fha_api
+    import fha_api0
+
+    polls = 5
+    app = FastAPI()
+    app.include_router(fha_api.router)
+    print(f"{'行数':>8} {'接口':>40} {'完整(ms)':>10} {'304(ms)':>10}")
+    with TestClient(fha_api0.app) as client0, TestClient(app) as client:
+        for count in (5000, 20000):
+            pid = client0.post('/projects', json={'name': 'poll'}).json()['project_id']
+            client0.post(f'/projects/{pid}/functional-architect', json={'skeleton': make_entries(count)})
+            client.post('/fha/project/new', json=make_entries(count))
+            paths = [(client0, f'/projects/{pid}/entries'), (client0, f'/projects/{pid}/dashboard/cross-analysis'),
+                     (client, '/fha/data'), (client, '/fha/dashboard')]
+            for target, path in paths:
+                etag = target.get(path).headers['ETag']
+
+                def poll(headers):
+                    for _ in range(polls):
+                        response = target.get(path, headers=headers)
+                    return response.status_code
+
+                assert poll({'If-None-Match': etag}) == 304
+                full = timed(lambda: poll({})) / polls
+                cached = timed(lambda: poll({'If-None-Match': etag})) / polls
+                label = path.replace(pid, '{id}')
+                print(f"{count:>8} {label:>40} {full * 1000:>10.2f} {cached * 1000:>10.2f}")
+
+
+def _legacy_entries_json(model, entry_type):
+    """旧的 get_entries：iterrows 逐行转 dict、FHAEntry.parse_obj 校验，再由 FastAPI 按 response_model 编码。"""
+    from typing import List
+    from pydantic import TypeAdapter
+    df = model.get_dataframe()
+    df = df.assign(row_version=[model.row_version(k) for k in df.index]).reset_index()
+    entries = [entry_type.parse_obj(row.to_dict()) for _, row in df.iterrows()]
+    return TypeAdapter(List[entry_type]).dump_json(entries, by_alias=True)
+
+
+def bench_serialize():
+    """条目列表序列化：逐行 Pydantic 与按列批量 + FastJSONResponse（orjson，未安装时为标准库 json）的吞吐对比（行/秒）。"""
+    import os
+    import json
+    os.environ.setdefault("FHA_PROJECT_DB", ":memory:")
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fha_api_new'))
+    import fha_api0
+
+    # 与接口一致：orjson 为可选依赖，未安装时测量 FastJSONResponse 退回的标准库编码
+    fast = f"按列批量+{'orjson' if fha_api0.orjson is not None else 'json紧凑'}"
+    paths = {
+        '旧: iterrows+parse_obj': lambda m, order, cols: _legacy_entries_json(m, fha_api0.FHAEntry),
+        'to_dict+json': lambda m, order, cols: json.dumps(
+            m.get_dataframe().reset_index().assign(row_version=0)[cols].to_dict(orient='records'),
+            ensure_ascii=False).encode('utf-8'),
+        '按列批量+json': lambda m, order, cols: json.dumps(
+            fha_api0.entry_records(m, order, cols), ensure_ascii=False).encode('utf-8'),
+        fast: lambda m, order, cols: fha_api0.FastJSONResponse(fha_api0.entry_records(m, order, cols)).body,
+    }
+    print(f"{'行数':>8} {'路径':>22} {'耗时(s)':>10} {'行/秒':>12}")
+    for count in (5000, 20000):
+        model = make_model(count)
+        order = model.sorted_positions()
+        columns = fha_api0.ENTRY_FIELDS
+        expected = json.loads(paths[fast](model, order, columns))
+        assert json.loads(_legacy_entries_json(model, fha_api0.FHAEntry)) == expected
+        for label, path in paths.items():
+            elapsed = timed(lambda: path(model, order, columns), repeat=1 if label.startswith('旧') else 3)
+            print(f"{count:>8} {label:>22} {elapsed:>10.3f} {count / elapsed:>12,.0f}")
+
+
+def bench_stream():
+    """/fha/data 全表读取：一次性 JSON 列表 vs NDJSON / Arrow 流式输出（首块延迟与峰值内存）。"""
+    import fha_api
+    print(f"{'行数':>8} {'格式':>8} {'耗时(s)':>9} {'首块(ms)':>10} {'峰值(MB)':>10}")
+    for size in [20000, 100000]:
+        model = fha_api.FHA_Model()
+        model.add_fha_entries(make_entries(size))
+        df, versions, columns = model.dataframe, model.row_versions, fha_api.DATA_FIELDS
+        order = model.sorted_positions()
+        elapsed, peak = peak_memory(lambda: fha_api.dump_json(fha_api.data_records(df, versions, order, columns)))
+        print(f"{size:>8} {'JSON':>8} {elapsed:>9.2f} {elapsed * 1000:>10.1f} {peak:>10.1f}")
+        for label, writer in (('NDJSON', fha_api.iter_ndjson), ('Arrow', fha_api.iter_arrow_stream)):
+            start = time.perf_counter()
+            chunks = writer(df, versions, order, columns)
+            first = len(next(chunks))
+            first_ms = (time.perf_counter() - start) * 1000
+            elapsed, peak = peak_memory(lambda: first + sum(len(chunk) for chunk in chunks))
+            print(f"{size:>8} {label:>8} {elapsed + first_ms / 1000:>9.2f} {first_ms:>10.1f} {peak:>10.1f}")
+
+
+def _legacy_dashboard(df):
+    """旧的仪表盘计算：每次读取都对整表做过滤、value_counts、crosstab 与 groupby。"""
+    kpis = (len(df[df['失效状态'] != '']), df['危害性分类'].value_counts())
+    analyzed = df[(df['一级功能'] != '') & (df['危害性分类'] != '')]
+    cross_tab = pd.crosstab(analyzed['一级功能'], analyzed['危害性分类'])
+    filtered = df[(df['一级功能'] != '') & (df['危害性分类'] != '') & (df['危害性分类'] != '无安全影响 (No Safety Effect)')]
+    sunburst = filtered.groupby(['一级功能', '危害性分类'], observed=True).size()
+    return kpis, cross_tab, sunburst
+
+
+def bench_aggregates():
+    """仪表盘聚合：每次整表扫描 vs 模型增量维护的计数（读取耗时与每次编辑的维护开销）。"""
+    from fha_shared import NO_SAFETY_EFFECT
+    print(f"{'行数':>8} {'整表扫描(ms)':>13} {'增量读取(ms)':>13} {'编辑(ms/次)':>12}")
+    for size in [20000, 100000]:
+        model = make_model(size)
+        stats = model.dashboard
+        legacy = timed(lambda: _legacy_dashboard(model.get_dataframe()))
+        incremental = timed(lambda: (stats.kpis(), stats.cross_tab(), stats.risk_summary(),
+                                     stats.matrix(exclude=("", NO_SAFETY_EFFECT))))
+        keys = model.get_dataframe().index[:200].tolist()
+        start = time.perf_counter()
+        for i, key in enumerate(keys):
+            model.update_row(key, {'危害性分类': FHA_Model.ARP4761_CATEGORIES[i % 6]})
+        edit = (time.perf_counter() - start) / len(keys)
+        print(f"{size:>8} {legacy * 1000:>13.2f} {incremental * 1000:>13.3f} {edit * 1000:>12.3f}")
+
+
+def bench_dashboard_gui():
+    """风险摘要页刷新：同步计算并绘图 vs 后台刷新（GUI 线程占用、总延迟、旭日图指纹命中、无变化时的切换、连续编辑的合并）。"""
+    import os
+    import warnings
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PySide6.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication([])
+    from fha_shared import NO_SAFETY_EFFECT
+    import fha_main_window
+    warnings.filterwarnings('ignore', message='Glyph')  # 缺少中文字体时 matplotlib 的逐字告警
+    renders = []
+    render_sunburst = fha_main_window.render_sunburst
+    fha_main_window.render_sunburst = lambda *args: renders.append(1) or render_sunburst(*args)
+    print(f"{'行数':>8} {'同步刷新(ms)':>13} {'后台-GUI占用(ms)':>17} {'后台-总延迟(ms)':>16} "
+          f"{'指纹命中(ms)':>13} {'无变化切换(ms)':>15} {'50次编辑/重绘次数':>18}")
+    for size in [20000, 100000]:
+        model = make_model(size)
+        widget = fha_main_window.SummaryDashboardWidget()
+        widget.resize(1200, 800)
+        widget.set_model(model)
+        widget.show()
+        widget.wait_for_refresh()
+        edited_key = model.get_dataframe().index[1]  # 该行为灾难级，改动其一级功能会影响旭日图
+
+        def synchronous():
+            stats = model.dashboard
+            stats.kpis(), stats.cross_tab(), stats.risk_summary()
+            render_sunburst(stats.matrix(exclude=("", NO_SAFETY_EFFECT)), 700, 700)
+
+        def refresh(values):
+            """一次编辑后立即刷新，返回 (GUI 线程占用, 总延迟)。"""
+            model.update_row(edited_key, values)
+            start = time.perf_counter()
+            widget.refresh_dashboard()
+            call = time.perf_counter() - start
+            widget.thread_pool.waitForDone()
+            ready = time.perf_counter()
+            app.processEvents()  # 在 GUI 线程上应用结果
+            done = time.perf_counter()
+            return call + done - ready, done - start
+
+        sync = timed(synchronous)
+        # 改一级功能会改变旭日图输入，必须重绘；只改失效状态时指纹不变，沿用缓存图像
+        blocked, latency = map(min, zip(*(refresh({'一级功能': f"基准功能{i}"}) for i in range(3))))
+        cached = min(refresh({'失效状态': f"基准失效{i}"})[1] for i in range(3))
+        switch = timed(widget.refresh_dashboard)
+        renders.clear()
+        for i in range(50):
+            model.update_row(edited_key, {'一级功能': f"连续编辑{i}"})
+            app.processEvents()
+        widget.wait_for_refresh()
+        print(f"{size:>8} {sync * 1000:>13.1f} {blocked * 1000:>17.1f} {latency * 1000:>16.1f} "
+              f"{cached * 1000:>13.1f} {switch * 1000:>15.3f} {len(renders):>18}")
+        widget.close()
+    fha_main_window.render_sunburst = render_sunburst
+
+class _CallCounter:
+    """在 with 块内给 owner 的若干方法计数（例如 pd.Series 的比较运算即一次整列扫描）。"""
+
+    def __init__(self, owner, *names):
+        self.owner, self.names, self.calls = owner, names, 0
+
+    def __enter__(self):
+        self.originals = {name: getattr(self.owner, name) for name in self.names}
+        for name, func in self.originals.items():
+            setattr(self.owner, name, self._wrap(func))
+        return self
+
+    def _wrap(self, func):
+        def counted(*args, **kwargs):
+            self.calls += 1
+            return func(*args, **kwargs)
+        return counted
+
+    def __exit__(self, *exc):
+        for name, func in self.originals.items():
+            setattr(self.owner, name, func)
+
+
+def bench_dashboard_api():
+    """仪表盘刷新一次的代价：旧实现三个接口各自过滤整表 vs 三个接口读聚合 vs 合并接口 /projects/{id}/dashboard。"""
+    import os
+    os.environ.setdefault("FHA_PROJECT_DB", ":memory:")
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fha_api_new'))
+    from fastapi.testclient import TestClient
+    from fha_shared import FHA_DashboardStats
+    import fha_api0
+
+    print(f"{'行数':>8} {'方式':>14} {'请求数':>6} {'整列比较':>8} {'聚合遍历':>8} {'耗时(ms)':>10}")
+    with TestClient(fha_api0.app) as client:
+        for count in (20000, 100000):
+            pid = client.post('/projects', json={'name': 'dashboard'}).json()['project_id']
+            client.post(f'/projects/{pid}/functional-architect', json={'skeleton': make_entries(count)})
+            df = make_model(count).get_dataframe()
+            paths = [f'/projects/{pid}/dashboard/kpis', f'/projects/{pid}/dashboard/sunburst-data',
+                     f'/projects/{pid}/dashboard/cross-analysis']
+            cases = [('旧实现(三接口)', 3, lambda: _legacy_dashboard(df)),
+                     ('三个接口', 3, lambda: [client.get(path).json() for path in paths]),
+                     ('合并接口', 1, lambda: client.get(f'/projects/{pid}/dashboard').json())]
+            for label, requests, refresh in cases:
+                with _CallCounter(pd.Series, '__eq__', '__ne__') as scans, \
+                        _CallCounter(FHA_DashboardStats, 'matrix', 'hazard_counts') as passes:
+                    refresh()
+                elapsed = timed(refresh)
+                print(f"{count:>8} {label:>14} {requests:>6} {scans.calls:>8} {passes.calls:>8} {elapsed * 1000:>10.2f}")
+
+
+def _legacy_function_search(df, text):
+    """旧的 function_name 筛选：对三个功能列各做一次不区分大小写的 str.contains 整列扫描。"""
+    return (df['一级功能'].str.contains(text, case=False, na=False, regex=False) |
+            df['二级功能'].str.contains(text, case=False, na=False, regex=False) |
+            df['三级功能'].str.contains(text, case=False, na=False, regex=False)).to_numpy()
+
+
+def bench_search():
+    """/fha/data 的功能名称搜索：三列 str.contains 整列扫描 vs n-gram 倒排索引（含建索引与单元格编辑的维护开销）。"""
+    import warnings
+    warnings.filterwarnings('ignore')
+    import fha_api
+    print(f"{'行数':>8} {'查询':>8} {'命中行数':>8} {'整列扫描(ms)':>13} {'倒排索引(ms)':>13} {'建索引(ms)':>11} {'编辑(ms/次)':>12}")
+    for size in [20000, 100000]:
+        model = fha_api.FHA_Model()
+        model.add_fha_entries(make_entries(size))
+        df = model.dataframe
+        build = timed(model.search_index.rebuild)
+        start = time.perf_counter()
+        for i in range(200):
+            model.update_cell(i, '二级功能', f"改名子系统{i % 7}")
+        edit = (time.perf_counter() - start) / 200
+        for text in ('系统1', '子系统3', '改名', '不存在'):
+            assert (model.search_index.search(text) == _legacy_function_search(df, text)).all()
+            legacy = timed(lambda: _legacy_function_search(df, text))
+            indexed = timed(lambda: model.search_index.search(text))
+            hits = int(model.search_index.search(text).sum())
+            print(f"{size:>8} {text:>8} {hits:>8} {legacy * 1000:>13.2f} {indexed * 1000:>13.3f} "
+                  f"{build * 1000:>11.1f} {edit * 1000:>12.3f}")
+
+
+def _legacy_full_text(df, query):
+    """客户端做法：导出整表后对影响与理由三列逐列 str.contains，所有检索词都要出现。"""
+    from fha_core_logic import FULL_TEXT_COLUMNS
+    mask = pd.Series(True, index=df.index)
+    for term in query.split():
+        hit = pd.Series(False, index=df.index)
+        for column in FULL_TEXT_COLUMNS:
+            hit |= df[column].str.contains(term, case=False, na=False, regex=False)
+        mask &= hit
+    return df.index[mask]
+
+
+def bench_fulltext():
+    """影响与理由列全文检索：整列 str.contains vs FTS5 二元组索引（第一页 20 条，含总数、排序与高亮片段）。"""
+    print(f"{'行数':>8} {'检索词':>12} {'命中数':>8} {'整列扫描(ms)':>13} {'全文索引(ms)':>13}")
+    for size in [20000, 100000]:
+        model = make_model(size)
+        df = model.get_dataframe()
+        start = time.perf_counter()
+        index = model.full_text_index()
+        index.sync()
+        build = time.perf_counter() - start
+        keys = df.index[:200].tolist()
+        start = time.perf_counter()
+        for i, key in enumerate(keys):
+            model.update_row(key, {'理由/备注': f"惯导漂移，复核第{i}次"})
+            index.sync()
+        edit = (time.perf_counter() - start) / len(keys)
+        for query in (f"第{size - 7}项", '惯导漂移', 'GPS 信号丢失', '失去定位', '定位 复核', '定位', 'GPS 定位', '位', '不存在的描述'):
+            total, hits = index.search(query)
+            assert total == len(_legacy_full_text(df, query))
+            assert all(score is not None for _, score, _ in hits)
+            legacy = timed(lambda: _legacy_full_text(df, query), repeat=1)
+            indexed = timed(lambda: index.search(query))
+            print(f"{size:>8} {query:>12} {total:>8} {legacy * 1000:>13.1f} {indexed * 1000:>13.2f}")
+        print(f"{size:>8} 建索引 {build:.2f} s，编辑维护 {edit * 1000:.3f} ms/次")
+
+
+BENCHMARKS = {
+    'renumber': bench_renumber,
+    'batch': bench_batch,
+    'delete': bench_delete,
+    'paint': bench_paint,
+    'import': bench_import,
+    'export': bench_export,
+    'project': bench_project,
+    'concurrency': bench_concurrency,
+    'polling': bench_polling,
+    'serialize': bench_serialize,
+    'stream': bench_stream,
+    'aggregates': bench_aggregates,
+    'dashboard_gui': bench_dashboard_gui,
+    'dashboard_api': bench_dashboard_api,
+    'search': bench_search,
+    'fulltext': bench_fulltext,
+}
+
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or BENCHMARKS:
+        print(f"== {name}: {BENCHMARKS[name].__doc__}")
+        BENCHMARKS[name]()
@@ -3,6 +3,9 @@
 # 职责：应用主入口和所有UI组件的集合，是提供给外部集成的核心。
 
 import sys
+import hashlib
+import logging
+from collections import OrderedDict
 import pandas as pd
 import numpy as np  # 导入 numpy 用于旭日图计算
 from PySide6.QtWidgets import (
@@ -11,23 +14,29 @@ from PySide6.QtWidgets import (
     QTreeWidget, QTreeWidgetItem, QTableWidget, QTableWidgetItem, QCheckBox,
     QAbstractItemView, QPushButton, QDialogButtonBox, QLabel, QHeaderView,
     QLineEdit, QComboBox, QWizard, QWizardPage, QListWidget, QTextEdit,
-    QFormLayout, QSplitter, QStyledItemDelegate, QFrame
+    QFormLayout, QSplitter, QStyledItemDelegate, QFrame, QProgressDialog, QProgressBar, QSizePolicy
 )
-from PySide6.QtGui import QAction, QIcon, QColor, QBrush, QFont
-from PySide6.QtCore import Qt
+from PySide6.QtGui import QAction, QIcon, QColor, QBrush, QFont, QImage, QPixmap
+from PySide6.QtCore import Qt, QSettings, QObject, QRunnable, QThreadPool, QTimer, QEvent, Signal, Slot
 
 # 从后端核心逻辑模块导入所需类和函数
-from fha_core_logic import FHA_Model, PandasModel, import_from_excel, export_to_excel, FAILURE_MODE_LIBRARY
+from fha_core_logic import (
+    FHA_Model, FHA_TableModel, import_excel_into_model, export_to_excel, load_project, save_project,
+    PROJECT_FILE_SUFFIX, FAILURE_MODE_LIBRARY, MISSION_PHASES, FUNCTION_TYPES
+)
+from fha_shared import NO_SAFETY_EFFECT
 
 # Matplotlib 用于仪表盘绘图
 from matplotlib.figure import Figure
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.backends.backend_agg import FigureCanvasAgg  # 仪表盘在后台线程中栅格化，不使用 Qt 画布
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches  # 导入用于创建图例
 
 plt.rcParams['font.sans-serif'] = ['SimHei']  # 指定默认字体为黑体
 plt.rcParams['axes.unicode_minus'] = False  # 解决保存图像是负号'-'显示为方块的问题
 
+logger = logging.getLogger(__name__)
+
 
 # ------------------- 表格内下拉框委托 -------------------
 class ComboBoxDelegate(QStyledItemDelegate):
@@ -51,10 +60,68 @@ class ComboBoxDelegate(QStyledItemDelegate):
         editor.setGeometry(option.rect)
 
 
+# ------------------- 表格列宽策略 -------------------
+class ColumnWidthPolicy:
+    """按抽样文本计算列宽并按项目持久化。
+
+    每列最多抽取 SAMPLE_ROWS 行（去重后）测量文本宽度，只在加载项目时计算一次；
+    已保存过列宽的项目直接复用保存值，打开大表格时不再逐格测量全部内容。
+    """
+    SAMPLE_ROWS = 200
+    MIN_WIDTH = 60
+    MAX_WIDTH = 320
+    PADDING = 24
+
+    def __init__(self, settings=None):
+        self.settings = settings or QSettings("FHA", "FHA结构化分析系统")
+
+    @staticmethod
+    def _key(project_key):
+        return "column_widths/" + hashlib.md5(project_key.encode('utf-8')).hexdigest()
+
+    def compute(self, model, font_metrics):
+        rows = model.rowCount()
+        step = max(1, rows // self.SAMPLE_ROWS)
+        widths = []
+        for column in range(model.columnCount()):
+            width = font_metrics.horizontalAdvance(str(model.headerData(column, Qt.Orientation.Horizontal)))
+            measured = set()
+            for row in range(0, rows, step):
+                text = model.data(model.index(row, column))
+                if text not in measured:
+                    measured.add(text)
+                    width = max(width, font_metrics.horizontalAdvance(text))
+            widths.append(min(self.MAX_WIDTH, max(self.MIN_WIDTH, width + self.PADDING)))
+        return widths
+
+    def load(self, project_key, column_count):
+        if not project_key:
+            return None
+        value = self.settings.value(self._key(project_key))
+        if not value:
+            return None
+        widths = [int(width) for width in str(value).split(',')]
+        return widths if len(widths) == column_count else None
+
+    def save(self, project_key, widths):
+        if project_key:
+            self.settings.setValue(self._key(project_key), ','.join(str(width) for width in widths))
+
+    def apply(self, view, project_key):
+        """为 view 设置列宽：优先使用该项目保存的列宽，否则按抽样计算。"""
+        model = view.model()
+        widths = self.load(project_key, model.columnCount()) or self.compute(model, view.fontMetrics())
+        header = view.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
+        for column, width in enumerate(widths):
+            header.resizeSection(column, width)
+        return widths
+
+
 # ------------------- 功能架构与任务剖析模块 -------------------
 class FunctionalArchitectDialog(QDialog):
-    MISSION_PHASES = ["地面检查", "启动", "垂直起飞", "过渡飞行", "巡航", "悬停作业", "返航", "垂直降落", "关机"]
-    FUNCTION_TYPES = ["电源", "传感器", "执行机构", "数据传输", "飞控算法", "导航", "通信", "其他"]
+    MISSION_PHASES = MISSION_PHASES
+    FUNCTION_TYPES = FUNCTION_TYPES
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -311,10 +378,145 @@ class AssessHazardPage(BaseAnalysisPage):
 
 
 # ------------------- 风险摘要仪表盘模块 (已重构) -------------------
+SUNBURST_COLORS = {
+    "灾难的 (Catastrophic)": "#D32F2F",
+    "危险的 (Hazardous)": "#FFA000",
+    "严重的 (Major)": "#388E3C",
+    "轻微的 (Minor)": "#1976D2",
+}
+
+
+def draw_sunburst(fig, matrix):
+    """在 fig 上绘制旭日图：内圈为一级功能，外圈为各功能下的危害性分类；matrix 取自 FHA_DashboardStats.matrix()。"""
+    ax = fig.add_subplot(111)
+    if not matrix:
+        ax.text(0.5, 0.5, '无可用数据', ha='center', va='center', transform=ax.transAxes)
+        ax.set_axis_off()
+        return
+
+    # --- 数据准备 ---
+    func_sizes = pd.Series({func: sum(counts.values()) for func, counts in matrix.items()})
+    hazard_counts = {}
+    for counts in matrix.values():
+        for cat, count in counts.items():
+            hazard_counts[cat] = hazard_counts.get(cat, 0) + count
+
+    # --- 颜色优化：使用高对比度的颜色集tab20 ---
+    func_colors = plt.cm.tab20(np.linspace(0, 1, len(func_sizes.index)))
+    func_color_map = {func: color for func, color in zip(func_sizes.index, func_colors)}
+
+    # --- 绘制旭日图 ---
+    ax.set_aspect('equal')
+    ax.set_axis_off()
+
+    ax.pie(func_sizes, radius=0.6, colors=[func_color_map[f] for f in func_sizes.index],
+           wedgeprops=dict(width=0.3, edgecolor='w'))
+
+    all_hazard_sizes = []
+    all_hazard_colors = []
+    for counts in matrix.values():
+        for cat in SUNBURST_COLORS:
+            if cat in counts:
+                all_hazard_sizes.append(counts[cat])
+                all_hazard_colors.append(SUNBURST_COLORS[cat])
+
+    ax.pie(all_hazard_sizes, radius=0.9, colors=all_hazard_colors,
+           wedgeprops=dict(width=0.3, edgecolor='w'))
+
+    # --- 将所有图例合并到右侧 ---
+    all_patches = []
+    func_patches = [mpatches.Patch(color=func_color_map[name], label=f"{name}: {size}")
+                    for name, size in func_sizes.items()]
+    all_patches.extend(func_patches)
+    all_patches.append(mpatches.Patch(color='white', label=""))
+    hazard_patches = [mpatches.Patch(color=color, label=f"{label.split(' ')[0]}: {hazard_counts.get(label, 0)}")
+                      for label, color in SUNBURST_COLORS.items() if label in hazard_counts]
+    all_patches.extend(hazard_patches)
+
+    fig.legend(handles=all_patches, title="图例", loc='center right', bbox_to_anchor=(1.0, 0.5))
+
+    ax.set_title("FHA 风险分布旭日图", pad=20)
+    fig.tight_layout(rect=[0, 0, 0.8, 1])
+
+
+def sunburst_fingerprint(matrix, size):
+    """旭日图输入的指纹：渲染尺寸与各功能下各分类的计数（均按显示顺序）；指纹相同则图像相同。"""
+    return size, tuple((function, tuple(counts.items())) for function, counts in matrix.items())
+
+
+def render_sunburst(matrix, width, height, dpi=100):
+    """用 Agg 后端把旭日图栅格化为 QImage。不创建任何窗口对象，可以在工作线程中调用。"""
+    fig = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+    canvas = FigureCanvasAgg(fig)
+    draw_sunburst(fig, matrix)
+    canvas.draw()
+    buffer = canvas.buffer_rgba()
+    return QImage(buffer, buffer.shape[1], buffer.shape[0], QImage.Format.Format_RGBA8888).copy()
+
+
+class DashboardRefreshSignals(QObject):
+    finished = Signal(int, object)  # (刷新代号, 结果字典；被取消时为 None)
+
+
+class DashboardRefreshTask(QRunnable):
+    """后台刷新任务：由聚合快照导出各面板数据并栅格化旭日图。
+
+    只读取 FHA_DashboardStats.snapshot() 的副本，不接触模型与任何控件；
+    结果经 signals.finished 排队送回 GUI 线程。被新的刷新取代（cancel）后在下一步之前退出。
+    chart_cache 是已渲染图像的副本（指纹 -> QImage），指纹命中时直接沿用，不再重绘。
+    """
+
+    def __init__(self, generation, stats, size, chart_cache=None):
+        super().__init__()
+        self.generation = generation
+        self.stats = stats
+        self.size = size
+        self.chart_cache = chart_cache or {}
+        self.cancelled = False
+        self.signals = DashboardRefreshSignals()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        result = None
+        try:
+            if not self.cancelled:
+                result = {'kpis': self.stats.kpis(), 'cross_tab': self.stats.cross_tab(),
+                          'risk_summary': self.stats.risk_summary()}
+            if not self.cancelled:
+                matrix = self.stats.matrix(exclude=("", NO_SAFETY_EFFECT))
+                result['chart_key'] = key = sunburst_fingerprint(matrix, self.size)
+                result['chart'] = self.chart_cache.get(key) or render_sunburst(matrix, *self.size)
+        except Exception:
+            logger.exception("仪表盘后台刷新失败")
+            result = None  # 只回报完整的结果，出错时与取消一样回报 None
+        finally:
+            # 无论成功、取消还是出错都要回报，GUI 线程据此释放任务并收起等待指示
+            self.signals.finished.emit(self.generation, None if self.cancelled else result)
+
+
 class SummaryDashboardWidget(QWidget):
+    MIN_CHART_SIZE = 400  # 控件尚未布局（尺寸过小）时旭日图的最小渲染边长
+    REFRESH_DELAY_MS = 200  # 连续编辑或缩放时的合并窗口：停顿这么久之后才刷新一次
+    CHART_CACHE_SIZE = 4  # 保留最近渲染过的旭日图数量（撤销/来回修改时可直接复用）
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.fha_model = None
+        self._generation = 0  # 每次请求刷新加一，只采用最新一次刷新的结果
+        self._tasks = {}  # 刷新代号 -> 尚未回报的后台任务
+        self._requested_state = None  # 最近一次刷新对应的 (模型修订号, 图表尺寸)
+        self._chart_key = None  # 当前显示的旭日图指纹
+        self._chart_cache = OrderedDict()  # 旭日图指纹 -> QImage，按最近使用排序
+        # 单线程的专用线程池：渲染串行执行，被取代的排队任务开始后立即退出
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(1)
+        # 编辑与缩放触发的刷新先经过该定时器合并；切换到本页则立即刷新
+        self._refresh_timer = QTimer(self)
+        self._refresh_timer.setSingleShot(True)
+        self._refresh_timer.setInterval(self.REFRESH_DELAY_MS)
+        self._refresh_timer.timeout.connect(self.refresh_dashboard)
         self.init_ui()
 
     def init_ui(self):
@@ -334,20 +536,29 @@ class SummaryDashboardWidget(QWidget):
         self.haz_label = QLabel("危险级: 0");
         self.haz_label.setFont(font);
         self.haz_label.setStyleSheet("color: #FFA000;")
+        # 后台刷新期间显示的忙碌指示（不定进度条）
+        self.busy_indicator = QProgressBar();
+        self.busy_indicator.setRange(0, 0);
+        self.busy_indicator.setMaximumWidth(120)
+        self.busy_indicator.setToolTip("正在刷新仪表盘...")
+        self.busy_indicator.hide()
 
         kpi_layout.addWidget(self.total_label);
         kpi_layout.addStretch()
         kpi_layout.addWidget(self.cat_label);
         kpi_layout.addStretch()
         kpi_layout.addWidget(self.haz_label)
+        kpi_layout.addStretch()
+        kpi_layout.addWidget(self.busy_indicator)
 
         # 2. 中部，左右分割
         splitter = QSplitter(Qt.Orientation.Horizontal)
 
-        # 2.1 左侧图表
-        self.fig = Figure(figsize=(8, 8), dpi=100)
-        self.canvas = FigureCanvas(self.fig)
-        self.ax = self.fig.add_subplot(111)
+        # 2.1 左侧图表：显示后台线程栅格化好的旭日图
+        self.chart_label = QLabel()
+        self.chart_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.chart_label.setSizePolicy(QSizePolicy.Policy.Ignored, QSizePolicy.Policy.Ignored)
+        self.chart_label.installEventFilter(self)
 
         # 2.2 右侧智能摘要与交叉矩阵
         right_panel = QWidget()
@@ -361,7 +572,7 @@ class SummaryDashboardWidget(QWidget):
         right_layout.addWidget(QLabel("<b>风险/功能 交叉分析矩阵</b>"))
         right_layout.addWidget(self.cross_analysis_table)
 
-        splitter.addWidget(self.canvas)
+        splitter.addWidget(self.chart_label)
         splitter.addWidget(right_panel)
         splitter.setSizes([700, 450])
 
@@ -369,128 +580,119 @@ class SummaryDashboardWidget(QWidget):
         main_layout.addWidget(splitter)
 
     def set_model(self, model):
+        if model is self.fha_model:
+            return
+        if self.fha_model is not None:
+            self.fha_model.remove_listener(self._on_model_changed)
         self.fha_model = model
+        model.add_listener(self._on_model_changed)
+
+    def _on_model_changed(self, event):
+        # 仪表盘可见时随编辑刷新（经定时器合并），不可见时等切换到本页再刷新
+        if self.isVisible():
+            self._refresh_timer.start()
+
+    def eventFilter(self, watched, event):
+        if watched is self.chart_label and event.type() == QEvent.Type.Resize and self.isVisible():
+            self._refresh_timer.start()  # 图表区域尺寸变化后按新尺寸重绘
+        return super().eventFilter(watched, event)
+
+    def _chart_size(self):
+        size = self.chart_label.size()
+        return max(size.width(), self.MIN_CHART_SIZE), max(size.height(), self.MIN_CHART_SIZE)
 
     def refresh_dashboard(self):
+        """在后台线程中重新计算并绘制仪表盘，GUI 线程只负责取快照和填充控件。
+
+        模型修订号与图表尺寸都与上一次刷新相同时直接返回（已显示或正在计算），切换页面无需等待。
+        """
+        self._refresh_timer.stop()
         if self.fha_model is None or self.fha_model.get_dataframe().empty:
+            self._cancel_refreshes()
+            self.busy_indicator.hide()
             self._clear_dashboard();
             return
-
-        df = self.fha_model.get_dataframe()
-        self._update_kpis(df)
-        self._update_sunburst_chart(df)
-        self._update_cross_analysis(df)
+        state = (self.fha_model.revision, self._chart_size())
+        if state == self._requested_state:
+            return
+        self._cancel_refreshes()
+        self._requested_state = state
+
+        # 各部分都由模型增量维护的聚合（FHA_Model.dashboard）导出；取快照后与模型后续的修改互不影响
+        task = DashboardRefreshTask(self._generation, self.fha_model.dashboard.snapshot(), state[1],
+                                    dict(self._chart_cache))
+        task.signals.finished.connect(self._apply_refresh)
+        self._tasks[self._generation] = task
+        self.busy_indicator.show()
+        self.thread_pool.start(task)
+
+    def _cancel_refreshes(self):
+        for task in self._tasks.values():
+            task.cancel()
+        self._generation += 1
+        self._requested_state = None
+
+    @Slot(int, object)
+    def _apply_refresh(self, generation, result):
+        self._tasks.pop(generation, None)
+        if generation != self._generation:
+            return  # 已被更新的刷新取代
+        self.busy_indicator.hide()
+        if result is None:
+            self._requested_state = None  # 刷新失败，下次请求时重试
+            return
+        self._update_kpis(result['kpis'])
+        self._update_chart(result['chart_key'], result['chart'])
+        self._update_cross_analysis(*result['cross_tab'], result['risk_summary'])
+
+    def _update_chart(self, key, image):
+        self._chart_cache[key] = image
+        self._chart_cache.move_to_end(key)
+        while len(self._chart_cache) > self.CHART_CACHE_SIZE:
+            self._chart_cache.popitem(last=False)
+        if key != self._chart_key:  # 指纹未变时保留当前显示的图像
+            self.chart_label.setPixmap(QPixmap.fromImage(image))
+            self._chart_key = key
+
+    def wait_for_refresh(self, timeout_ms=-1):
+        """阻塞到后台刷新完成并把结果应用到控件上（供脚本与基准测试使用）。"""
+        if self._refresh_timer.isActive():
+            self.refresh_dashboard()
+        self.thread_pool.waitForDone(timeout_ms)
+        QApplication.processEvents()
 
     def _clear_dashboard(self):
         self.total_label.setText("总条目数: 0")
         self.cat_label.setText("灾难级: 0")
         self.haz_label.setText("危险级: 0")
-        self.ax.clear();
-        if self.fig.legends:
-            self.fig.legends.clear()
-        self.canvas.draw()
+        self.chart_label.clear()
+        self._chart_key = None
         self.summary_text.clear()
         self.cross_analysis_table.clear()
         self.cross_analysis_table.setRowCount(0)
         self.cross_analysis_table.setColumnCount(0)
 
-    def _update_kpis(self, df):
-        total_items = len(df[df['失效状态'] != ''])
-        hazard_counts = df['危害性分类'].value_counts()
-        cat_count = hazard_counts.get("灾难的 (Catastrophic)", 0)
-        haz_count = hazard_counts.get("危险的 (Hazardous)", 0)
-
-        self.total_label.setText(f"总条目数: {total_items}")
-        self.cat_label.setText(f"灾难级: {cat_count}")
-        self.haz_label.setText(f"危险级: {haz_count}")
-
-    def _update_sunburst_chart(self, df):
-        self.ax.clear()
-        if self.fig.legends:
-            self.fig.legends.clear()
-
-        df_filtered = df[
-            (df['一级功能'] != '') & (df['危害性分类'] != '') & (df['危害性分类'] != '无安全影响 (No Safety Effect)')]
-        if df_filtered.empty:
-            self.ax.text(0.5, 0.5, '无可用数据', ha='center', va='center', transform=self.ax.transAxes)
-            self.ax.set_axis_off()
-            self.canvas.draw()
-            return
+    def _update_kpis(self, kpis):
+        self.total_label.setText(f"总条目数: {kpis['total_items']}")
+        self.cat_label.setText(f"灾难级: {kpis['catastrophic_count']}")
+        self.haz_label.setText(f"危险级: {kpis['hazardous_count']}")
 
-        # --- 数据准备 ---
-        data = df_filtered.groupby(['一级功能', '危害性分类']).size().reset_index(name='size')
-        func_sizes = data.groupby('一级功能')['size'].sum()
-        hazard_counts = data.groupby('危害性分类')['size'].sum()
-
-        color_map = {
-            "灾难的 (Catastrophic)": "#D32F2F",
-            "危险的 (Hazardous)": "#FFA000",
-            "严重的 (Major)": "#388E3C",
-            "轻微的 (Minor)": "#1976D2",
-        }
-
-        # --- 颜色优化：使用高对比度的颜色集tab20 ---
-        func_colors = plt.cm.tab20(np.linspace(0, 1, len(func_sizes.index)))
-        func_color_map = {func: color for func, color in zip(func_sizes.index, func_colors)}
-
-        # --- 绘制旭日图 ---
-        self.ax.set_aspect('equal')
-        self.ax.set_axis_off()
-
-        self.ax.pie(func_sizes, radius=0.6, colors=[func_color_map[f] for f in func_sizes.index],
-                    wedgeprops=dict(width=0.3, edgecolor='w'))
-
-        all_hazard_sizes = []
-        all_hazard_colors = []
-        for func_name in func_sizes.index:
-            func_group = data[data['一级功能'] == func_name].set_index('危害性分类')
-            for cat in color_map:
-                if cat in func_group.index:
-                    all_hazard_sizes.append(func_group.loc[cat, 'size'])
-                    all_hazard_colors.append(color_map[cat])
-
-        self.ax.pie(all_hazard_sizes, radius=0.9, colors=all_hazard_colors,
-                    wedgeprops=dict(width=0.3, edgecolor='w'))
-
-        # --- 将所有图例合并到右侧 ---
-        all_patches = []
-        func_patches = [mpatches.Patch(color=func_color_map[name], label=f"{name}: {size}")
-                        for name, size in func_sizes.items()]
-        all_patches.extend(func_patches)
-        all_patches.append(mpatches.Patch(color='white', label=""))
-        hazard_patches = [mpatches.Patch(color=color, label=f"{label.split(' ')[0]}: {hazard_counts.get(label, 0)}")
-                          for label, color in color_map.items() if label in hazard_counts]
-        all_patches.extend(hazard_patches)
-
-        self.fig.legend(handles=all_patches, title="图例", loc='center right', bbox_to_anchor=(1.0, 0.5))
-
-        self.ax.set_title("FHA 风险分布旭日图", pad=20)
-        self.fig.tight_layout(rect=[0, 0, 0.8, 1])
-        self.canvas.draw()
-
-    def _update_cross_analysis(self, df):
-        df_analyzed = df[(df['一级功能'] != '') & (df['危害性分类'] != '')].copy()
-        if df_analyzed.empty:
+    def _update_cross_analysis(self, functions, columns, counts, risk_summary):
+        if not functions:
             self.summary_text.setText("暂无已完成分析的条目。")
             self.cross_analysis_table.clear()
             self.cross_analysis_table.setRowCount(0)
             self.cross_analysis_table.setColumnCount(0)
             return
 
-        # --- 生成交叉分析矩阵 ---
-        cross_tab = pd.crosstab(df_analyzed['一级功能'], df_analyzed['危害性分类'])
-        ordered_cols = [col for col in FHA_Model.ARP4761_CATEGORIES if col in cross_tab.columns and col != ""]
-        cross_tab = cross_tab.reindex(columns=ordered_cols)
-
         # --- 填充QTableWidget ---
-        self.cross_analysis_table.setRowCount(cross_tab.shape[0])
-        self.cross_analysis_table.setColumnCount(cross_tab.shape[1])
-        self.cross_analysis_table.setVerticalHeaderLabels(cross_tab.index)
-        self.cross_analysis_table.setHorizontalHeaderLabels([col.split(' ')[0] for col in cross_tab.columns])
-
-        for r, row_label in enumerate(cross_tab.index):
-            for c, col_label in enumerate(cross_tab.columns):
-                value = cross_tab.loc[row_label, col_label]
+        self.cross_analysis_table.setRowCount(len(functions))
+        self.cross_analysis_table.setColumnCount(len(columns))
+        self.cross_analysis_table.setVerticalHeaderLabels(functions)
+        self.cross_analysis_table.setHorizontalHeaderLabels([col.split(' ')[0] for col in columns])
+
+        for r, row in enumerate(counts):
+            for c, value in enumerate(row):
                 item = QTableWidgetItem(str(value))
                 item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
                 item.setFlags(item.flags() & ~Qt.ItemFlag.ItemIsEditable)
@@ -504,20 +706,11 @@ class SummaryDashboardWidget(QWidget):
 
         # --- 生成智能分析文本 ---
         text = ""
-        high_risk_items = df_analyzed[df_analyzed['危害性分类'].isin(["灾难的 (Catastrophic)", "危险的 (Hazardous)"])]
-        text += f"当前共识别出 {len(high_risk_items)} 项高风险条目（灾难级或危险级）。\n\n"
-
-        if not cross_tab.empty:
-            high_risk_cols = [col for col in ["灾难的 (Catastrophic)", "危险的 (Hazardous)"] if
-                              col in cross_tab.columns]
-            if high_risk_cols:
-                top_func = cross_tab[high_risk_cols].sum(axis=1).idxmax()
-                top_func_cat_count = cross_tab.loc[
-                    top_func, "灾难的 (Catastrophic)"] if "灾难的 (Catastrophic)" in cross_tab.columns else 0
-                top_func_haz_count = cross_tab.loc[
-                    top_func, "危险的 (Hazardous)"] if "危险的 (Hazardous)" in cross_tab.columns else 0
+        high_risk_count, top_func, top_func_cat_count, top_func_haz_count = risk_summary
+        text += f"当前共识别出 {high_risk_count} 项高风险条目（灾难级或危险级）。\n\n"
 
-                text += f"核心关注点：\n风险主要集中在 “{top_func}” 系统中，其中包含 {top_func_cat_count} 个“灾难级”和 {top_func_haz_count} 个“危险级”风险。\n\n"
+        if top_func is not None:
+            text += f"核心关注点：\n风险主要集中在 “{top_func}” 系统中，其中包含 {top_func_cat_count} 个“灾难级”和 {top_func_haz_count} 个“危险级”风险。\n\n"
 
         text += "行动建议：\n请结合下方交叉分析矩阵，优先审查红色高亮区域对应的功能模块，并为这些风险制定缓解措施和验证计划。"
         self.summary_text.setText(text)
@@ -525,12 +718,23 @@ class SummaryDashboardWidget(QWidget):
 
 # ------------------- 主窗口与应用入口 -------------------
 class FHA_MainWindow(QMainWindow):
+    WIDTH_SAVE_DELAY_MS = 500  # 拖动列宽结束后延迟保存，避免每个像素都写一次设置
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("FHA 结构化分析系统");
         self.setGeometry(50, 50, 1600, 900)
         self.fha_model = FHA_Model()
+        self.project_key = None  # 当前项目文件路径，用于按项目保存列宽
+        self.column_widths = ColumnWidthPolicy()
+        self._applying_widths = False
+        self._widths_project_key = None  # 待保存的列宽所属的项目
+        self._width_save_timer = QTimer(self)
+        self._width_save_timer.setSingleShot(True)
+        self._width_save_timer.setInterval(self.WIDTH_SAVE_DELAY_MS)
+        self._width_save_timer.timeout.connect(self.save_column_widths)
         self.init_ui()
+        self.apply_column_widths()
         self.update_all_views()
 
     def init_ui(self):
@@ -540,6 +744,11 @@ class FHA_MainWindow(QMainWindow):
         table_layout = QVBoxLayout(self.fha_table_tab)
         self.table_view = QTableView();
         self.table_view.setAlternatingRowColors(True)
+        self.table_model = FHA_TableModel(self.fha_model)
+        self.table_view.setModel(self.table_model)
+        header = self.table_view.horizontalHeader()
+        header.setStretchLastSection(True)
+        header.sectionResized.connect(self.on_column_resized)
         table_layout.addWidget(self.table_view);
         self.tabs.addTab(self.fha_table_tab, "FHA 总表")
 
@@ -563,6 +772,8 @@ class FHA_MainWindow(QMainWindow):
 
     def create_actions(self):
         self.new_action = QAction("&新建分析项目...", self, triggered=self.new_project)
+        self.open_project_action = QAction("&打开项目...", self, triggered=self.open_project_file)
+        self.save_project_action = QAction("&保存项目...", self, triggered=self.save_project_file)
         self.import_action = QAction("&导入旧格式表格...", self, triggered=self.import_legacy_file)
         self.export_action = QAction("&导出为表格...", self, triggered=self.export_to_file)
         self.analyze_action = QAction("&引导式分析...", self, triggered=self.start_analysis_wizard)
@@ -573,6 +784,8 @@ class FHA_MainWindow(QMainWindow):
         toolbar = QToolBar("主工具栏");
         self.addToolBar(toolbar)
         toolbar.addAction(self.new_action);
+        toolbar.addAction(self.open_project_action);
+        toolbar.addAction(self.save_project_action);
         toolbar.addSeparator()
         toolbar.addAction(self.import_action);
         toolbar.addAction(self.export_action);
@@ -590,15 +803,53 @@ class FHA_MainWindow(QMainWindow):
             self.fha_model.new_project();
             skeleton = dialog.get_fha_skeleton()
             self.fha_model.add_fha_entries(skeleton);
+            self.project_key = None
+            self.apply_column_widths()
             self.update_all_views()
             self.statusBar().showMessage(f"项目框架已生成，包含 {len(skeleton)} 个待分析条目。")
 
+    def open_project_file(self):
+        filepath, _ = QFileDialog.getOpenFileName(self, "打开项目", "", f"FHA 项目 (*{PROJECT_FILE_SUFFIX})")
+        if filepath:
+            success, msg = load_project(self.fha_model, filepath)
+            if success:
+                self.project_key = filepath
+                self.apply_column_widths()
+                self.update_all_views()
+                self.statusBar().showMessage(msg)
+            else:
+                QMessageBox.critical(self, "错误", msg)
+
+    def save_project_file(self):
+        filepath, _ = QFileDialog.getSaveFileName(self, "保存项目", "", f"FHA 项目 (*{PROJECT_FILE_SUFFIX})")
+        if filepath:
+            if not filepath.endswith(PROJECT_FILE_SUFFIX):
+                filepath += PROJECT_FILE_SUFFIX
+            success, msg = save_project(self.fha_model, filepath)
+            if success:
+                self.project_key = filepath
+                self.statusBar().showMessage(msg.replace("\n", " "))
+            else:
+                QMessageBox.warning(self, "警告", msg)
+
     def import_legacy_file(self):
         filepath, _ = QFileDialog.getOpenFileName(self, "选择Excel文件", "", "Excel Files (*.xlsx *.xls)")
         if filepath:
-            df, msg = import_from_excel(filepath)
-            if df is not None:
-                self.fha_model.load_dataframe(df);
+            progress_dialog = QProgressDialog("正在导入表格...", None, 0, 0, self)
+            progress_dialog.setWindowModality(Qt.WindowModality.WindowModal)
+            progress_dialog.setMinimumDuration(500)
+
+            def on_progress(loaded, total):
+                progress_dialog.setMaximum(max(total, loaded))
+                progress_dialog.setValue(loaded)
+                progress_dialog.setLabelText(f"正在导入表格... 已读取 {loaded} 行")
+                QApplication.processEvents()
+
+            success, msg = import_excel_into_model(self.fha_model, filepath, progress=on_progress)
+            progress_dialog.close()
+            if success:
+                self.project_key = filepath
+                self.apply_column_widths()
                 self.update_all_views()
                 self.statusBar().showMessage(f"成功从 {filepath.split('/')[-1]} 加载数据。")
             else:
@@ -651,13 +902,35 @@ class FHA_MainWindow(QMainWindow):
         else:
             self.statusBar().showMessage("切换到FHA总表视图。")
 
-    def update_all_views(self):
-        pandas_model = PandasModel(self.fha_model.get_dataframe())
-        self.table_view.setModel(pandas_model)
+    def apply_column_widths(self):
+        """加载项目后设置一次列宽，之后的增删改不再重新测量。"""
+        self.save_column_widths()  # 先写回上一个项目尚未保存的列宽
+        self._applying_widths = True
+        try:
+            self.column_widths.apply(self.table_view, self.project_key)
+        finally:
+            self._applying_widths = False
 
-        header = self.table_view.horizontalHeader()
-        header.setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+    def on_column_resized(self, column, old_size, new_size):
+        if self._applying_widths:
+            return
+        self._widths_project_key = self.project_key
+        self._width_save_timer.start()
+
+    def save_column_widths(self):
+        """写入尚未保存的列宽（拖动停止片刻后、切换项目前或关闭窗口时）。"""
+        self._width_save_timer.stop()
+        if self._widths_project_key is not None:
+            header = self.table_view.horizontalHeader()
+            self.column_widths.save(self._widths_project_key, [header.sectionSize(i) for i in range(header.count())])
+            self._widths_project_key = None
 
+    def closeEvent(self, event):
+        self.save_column_widths()
+        super().closeEvent(event)
+
+    def update_all_views(self):
+        # 表格视图由 FHA_TableModel 跟随模型的变更事件增量刷新，这里只需刷新仪表盘
         self.dashboard_tab.set_model(self.fha_model)
         if self.tabs.currentWidget() == self.dashboard_tab:
             self.dashboard_tab.refresh_dashboard()
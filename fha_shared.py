@@ -0,0 +1,397 @@
+# fha_shared.py
+# -*- coding: utf-8 -*-
+# 职责：桌面端核心逻辑 (fha_core_logic) 与 Web API (fha_api / fha_api0) 共用、不依赖 Qt 的部分：
+# 显示编号、读写锁、仪表盘聚合，以及 Excel 的流式导入与导出。
+
+import re
+import threading
+import zipfile
+from collections import Counter
+from contextlib import contextmanager
+from xml.sax.saxutils import escape
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.utils import get_column_letter
+
+
+# ------------------- 显示编号缓存 -------------------
+_ID_LABELS = np.empty(0, dtype=object)
+
+
+def id_labels(count):
+    """返回前 count 个显示编号 (FHA-001, FHA-002, ...)，缓存按倍增扩容，摊销后每行 O(1)。"""
+    global _ID_LABELS
+    cached = len(_ID_LABELS)
+    if count > cached:
+        capacity = max(count, 2 * cached, 1024)
+        extra = np.array([f"FHA-{i:03d}" for i in range(cached + 1, capacity + 1)], dtype=object)
+        _ID_LABELS = np.concatenate([_ID_LABELS, extra])
+    return _ID_LABELS[:count]
+
+
+# ------------------- 读写锁 -------------------
+class ReadWriteLock:
+    """读写锁：多个读者可同时持有，写者独占。有写者在等待时新的读者让行，避免写者饥饿。
+
+    不可重入：持有读锁时不要再申请写锁（反之亦然）。
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+# ------------------- 仪表盘聚合（增量维护） -------------------
+HIGH_RISK_CATEGORIES = ["灾难的 (Catastrophic)", "危险的 (Hazardous)"]
+NO_SAFETY_EFFECT = "无安全影响 (No Safety Effect)"
+
+
+class FHA_DashboardStats:
+    """仪表盘聚合：按 (一级功能, 危害性分类) 统计的行数（含空值）以及已填写“失效状态”的行数。
+
+    FHA_Model 在每次增、删、改时只对受影响的行做加减，整表替换时重建；
+    KPI、交叉矩阵与旭日图数据都由这些计数导出，读取开销与功能数成正比，与总行数无关。
+    """
+    COLUMNS = ('一级功能', '危害性分类', '失效状态')
+    SMALL_ROWS = 64  # 行数不超过该值时逐行计数，比 groupby 的固定开销更小
+
+    def __init__(self, model):
+        self.model = model
+        self.pairs = {}
+        self.failure_count = 0
+        self.orders = None  # 快照固定的 (一级功能类别, 危害性分类类别) 顺序；None 表示随模型读取
+        # 交叉分析的列顺序（ARP4761 危害性分类），取自所属模型
+        self.hazard_order = model.ARP4761_CATEGORIES if model is not None else []
+
+    def snapshot(self):
+        """脱离模型的副本：复制计数与当前的类别顺序，可交给后台线程导出各面板数据。"""
+        copy = FHA_DashboardStats(None)
+        copy.pairs = dict(self.pairs)
+        copy.failure_count = self.failure_count
+        copy.orders = self._category_orders()
+        copy.hazard_order = self.hazard_order
+        return copy
+
+    def _category_orders(self):
+        if self.orders is not None:
+            return self.orders
+        df = self.model.dataframe
+        return list(df['一级功能'].cat.categories), list(df['危害性分类'].cat.categories)
+
+    def rebuild(self):
+        self.pairs = {}
+        self.failure_count = 0
+        self.add(self.model.dataframe)
+
+    def add(self, rows, sign=1):
+        """把 rows（表格片段）的计数加入聚合；sign=-1 时减去。"""
+        if not len(rows):
+            return
+        if len(rows) <= self.SMALL_ROWS:
+            counts = Counter(zip(rows['一级功能'].tolist(), rows['危害性分类'].tolist())).items()
+        else:
+            counts = rows.groupby(['一级功能', '危害性分类'], observed=True).size().items()
+        for key, count in counts:
+            self._count(key, sign * int(count))
+        self.failure_count += sign * int((rows['失效状态'] != '').sum())
+
+    def row_values(self, position):
+        """第 position 行三个计数列的当前取值 (一级功能, 危害性分类, 失效状态)。"""
+        df = self.model.dataframe
+        return tuple(df.iat[position, df.columns.get_loc(column)] for column in self.COLUMNS)
+
+    def add_values(self, values, sign=1):
+        """单行的快速路径：按 row_values() 形式的取值加减计数，不构造表格片段（用于单元格编辑）。"""
+        function, hazard, failure = values
+        self._count((function, hazard), sign)
+        self.failure_count += sign * int(failure != '')
+
+    def _count(self, key, delta):
+        total = self.pairs.get(key, 0) + delta
+        if total:
+            self.pairs[key] = total
+        else:
+            self.pairs.pop(key, None)
+
+    def hazard_counts(self):
+        """各危害性分类的行数（含空分类）。"""
+        counts = Counter()
+        for (_, hazard), count in self.pairs.items():
+            counts[hazard] += count
+        return counts
+
+    def kpis(self):
+        counts = self.hazard_counts()
+        return {"total_items": self.failure_count,
+                "catastrophic_count": counts.get(HIGH_RISK_CATEGORIES[0], 0),
+                "hazardous_count": counts.get(HIGH_RISK_CATEGORIES[1], 0)}
+
+    def matrix(self, exclude=("",)):
+        """{一级功能: {危害性分类: 行数}}，只统计一级功能非空、分类不在 exclude 中的行。
+        功能与分类都按表格中对应列的类别顺序排列（与 groupby / crosstab 的顺序一致）。"""
+        rows = {}
+        for (function, hazard), count in self.pairs.items():
+            if function != '' and hazard not in exclude:
+                rows.setdefault(function, {})[hazard] = count
+        functions, hazards = self._category_orders()
+        hazards = [hazard for hazard in hazards if hazard not in exclude]
+        return {function: {hazard: rows[function][hazard] for hazard in hazards if hazard in rows[function]}
+                for function in functions if function in rows}
+
+    def cross_tab(self, matrix=None):
+        """交叉分析矩阵 (功能列表, 分类列表, 计数矩阵)：已分析（一级功能与分类均非空）的行，分类按 ARP4761 顺序。
+        matrix 为已算好的 matrix()，多个面板一起导出时共用一份。"""
+        matrix = self.matrix() if matrix is None else matrix
+        columns = [c for c in self.hazard_order if c and any(c in row for row in matrix.values())]
+        return list(matrix), columns, [[row.get(c, 0) for c in columns] for row in matrix.values()]
+
+    def risk_summary(self, matrix=None):
+        """(高风险条目数, 高风险最集中的功能, 该功能的灾难级数, 危险级数)；没有高风险条目时功能为 None。"""
+        matrix = self.matrix() if matrix is None else matrix
+        top, top_count, total = None, 0, 0
+        for function, row in matrix.items():
+            count = sum(row.get(c, 0) for c in HIGH_RISK_CATEGORIES)
+            total += count
+            if count > top_count:
+                top, top_count = function, count
+        if top is None:
+            return total, None, 0, 0
+        return total, top, matrix[top].get(HIGH_RISK_CATEGORIES[0], 0), matrix[top].get(HIGH_RISK_CATEGORIES[1], 0)
+
+
+# ------------------- Excel导入导出功能 -------------------
+EXCEL_CHUNK_ROWS = 5000
+
+
+def iter_excel_chunks(source, chunk_rows=EXCEL_CHUNK_ROWS, progress=None):
+    """以 openpyxl 只读模式流式读取第一个工作表，每 chunk_rows 行产出一个全部为字符串的 DataFrame。
+
+    source 可以是文件路径或可随机访问的文件对象；第一行为表头，完全空白的行会被跳过。
+    progress(已读行数, 预计总行数) 在每个分块产出前调用，总行数未知时为 0。
+    """
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(name) if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)]
+        width = len(columns)
+        total = max((sheet.max_row or 1) - 1, 0)
+        buffer, loaded = [], 0
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            values = ['' if value is None else str(value) for value in row[:width]]
+            values.extend([''] * (width - len(values)))
+            buffer.append(values)
+            if len(buffer) >= chunk_rows:
+                loaded += len(buffer)
+                if progress: progress(loaded, total)
+                yield pd.DataFrame(buffer, columns=columns, dtype=object)
+                buffer = []
+        if buffer:
+            loaded += len(buffer)
+            if progress: progress(loaded, total)
+            yield pd.DataFrame(buffer, columns=columns, dtype=object)
+    finally:
+        workbook.close()
+
+
+class ChunkAccumulator:
+    """逐块收集已转换为表格结构的分块，最后每列只拼接一次。
+
+    收到下一个分块时，上一个分块只留下各列的取值数组（枚举型列只留整数编码），分块本身随即释放：
+    导入的峰值内存是结果表加上正在读入的分块，而不是先保留全部分块再整体 concat。
+    文本列复制出独立的数组（不再引用分块的二维数据块），相同的文本只保留一个字符串对象；
+    枚举型列的类别只在末尾追加（见 ensure_categories），先前分块的编码在最终类别下依然有效。
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self._parts = {column: [] for column in self.columns}
+        self._dtypes = {}
+        self._index = []
+        self._last = None
+        self._strings = {}
+
+    def add(self, frame):
+        if self._last is not None:
+            self._take(self._last)
+        self._last = frame
+
+    def _take(self, frame):
+        for column in self.columns:
+            series = frame[column]
+            self._dtypes.setdefault(column, series.dtype)
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                self._parts[column].append(series.cat.codes.to_numpy())
+            else:
+                self._parts[column].append(self._share_strings(series.to_numpy(dtype=object)))
+        self._index.append(frame.index)
+
+    def _share_strings(self, values):
+        # factorize 会把 1、1.0、True 以及 None、NaN 视为同一取值，只对全为字符串的列合并相同文本，其余原样复制
+        if pd.api.types.infer_dtype(values, skipna=False) != 'string':
+            return values.copy()
+        codes, uniques = pd.factorize(values)
+        shared = np.empty(len(uniques), dtype=object)
+        shared[:] = [self._strings.setdefault(value, value) for value in uniques]
+        return shared[codes]
+
+    def finish(self, table, ignore_index=False):
+        """拼成一张表，枚举型列使用 table 中对应列的最终类别（table 中没有的列保持分块的类型）；没有任何分块时返回 table。
+        只有一个分块（如直接传入 DataFrame）时原样返回该分块，不做复制。"""
+        frame, self._last = self._last, None
+        if frame is None:
+            return table
+        if not self._index:
+            return frame.reset_index(drop=True) if ignore_index else frame
+        self._take(frame)
+        del frame
+        index = (pd.RangeIndex(sum(len(part) for part in self._index)) if ignore_index
+                 else self._index[0].append(self._index[1:]))
+        data = {}
+        for column in self.columns:
+            values = np.concatenate(self._parts.pop(column))  # 逐列拼接，拼完即释放该列的分块数组
+            dtype = table[column].dtype if column in table.columns else self._dtypes[column]
+            if isinstance(dtype, pd.CategoricalDtype):
+                data[column] = pd.Categorical.from_codes(values, dtype=dtype)
+            else:
+                data[column] = pd.Series(values, index=index, dtype=self._dtypes[column], copy=False)
+        self._index, self._strings = [], {}
+        return pd.DataFrame(data, index=index, columns=self.columns)
+
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+XLSX_FLUSH_BYTES = 64 * 1024
+_XML_ILLEGAL_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+_XLSX_STATIC_PARTS = {
+    "[Content_Types].xml":
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>',
+    "_rels/.rels":
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>',
+    "xl/workbook.xml":
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets></workbook>',
+    "xl/_rels/workbook.xml.rels":
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>',
+}
+
+
+class ChunkSink:
+    """只追加、不可回溯的写入目标；zipfile 在无法 tell/seek 时改用数据描述符，可边压缩边输出。
+    也可作为 pyarrow IPC 流的写入目标。"""
+    closed = False
+
+    def __init__(self):
+        self.parts, self.size = [], 0
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts, self.size = [], 0
+        return data
+
+
+def _xlsx_cell(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return '<c/>'
+    text = _XML_ILLEGAL_CHARS.sub('', str(value))
+    space = ' xml:space="preserve"' if text != text.strip() else ''
+    return f'<c t="inlineStr"><is><t{space}>{escape(text)}</t></is></c>'
+
+
+def _xlsx_row(number, values):
+    return f'<row r="{number}">' + ''.join(_xlsx_cell(v) for v in values) + '</row>'
+
+
+def iter_xlsx_bytes(dataframe, chunk_rows=EXCEL_CHUNK_ROWS):
+    """把 dataframe 流式编码为单工作表 .xlsx，逐段产出字节（不含索引列）。
+
+    单元格一律写成内联字符串，不需要共享字符串表，因此任何时刻只有一个分块的行在内存中；
+    压缩后的数据每积累 XLSX_FLUSH_BYTES 即产出，首个字节在第一个分块编码后就能发出。
+    """
+    sink = ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_STATIC_PARTS.items():
+            archive.writestr(name, content)
+        width = max(len(dataframe.columns), 1)
+        with archive.open("xl/worksheets/sheet1.xml", 'w', force_zip64=True) as sheet:
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                f'<dimension ref="A1:{get_column_letter(width)}{len(dataframe) + 1}"/><sheetData>'
+                + _xlsx_row(1, dataframe.columns)
+            ).encode('utf-8'))
+            for start in range(0, len(dataframe), chunk_rows):
+                chunk = dataframe.iloc[start:start + chunk_rows]
+                columns = [chunk[name].astype(object).tolist() for name in chunk.columns]
+                rows = ''.join(_xlsx_row(start + offset + 2, values)
+                               for offset, values in enumerate(zip(*columns)))
+                sheet.write(rows.encode('utf-8'))
+                if sink.size >= XLSX_FLUSH_BYTES:
+                    yield sink.drain()
+            sheet.write(b'</sheetData></worksheet>')
+    yield sink.drain()